@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import multiprocessing
 
 try:
     import PyQt5.QtWidgets # noqa: F401
@@ -12,5 +13,8 @@ except Exception:
     sys.exit(1)
 
 if __name__ == "__main__":
+    # The index and build worker processes are spawned, which in frozen
+    # builds re-runs this script, so they must be handed over here
+    multiprocessing.freeze_support()
     import nw
     nw.main(sys.argv[1:])
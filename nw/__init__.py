@@ -28,6 +28,7 @@
 import sys
 import getopt
 import logging
+import multiprocessing
 
 from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QApplication, QErrorMessage
@@ -113,6 +114,11 @@ CONFIG = Config()
 def main(sysArgs=None):
     """Parses command line, sets up logging, and launches main GUI.
     """
+    # The build tokenizer workers are spawned, which in frozen builds
+    # re-runs the entry point, so this must also be done when the entry
+    # point is main itself
+    multiprocessing.freeze_support()
+
     if sysArgs is None:
         sysArgs = sys.argv[1:]
 
@@ -128,6 +134,8 @@ def main(sysArgs=None):
         "config=",
         "data=",
         "testmode",
+        "build=",
+        "output=",
     ]
 
     helpMsg = (
@@ -149,6 +157,10 @@ def main(sysArgs=None):
         "     --config=   Alternative config file.\n"
         "     --data=     Alternative user data path.\n"
         "     --testmode  Do not display GUI. Used by the test suite.\n"
+        "     --build=    Build the project without the GUI, and exit. The format\n"
+        "                 is one of odt, epub, html, nwd, md, txt, json-html or\n"
+        "                 json-nwd.\n"
+        "     --output=   The file to write the build to. Required by --build.\n"
     ).format(
         version   = __version__,
         status    = __status__,
@@ -164,6 +176,8 @@ def main(sysArgs=None):
     testMode   = False
     qtStyle    = "Fusion"
     cmdOpen    = None
+    buildFmt   = None
+    buildPath  = None
 
     # Parse Options
     try:
@@ -201,9 +215,18 @@ def main(sysArgs=None):
             dataPath = inArg
         elif inOpt == "--testmode":
             testMode = True
+        elif inOpt == "--build":
+            buildFmt = inArg
+        elif inOpt == "--output":
+            buildPath = inArg
+
+    if buildFmt is not None and (cmdOpen is None or buildPath is None):
+        print(helpMsg)
+        print("ERROR: A project and an --output file are required by --build")
+        sys.exit(2)
 
     # Set Config Options
-    CONFIG.showGUI   = not testMode
+    CONFIG.showGUI   = not testMode and buildFmt is None
     CONFIG.debugInfo = debugLevel < logging.INFO
     CONFIG.cmdOpen   = cmdOpen
 
@@ -245,7 +268,7 @@ def main(sysArgs=None):
         errorCode |= 32
 
     if errorData:
-        if not testMode:
+        if CONFIG.showGUI:
             errApp = QApplication([])
             errMsg = QErrorMessage()
             errMsg.resize(500, 300)
@@ -273,6 +296,14 @@ def main(sysArgs=None):
             logger.error("Failed to set application name")
             logger.error(str(e))
 
+    # Build the project without creating the GUI
+    if buildFmt is not None:
+        from nw.headless import HeadlessMain
+        errorCode = HeadlessMain().buildProject(cmdOpen, buildFmt, buildPath)
+        if testMode:
+            return errorCode
+        sys.exit(errorCode)
+
     # Import GUI (after dependency checks), and launch
     from nw.guimain import GuiMain
     if testMode:
@@ -109,6 +109,9 @@ class Config:
         ## Project
         self.autoSaveProj = 60 # Interval for auto-saving project in seconds
         self.autoSaveDoc  = 30 # Interval for auto-saving document in seconds
+        self.indexWorkers = 0  # Number of processes for indexing, 0 for automatic
+        self.indexFormat  = "json" # Index storage: json, shards or sqlite
+        self.buildWorkers = 0  # Number of processes for building, 0 for automatic
 
         ## Text Editor
         self.textFont        = None  # Editor font
@@ -422,6 +425,15 @@ class Config:
         self.autoSaveDoc = self._parseLine(
             cnfParse, cnfSec, "autosavedoc", self.CNF_INT, self.autoSaveDoc
         )
+        self.indexWorkers = self._parseLine(
+            cnfParse, cnfSec, "indexworkers", self.CNF_INT, self.indexWorkers
+        )
+        self.indexFormat = self._parseLine(
+            cnfParse, cnfSec, "indexformat", self.CNF_STR, self.indexFormat
+        )
+        self.buildWorkers = self._parseLine(
+            cnfParse, cnfSec, "buildworkers", self.CNF_INT, self.buildWorkers
+        )
 
         ## Editor
         cnfSec = "Editor"
@@ -604,6 +616,9 @@ class Config:
         cnfParse.add_section(cnfSec)
         cnfParse.set(cnfSec, "autosaveproject", str(self.autoSaveProj))
         cnfParse.set(cnfSec, "autosavedoc",     str(self.autoSaveDoc))
+        cnfParse.set(cnfSec, "indexworkers",    str(self.indexWorkers))
+        cnfParse.set(cnfSec, "indexformat",     str(self.indexFormat))
+        cnfParse.set(cnfSec, "buildworkers",    str(self.buildWorkers))
 
         ## Editor
         cnfSec = "Editor"
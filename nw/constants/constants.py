@@ -41,9 +41,11 @@ class nwConst():
 
 class nwRegEx():
 
-    FMT_EI = r"(?<![\w\\])(_)(?![\s_])(.+?)(?<![\s\\])(\1)(?!\w)"
-    FMT_EB = r"(?<![\w\\])([\*]{2})(?![\s\*])(.+?)(?<![\s\\])(\1)(?!\w)"
-    FMT_ST = r"(?<![\w\\])([~]{2})(?![\s~])(.+?)(?<![\s\\])(\1)(?!\w)"
+    # The formatting tag is matched before the look-behind, so that the
+    # RegEx engines can search for it as a literal prefix
+    FMT_EI = r"(_)(?<![\w\\]_)(?![\s_])(.+?)(?<![\s\\])(\1)(?!\w)"
+    FMT_EB = r"(\*\*)(?<![\w\\]\*\*)(?![\s\*])(.+?)(?<![\s\\])(\1)(?!\w)"
+    FMT_ST = r"(~~)(?<![\w\\]~~)(?![\s~])(.+?)(?<![\s\\])(\1)(?!\w)"
 
 # END Class nwRegEx
 
@@ -56,9 +58,14 @@ class nwFiles():
     TOC_JSON    = "ToC.json"
     SESS_STATS  = "sessionStats.log"
     INDEX_FILE  = "tagsIndex.json"
+    INDEX_STAMP = "indexStamps.json"
+    INDEX_DIR   = "index"
+    INDEX_MAIN  = "manifest.json"
+    INDEX_DB    = "tagsIndex.db"
     OPTS_FILE   = "guiOptions.json"
     RECENT_FILE = "recentProjects.json"
     BUILD_CACHE = "prevBuild.json"
+    DICT_CACHE  = "dictCache"
 
 # END Class nwFiles
 
@@ -1,21 +1,31 @@
 # -*- coding: utf-8 -*-
 
+from nw.core.build import NWBuild
 from nw.core.document import NWDoc
 from nw.core.index import NWIndex
 from nw.core.project import NWProject
 from nw.core.spellcheck import NWSpellCheck, NWSpellEnchant, NWSpellSimple
+from nw.core.toepub import ToEpub
 from nw.core.tohtml import ToHtml
+from nw.core.tomarkdown import ToMarkdown
+from nw.core.toodt import ToOdt
+from nw.core.totext import ToText
 from nw.core.tools import countWords, numberToRoman, numberToWord
 
 __all__ = [
     "countWords",
     "numberToRoman",
     "numberToWord",
+    "NWBuild",
     "NWDoc",
     "NWIndex",
     "NWProject",
     "NWSpellCheck",
     "NWSpellEnchant",
     "NWSpellSimple",
+    "ToEpub",
     "ToHtml",
+    "ToMarkdown",
+    "ToOdt",
+    "ToText",
 ]
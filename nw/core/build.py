@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Project Builder
+
+ novelWriter – Project Builder
+===============================
+ Builds the project into a single document, without depending on the GUI
+
+ File History:
+ Created: 2026-10-18 [1.0b5]
+
+ This file is a part of novelWriter
+ Copyright 2018–2020, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import nw
+import logging
+import json
+import os
+
+from time import time
+
+from nw.core.tohtml import ToHtml
+from nw.core.totext import ToText
+from nw.core.tomarkdown import ToMarkdown
+from nw.core.toodt import ToOdt
+from nw.core.toepub import ToEpub
+from nw.constants import nwItemType, nwItemLayout, nwItemClass
+
+logger = logging.getLogger(__name__)
+
+class NWBuild():
+
+    FMT_ODT    = 1
+    FMT_HTM    = 3
+    FMT_MD     = 4
+    FMT_NWD    = 5
+    FMT_TXT    = 6
+    FMT_JSON_H = 7
+    FMT_JSON_M = 8
+    FMT_EPUB   = 9
+
+    def __init__(self, theProject, theParent):
+
+        self.mainConf   = nw.CONFIG
+        self.theProject = theProject
+        self.theParent  = theParent
+
+        self.novelFiles  = True  # Include novel files
+        self.noteFiles   = False # Include note files
+        self.ignoreFlag  = False # Include files not flagged for export
+        self.replaceTabs = False # Replace tabs with spaces
+
+        return
+
+    ##
+    #  Setters
+    ##
+
+    def setIncludes(self, novelFiles, noteFiles, ignoreFlag):
+        """Set which files are included in the build.
+        """
+        self.novelFiles = novelFiles
+        self.noteFiles  = noteFiles
+        self.ignoreFlag = ignoreFlag
+        return
+
+    def setReplaceTabs(self, replaceTabs):
+        """Replace tabs with spaces in the output.
+        """
+        self.replaceTabs = replaceTabs
+        return
+
+    ##
+    #  Class Methods
+    ##
+
+    def makeConverter(self, theFormat):
+        """Create a converter for a format with the title formats of the
+        project and the build options last used in the build dialog, and
+        include the files selected there. Used when building without the
+        GUI.
+        """
+        optState = self.theProject.optState
+        fmtTitle = {
+            theKey: reFmtCodes(theValue).strip()
+            for theKey, theValue in self.theProject.titleFormat.items()
+        }
+
+        theConv = newConverter(theFormat, self.theProject, self.theParent)
+        theConv.setTitleFormat(fmtTitle["title"])
+        theConv.setChapterFormat(fmtTitle["chapter"])
+        theConv.setUnNumberedFormat(fmtTitle["unnumbered"])
+        theConv.setSceneFormat(fmtTitle["scene"], fmtTitle["scene"] == "")
+        theConv.setSectionFormat(fmtTitle["section"], fmtTitle["section"] == "")
+        theConv.setBodyText(optState.getBool("GuiBuildNovel", "incBodyText", True))
+        theConv.setSynopsis(optState.getBool("GuiBuildNovel", "incSynopsis", False))
+        theConv.setComments(optState.getBool("GuiBuildNovel", "incComments", False))
+        theConv.setKeywords(optState.getBool("GuiBuildNovel", "incKeywords", False))
+        theConv.setJustify(optState.getBool("GuiBuildNovel", "justifyText", False))
+        if isinstance(theConv, ToHtml):
+            theConv.setStyles(not optState.getBool("GuiBuildNovel", "noStyling", False))
+        if isinstance(theConv, ToOdt):
+            theConv.setFont(
+                optState.getString("GuiBuildNovel", "textFont", self.mainConf.textFont),
+                optState.getInt("GuiBuildNovel", "textSize", self.mainConf.textSize),
+            )
+
+        self.setIncludes(
+            optState.getBool("GuiBuildNovel", "addNovel", True),
+            optState.getBool("GuiBuildNovel", "addNotes", False),
+            optState.getBool("GuiBuildNovel", "ignoreFlag", False),
+        )
+        self.setReplaceTabs(optState.getBool("GuiBuildNovel", "replaceTabs", False))
+
+        return theConv
+
+    def iterBuild(self, theConv):
+        """Convert the project one item at a time, in tree order. Yields
+        the item with its converted text and markdown, or with None for
+        items that are not included, so that the result can be written
+        out without keeping the whole project in memory. Raises an
+        exception naming the document if a document could not be
+        converted.
+        """
+        # The documents are tokenized first, possibly in parallel, while
+        # the header numbering and conversion is done in tree order
+        theItems = []
+        theHandles = []
+        for tItem in self.theProject.projTree:
+            noteRoot  = self.noteFiles
+            noteRoot &= tItem.itemType == nwItemType.ROOT
+            noteRoot &= tItem.itemClass != nwItemClass.NOVEL
+            noteRoot &= tItem.itemClass != nwItemClass.ARCHIVE
+            doInclude = not noteRoot and self.checkInclude(tItem)
+            if doInclude:
+                theHandles.append(tItem.itemHandle)
+            theItems.append((tItem, noteRoot, doInclude))
+
+        if isinstance(theConv, ToEpub):
+            tabSpace = "&#160;"*8
+        elif isinstance(theConv, ToHtml):
+            tabSpace = "&nbsp;"*8
+        else:
+            tabSpace = " "*8
+
+        theDocs = theConv.tokenizeDocuments(theHandles, self.mainConf.buildWorkers)
+        for tItem, noteRoot, doInclude in theItems:
+
+            if not (noteRoot or doInclude):
+                yield tItem, None, None
+                continue
+
+            try:
+                if noteRoot:
+                    # Add headers for root folders of notes
+                    theConv.addRootHeading(tItem.itemHandle)
+                    theConv.doConvert()
+                else:
+                    next(theDocs)
+                    theConv.doHeaders()
+                    theConv.doConvert()
+                    theConv.doPostProcessing()
+
+            except Exception as e:
+                logger.error("Failed to generate html of document '%s'" % tItem.itemHandle)
+                logger.error(str(e))
+                theDocs.close()
+                raise ValueError(
+                    "Document with title '%s' could not be parsed." % tItem.itemName
+                )
+
+            theText = theConv.getResult()
+            theNwd = theConv.getFilteredMarkdown()
+            if self.replaceTabs:
+                theText = theText.replace("\t", tabSpace)
+                theNwd = theNwd.replace("\t", " "*8)
+
+            yield tItem, theText, theNwd
+
+        # Forget documents that are no longer in the project
+        if theConv.tokenCache is not None:
+            for tHandle in list(theConv.tokenCache):
+                if tHandle not in self.theProject.projTree:
+                    theConv.tokenCache.pop(tHandle)
+
+        return
+
+    def saveDocument(self, savePath, theFormat, theConv):
+        """Build the project and save it to a file. Open Document and
+        EPUB files are written by their converters, the other formats
+        are text files. The file is written via a temp file, so a failed
+        build does not overwrite an existing file.
+        """
+        tempPath = savePath+"~"
+        try:
+            if theFormat == self.FMT_ODT:
+                theConv.saveOdt(tempPath, (
+                    theText for _, theText, _ in self.iterBuild(theConv) if theText is not None
+                ))
+                wSuccess = True
+
+            elif theFormat == self.FMT_EPUB:
+                theConv.saveEpub(tempPath, (
+                    (tItem, theText) for tItem, theText, _ in self.iterBuild(theConv)
+                    if theText is not None
+                ))
+                wSuccess = True
+
+            else:
+                with open(tempPath, mode="w", encoding="utf8") as outFile:
+                    wSuccess = self.writeDocument(outFile, theFormat, theConv)
+
+        except Exception:
+            if os.path.isfile(tempPath):
+                os.unlink(tempPath)
+            raise
+
+        if wSuccess:
+            os.replace(tempPath, savePath)
+        else:
+            os.unlink(tempPath)
+
+        return wSuccess
+
+    def writeDocument(self, outFile, theFormat, theConv):
+        """Build the project and write it to an open file in one of the
+        formats handled by novelWriter. The documents are written as
+        they are converted, so the size of the project does not affect
+        the memory used.
+        """
+        theBuild = self.iterBuild(theConv)
+
+        if theFormat == self.FMT_HTM:
+            # Write novelWriter HTML data
+            theStyle = theConv.getStyleSheet()
+            theStyle.append(r"article {width: 800px; margin: 40px auto;}")
+            outFile.write((
+                "<!DOCTYPE html>\n"
+                "<html>\n"
+                "<head>\n"
+                "<meta charset='utf-8'>\n"
+                "<title>{projTitle:s}</title>\n"
+                "</head>\n"
+                "<style>\n"
+                "{htmlStyle:s}\n"
+                "</style>\n"
+                "<body>\n"
+                "<article>\n"
+            ).format(
+                projTitle = self.theProject.projName,
+                htmlStyle = "\n".join(theStyle),
+            ))
+            for _, theText, _ in theBuild:
+                if theText is not None:
+                    outFile.write(theText.replace("\t", "&#09;"))
+            outFile.write((
+                "\n"
+                "</article>\n"
+                "</body>\n"
+                "</html>\n"
+            ))
+
+        elif theFormat == self.FMT_NWD:
+            # Write novelWriter markdown data
+            for _, _, theNwd in theBuild:
+                if theNwd is not None:
+                    outFile.write(theNwd)
+
+        elif theFormat == self.FMT_TXT or theFormat == self.FMT_MD:
+            # Write plain text or standard Markdown data
+            for _, theText, _ in theBuild:
+                if theText is not None:
+                    outFile.write(theText)
+
+        elif theFormat == self.FMT_JSON_H or theFormat == self.FMT_JSON_M:
+            jsonData = {
+                "meta" : {
+                    "workingTitle" : self.theProject.projName,
+                    "novelTitle"   : self.theProject.bookTitle,
+                    "authors"      : self.theProject.bookAuthors,
+                    "buildTime"    : int(time()),
+                }
+            }
+
+            if theFormat == self.FMT_JSON_H:
+                jsonData["text"] = {
+                    "css"  : theConv.getStyleSheet(),
+                    "html" : [],
+                }
+                thePages = (
+                    theText.rstrip("\n").split("\n")
+                    for _, theText, _ in theBuild if theText is not None
+                )
+            else:
+                jsonData["text"] = {
+                    "nwd" : [],
+                }
+                thePages = (
+                    theNwd.split("\n")
+                    for _, _, theNwd in theBuild if theNwd is not None
+                )
+
+            # The text list is last in the data, so the JSON is written
+            # up to it, followed by one page at a time and the remainder
+            jsonText = json.dumps(jsonData, indent=2)
+            splitPos = jsonText.rindex("[]")
+            outFile.write(jsonText[:splitPos+1])
+            pageSep = "\n"
+            for thePage in thePages:
+                outFile.write(pageSep)
+                outFile.write("\n".join(
+                    " "*6 + aLine for aLine in json.dumps(thePage, indent=2).split("\n")
+                ))
+                pageSep = ",\n"
+            if pageSep != "\n":
+                outFile.write("\n    ")
+            outFile.write(jsonText[splitPos+1:])
+
+        else:
+            return False
+
+        return True
+
+    def checkInclude(self, theItem):
+        """This function checks whether a file should be included in the
+        export or not. For standard note and novel files, this is
+        controlled by the options selected by the user. For other files
+        classified as non-exportable, a few checks must be made, and the
+        following are not:
+        * Items that are not actual files.
+        * Items that have been orphaned which are tagged as NO_LAYOUT
+          and NO_CLASS.
+        * Items that appear in the TRASH folder or have parent set to
+          None (orphaned files).
+        """
+        if theItem is None:
+            return False
+
+        if not theItem.isExported and not self.ignoreFlag:
+            return False
+
+        isNone  = theItem.itemType != nwItemType.FILE
+        isNone |= theItem.itemLayout == nwItemLayout.NO_LAYOUT
+        isNone |= theItem.itemClass == nwItemClass.NO_CLASS
+        isNone |= theItem.itemClass == nwItemClass.TRASH
+        isNone |= theItem.itemParent == self.theProject.projTree.trashRoot()
+        isNone |= theItem.itemParent is None
+        isNote  = theItem.itemLayout == nwItemLayout.NOTE
+        isNovel = not isNone and not isNote
+
+        if isNone:
+            return False
+        if isNote and not self.noteFiles:
+            return False
+        if isNovel and not self.novelFiles:
+            return False
+
+        rootItem = self.theProject.projTree.getRootItem(theItem.itemHandle)
+        if rootItem.itemClass == nwItemClass.ARCHIVE:
+            return False
+
+        return True
+
+# END Class NWBuild
+
+# =============================================================================================== #
+#  Title Formats
+# =============================================================================================== #
+
+def reFmtCodes(theFormat):
+    """Translates old formatting codes to new ones.
+    """
+    theFormat = theFormat.replace(r"%chnum%",     r"%ch%")
+    theFormat = theFormat.replace(r"%scnum%",     r"%sc%")
+    theFormat = theFormat.replace(r"%scabsnum%",  r"%sca%")
+    theFormat = theFormat.replace(r"%chnumword%", r"%chw%")
+    return theFormat
+
+# =============================================================================================== #
+#  Converters
+# =============================================================================================== #
+
+def newConverter(theFormat, theProject, theParent):
+    """Create the converter class that writes a build format. The
+    novelWriter formats are written by the html converter.
+    """
+    if theFormat == NWBuild.FMT_ODT:
+        return ToOdt(theProject, theParent)
+    elif theFormat == NWBuild.FMT_EPUB:
+        return ToEpub(theProject, theParent)
+    elif theFormat == NWBuild.FMT_TXT:
+        return ToText(theProject, theParent)
+    elif theFormat == NWBuild.FMT_MD:
+        return ToMarkdown(theProject, theParent)
+    return ToHtml(theProject, theParent)
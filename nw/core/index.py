@@ -29,19 +29,35 @@ import nw
 import logging
 import json
 import os
+import re
+import sys
+import sqlite3
 
+from copy import deepcopy
+
+from collections.abc import MutableMapping
+from contextlib import closing
+from hashlib import sha256
 from time import time
 
 from nw.constants import (
     nwFiles, nwKeyWords, nwItemType, nwItemClass, nwItemLayout, nwAlert
 )
 from nw.core.document import NWDoc
-from nw.core.tools import countWords
+from nw.core.tools import countWords, runWorkers
 
 logger = logging.getLogger(__name__)
 
 class NWIndex():
 
+    # Automatic parallel indexing is only used for at least this many
+    # documents, as starting the worker processes has a cost
+    PARALLEL_MIN = 100
+
+    # The fingerprints file is rewritten in full when this many updates
+    # have been appended to it
+    STAMP_LINES = 100
+
     VALID_KEYS = {
         nwKeyWords.TAG_KEY,
         nwKeyWords.PLOT_KEY,
@@ -72,12 +88,36 @@ class NWIndex():
         self.theParent   = theParent
         self.indexBroken = False
 
+        # Handles changed while change tracking is enabled
+        self.changedHandles = None
+
+        # Shards to be written on the next save
+        self._shardSource = None
+        self._dirtyShards = set()
+        self._allDirty    = True
+
+        # Fingerprints to be appended on the next save, and the number
+        # of lines in the file, or None if it must be rewritten
+        self._dirtyStamps = set()
+        self._stampLines  = None
+
         # Indices
         self.tagIndex   = None
         self.refIndex   = None
         self.novelIndex = None
         self.noteIndex  = None
         self.textCounts = None
+        self.docStamps  = None
+        self.wordIndex  = None
+
+        # Lookup Maps
+        self._tagOwned = None # The tags defined by each handle
+        self._tagRefs  = None # The handles and titles referring to each tag
+        self._wordOwn  = None # The words in each handle
+
+        # Novel Structure Cache
+        self._novelVersion = 0  # Incremented on every change to novelIndex
+        self._novelCache   = {} # Cached structure for each skipExcluded value
 
         # TimeStamps
         self.timeNovel = 0
@@ -96,32 +136,102 @@ class NWIndex():
         """Clear the index dictionaries and time stamps.
         """
         self.tagIndex   = {}
-        self.refIndex   = {}
-        self.novelIndex = {}
-        self.noteIndex  = {}
+        self.refIndex   = LazyIndexMap(self)
+        self.novelIndex = LazyIndexMap(self)
+        self.noteIndex  = LazyIndexMap(self)
         self.textCounts = {}
+        self.docStamps  = {}
+        self.wordIndex  = {}
+        self._tagOwned  = {}
+        self._tagRefs   = {}
+        self._wordOwn   = {}
         self.timeNovel  = 0
         self.timeNote   = 0
         self.timeIndex  = 0
+
+        self._novelVersion += 1
+        self._dirtyShards = set()
+        self._allDirty    = True
+        self._dirtyStamps = set()
+        self._stampLines  = None
+
         return
 
+    def replaceIndex(self, theIndex, makeCopy=False):
+        """Replace the content of this index with the content of
+        another index. Unless makeCopy is True, the other index hands
+        over its dictionaries, and should not be used afterwards.
+        """
+        theData = (
+            theIndex.tagIndex, theIndex.refIndex, theIndex.novelIndex,
+            theIndex.noteIndex, theIndex.textCounts, theIndex.docStamps,
+            theIndex.wordIndex, theIndex._tagOwned, theIndex._tagRefs,
+            theIndex._wordOwn,
+        )
+        if makeCopy:
+            theData = deepcopy(theData)
+
+        (
+            self.tagIndex, self.refIndex, self.novelIndex,
+            self.noteIndex, self.textCounts, self.docStamps,
+            self.wordIndex, self._tagOwned, self._tagRefs,
+            self._wordOwn,
+        ) = theData
+
+        self.refIndex.setOwner(self)
+        self.novelIndex.setOwner(self)
+        self.noteIndex.setOwner(self)
+
+        self.timeNovel = theIndex.timeNovel
+        self.timeNote  = theIndex.timeNote
+        self.timeIndex = theIndex.timeIndex
+
+        self._novelVersion += 1
+        self._shardSource = theIndex._shardSource
+        if makeCopy:
+            self._dirtyShards = set(theIndex._dirtyShards)
+            self._allDirty    = theIndex._allDirty
+        else:
+            self._dirtyShards |= theIndex._dirtyShards
+            self._allDirty    |= theIndex._allDirty
+
+        # The fingerprints are replaced as a whole
+        self._dirtyStamps = set()
+        self._stampLines  = None
+
+        return
+
+    def trackChanges(self, doTrack):
+        """Start or stop recording which handles are changed in the
+        index. When tracking is stopped, the set of changed handles is
+        returned.
+        """
+        theChanged = self.changedHandles
+        if doTrack:
+            self.changedHandles = set()
+        else:
+            self.changedHandles = None
+        return theChanged
+
     def deleteHandle(self, tHandle):
         """Delete all entries of a given document handle.
         """
         logger.debug("Removing item %s from the index" % tHandle)
+        if self.changedHandles is not None:
+            self.changedHandles.add(tHandle)
+        self._dirtyShards.add(tHandle)
 
-        delTags = []
-        for tTag in self.tagIndex:
-            if self.tagIndex[tTag][1] == tHandle:
-                delTags.append(tTag)
-
-        for tTag in delTags:
-            self.tagIndex.pop(tTag, None)
-
+        self._dropTags(tHandle)
+        self._dropRefs(tHandle)
+        self._dropWords(tHandle)
         self.refIndex.pop(tHandle, None)
-        self.novelIndex.pop(tHandle, None)
+        if tHandle in self.novelIndex:
+            self.novelIndex.pop(tHandle, None)
+            self._novelVersion += 1
         self.noteIndex.pop(tHandle, None)
         self.textCounts.pop(tHandle, None)
+        self.docStamps.pop(tHandle, None)
+        self._dirtyStamps.add(tHandle)
 
         return
 
@@ -145,67 +255,113 @@ class NWIndex():
 
         return True
 
+    def checkDocStamp(self, tHandle):
+        """Check if the fingerprint recorded when a document was last
+        indexed still matches the file on disk and the item's position
+        in the project tree. Returns True if the document does not need
+        to be re-indexed.
+        """
+        theStamp = self.docStamps.get(tHandle, None)
+        if theStamp is None or tHandle not in self.textCounts:
+            return False
+
+        if theStamp[3] != self._docLocation(tHandle):
+            logger.verbose("Item %s has moved since it was last indexed" % tHandle)
+            return False
+
+        docSize, docTime = self._docFileStat(tHandle)
+        if theStamp[0] == docSize and theStamp[1] == docTime:
+            return True
+
+        # The file has been touched, so we check if the content has
+        # actually changed before we decide to re-index it
+        theDoc = NWDoc(self.theProject, self.theParent)
+        theText = theDoc.openDocument(tHandle, showStatus=False)
+        if theText is None:
+            return False
+
+        if theStamp[2] == textHash(theText):
+            theStamp[0] = docSize
+            theStamp[1] = docTime
+            self._dirtyStamps.add(tHandle)
+            return True
+
+        return False
+
     ##
     #  Load and Save Index to/from File
     ##
 
     def loadIndex(self):
         """Load index from last session from the project meta folder.
+        The index can be stored as a single file, as a manifest with a
+        shard file per document, or in an SQLite database. The format
+        set in the config is tried first, but any of them is accepted.
         """
-        theData   = {}
-        indexFile = os.path.join(self.theProject.projMeta, nwFiles.INDEX_FILE)
-
-        if os.path.isfile(indexFile):
-            logger.debug("Loading index file")
-            try:
-                with open(indexFile, mode="r", encoding="utf8") as inFile:
-                    theData = json.load(inFile)
-            except Exception as e:
-                logger.error("Failed to load index file")
-                logger.error(str(e))
+        theFiles = self._indexFiles()
+        theFormat = self.mainConf.indexFormat
+        if not os.path.isfile(theFiles.get(theFormat, "")):
+            theFormat = None
+            for aFormat, aFile in theFiles.items():
+                if os.path.isfile(aFile):
+                    theFormat = aFormat
+                    break
+
+        if theFormat == "json":
+            if not self._loadIndexFile(theFiles[theFormat]):
+                return False
+            self._buildLookupMaps()
+        elif theFormat == "shards":
+            if not self._loadIndexShards(theFiles[theFormat]):
+                return False
+        elif theFormat == "sqlite":
+            if not self._loadIndexSQLite(theFiles[theFormat]):
                 return False
 
-            if "tagIndex" in theData.keys():
-                self.tagIndex = theData["tagIndex"]
-            if "refIndex" in theData.keys():
-                self.refIndex = theData["refIndex"]
-            if "novelIndex" in theData.keys():
-                self.novelIndex = theData["novelIndex"]
-            if "noteIndex" in theData.keys():
-                self.noteIndex = theData["noteIndex"]
-            if "textCounts" in theData.keys():
-                self.textCounts = theData["textCounts"]
-
+        if theFormat is not None:
             nowTime = round(time())
             self.timeNovel = nowTime
             self.timeNote  = nowTime
             self.timeIndex = nowTime
+            self._novelVersion += 1
 
+            # If the format has changed, everything must be written
+            self._shardSource = theFormat
+            self._dirtyShards = set()
+            self._allDirty    = theFormat != self.mainConf.indexFormat
+
+        self._loadDocStamps()
         self.checkIndex()
 
         return True
 
     def saveIndex(self):
-        """Save the current index as a json file in the project meta
-        data folder.
+        """Save the current index in the project meta data folder, in
+        the format set in the config. The files of the other formats
+        are removed so that a stale index is never loaded.
         """
-        logger.debug("Saving index file")
-        indexFile = os.path.join(self.theProject.projMeta, nwFiles.INDEX_FILE)
+        theFormat = self.mainConf.indexFormat
+        if theFormat == "shards":
+            isSaved = self._saveIndexShards()
+        elif theFormat == "sqlite":
+            isSaved = self._saveIndexSQLite()
+        else:
+            theFormat = "json"
+            isSaved = self._saveIndexFile()
 
-        try:
-            with open(indexFile, mode="w+", encoding="utf8") as outFile:
-                json.dump({
-                    "tagIndex"   : self.tagIndex,
-                    "refIndex"   : self.refIndex,
-                    "novelIndex" : self.novelIndex,
-                    "noteIndex"  : self.noteIndex,
-                    "textCounts" : self.textCounts,
-                }, outFile, indent=2)
-        except Exception as e:
-            logger.error("Failed to save index file")
-            logger.error(str(e))
+        if not isSaved:
             return False
 
+        self._shardSource = theFormat
+        self._dirtyShards = set()
+        self._allDirty    = theFormat == "json"
+
+        for aFormat, aFile in self._indexFiles().items():
+            if aFormat != theFormat and os.path.isfile(aFile):
+                os.unlink(aFile)
+
+        self._saveDocStamps()
+
         return True
 
     def checkIndex(self):
@@ -220,26 +376,31 @@ class NWIndex():
                 if len(self.tagIndex[tTag]) != 4:
                     self.indexBroken = True
 
-            for tHandle in self.refIndex:
-                for sTitle in self.refIndex[tHandle]:
-                    for tEntry in self.refIndex[tHandle][sTitle]["tags"]:
-                        if len(tEntry) != 3:
-                            self.indexBroken = True
+            # Shards that are not loaded yet are checked when loaded
+            for theRefs in self.refIndex.loadedValues():
+                if not self._checkRefs(theRefs):
+                    self.indexBroken = True
 
-            for tHandle in self.novelIndex:
-                for sLine in self.novelIndex[tHandle]:
-                    if len(self.novelIndex[tHandle][sLine].keys()) != 8:
-                        self.indexBroken = True
+            for theHeads in self.novelIndex.loadedValues():
+                if not self._checkHeads(theHeads):
+                    self.indexBroken = True
 
-            for tHandle in self.noteIndex:
-                for sLine in self.noteIndex[tHandle]:
-                    if len(self.noteIndex[tHandle][sLine].keys()) != 8:
-                        self.indexBroken = True
+            for theHeads in self.noteIndex.loadedValues():
+                if not self._checkHeads(theHeads):
+                    self.indexBroken = True
 
             for tHandle in self.textCounts:
                 if len(self.textCounts[tHandle]) != 3:
                     self.indexBroken = True
 
+            for tHandle in self.docStamps:
+                if len(self.docStamps[tHandle]) != 4:
+                    self.indexBroken = True
+
+            for tTag in self._tagRefs:
+                if not isinstance(self._tagRefs[tTag], dict):
+                    self.indexBroken = True
+
         except Exception:
             self.indexBroken = True
 
@@ -252,6 +413,27 @@ class NWIndex():
 
         return
 
+    @staticmethod
+    def _checkRefs(theRefs):
+        """Check the reference entries of a single document.
+        """
+        for sTitle in theRefs:
+            for tEntry in theRefs[sTitle]["tags"]:
+                if len(tEntry) != 3:
+                    return False
+        return True
+
+    @staticmethod
+    def _checkHeads(theHeads):
+        """Check the header entries of a single document.
+        """
+        for nLine in theHeads:
+            if not isinstance(nLine, int):
+                return False
+            if not isinstance(theHeads[nLine], IndexHeading):
+                return False
+        return True
+
     ##
     #  Index Building
     ##
@@ -262,102 +444,161 @@ class NWIndex():
         and text as separate inputs as we want to primarily scan the
         files before we save them, unless we're rebuilding the index.
         """
+        theItem, doIndex = self._checkItem(tHandle)
+        if theItem is None:
+            return False
+
+        isNovel = theItem.itemLayout != nwItemLayout.NOTE
+        theScan = scanDocText(theText, theItem.itemLayout.name, isNovel, doIndex)
+        docSize, docTime = self._docFileStat(tHandle)
+
+        return self._mergeScan(tHandle, theScan, docSize, docTime)
+
+    def scanDocuments(self, theHandles, numWorkers=1):
+        """Read and scan a list of documents from disk. With more than
+        one worker, the documents are read and parsed in a pool of
+        worker processes, while the results are merged into the index
+        in the order of the list. This is a generator that yields each
+        handle once it has been processed, so the caller can report
+        progress. A numWorkers of 0 or less means automatic.
+        """
+        theJobs = []
+        noScan = set()
+        for tHandle in theHandles:
+            theItem, doIndex = self._checkItem(tHandle)
+            if theItem is None:
+                theJobs.append((tHandle, None))
+                noScan.add(tHandle)
+            else:
+                docPath = os.path.join(self.theProject.projContent, tHandle+".nwd")
+                theJobs.append((tHandle, (
+                    docPath, theItem.itemLayout.name,
+                    theItem.itemLayout != nwItemLayout.NOTE, doIndex
+                )))
+
+        nJobs = len(theJobs)
+        if numWorkers < 1:
+            numWorkers = os.cpu_count() or 1
+            if nJobs < self.PARALLEL_MIN:
+                numWorkers = 1
+        numWorkers = min(numWorkers, nJobs)
+
+        if numWorkers > 1:
+            logger.debug("Indexing %d documents using %d workers" % (nJobs, numWorkers))
+            theResults = runWorkers(_scanWorker, theJobs, numWorkers)
+        else:
+            theResults = ((tHandle, None) for tHandle, _ in theJobs)
+
+        theDoc = NWDoc(self.theProject, self.theParent)
+        for tHandle, theResult in theResults:
+            if theResult is not None:
+                self._mergeScan(tHandle, *theResult)
+            elif tHandle not in noScan:
+                # Serial path, or the worker could not read the file
+                theText = theDoc.openDocument(tHandle, showStatus=False)
+                self.scanText(tHandle, theText)
+            yield tHandle
+
+        return
+
+    def _checkItem(self, tHandle):
+        """Check if an item can be scanned, and whether its content
+        should be added to the index or only counted. Returns the item,
+        or None if it cannot be scanned, and the index flag.
+        """
         theItem = self.theProject.projTree[tHandle]
         theRoot = self.theProject.projTree.getRootItem(tHandle)
 
         if theItem is None:
             logger.info("Not indexing unknown item %s" % tHandle)
-            return False
+            return None, False
         if theItem.itemType != nwItemType.FILE:
             logger.info("Not indexing non-file item %s" % tHandle)
-            return False
+            return None, False
         if theItem.itemLayout == nwItemLayout.NO_LAYOUT:
             logger.info("Not indexing no-layout item %s" % tHandle)
-            return False
+            return None, False
         if theItem.itemParent is None:
             logger.info("Not indexing orphaned item %s" % tHandle)
-            return False
-
-        # Run word counter for the whole text
-        cC, wC, pC = countWords(theText)
-        self.textCounts[tHandle] = [cC, wC, pC]
+            return None, False
 
-        # If the file is archived or trashed, we don't index the file itself
+        # If the file is archived or trashed, we only count the words
         if self.theProject.projTree.isTrashRoot(theItem.itemParent):
             logger.info("Not indexing trash item %s" % tHandle)
-            return False
+            return theItem, False
         if theRoot.itemClass == nwItemClass.ARCHIVE:
             logger.info("Not indexing archived item %s" % tHandle)
+            return theItem, False
+
+        return theItem, True
+
+    def _mergeScan(self, tHandle, theScan, docSize, docTime):
+        """Merge the result of a document scan into the index.
+        """
+        theItem = self.theProject.projTree[tHandle]
+        if theItem is None:
             return False
 
-        itemClass  = theItem.itemClass
-        itemLayout = theItem.itemLayout
+        if self.changedHandles is not None:
+            self.changedHandles.add(tHandle)
+        self._dirtyShards.add(tHandle)
+        self._dirtyStamps.add(tHandle)
+
+        self.textCounts[tHandle] = theScan["counts"]
+        self.docStamps[tHandle] = [
+            docSize, docTime, theScan["hash"], self._docLocation(tHandle)
+        ]
+        self._dropWords(tHandle)
+        self._addWords(tHandle, theScan["words"])
+        if not theScan["indexed"]:
+            return False
 
         logger.debug("Indexing item with handle %s" % tHandle)
+        nowTime = round(time())
 
-        # Check file type, and reset its old index
-        # Also add a dummy entry T000000 in case the file has no title
+        # Reset the old index of the file
+        self._dropRefs(tHandle)
         self.refIndex[tHandle] = {}
-        self.refIndex[tHandle]["T000000"] = {
-            "tags"    : [],
-            "updated" : round(time()),
-        }
-        if itemLayout == nwItemLayout.NOTE:
-            self.noteIndex[tHandle] = {}
-            isNovel = False
+        for sTitle, theRefs in theScan["refs"].items():
+            self.refIndex[tHandle][sTitle] = {
+                "tags"    : theRefs,
+                "updated" : nowTime,
+            }
+        self._addRefs(tHandle)
+
+        theHeads = theScan["heads"]
+        for theHead in theHeads.values():
+            theHead.updated = nowTime
+
+        if theScan["novel"]:
+            self.novelIndex[tHandle] = theHeads
+            self._novelVersion += 1
         else:
-            self.novelIndex[tHandle] = {}
-            isNovel = True
+            self.noteIndex[tHandle] = theHeads
 
         # Also clear references to file in tag index
-        clearTags = []
-        for aTag in self.tagIndex:
-            if self.tagIndex[aTag][1] == tHandle:
-                clearTags.append(aTag)
-        for aTag in clearTags:
-            self.tagIndex.pop(aTag)
-
-        nLine  = 0
-        nTitle = 0
-        theLines = theText.splitlines()
-        for aLine in theLines:
-            aLine  = aLine
-            nLine += 1
-            nChar  = len(aLine.strip())
-            if nChar == 0:
-                continue
-
-            if aLine.startswith(r"#"):
-                isTitle = self._indexTitle(tHandle, isNovel, aLine, nLine, itemLayout)
-                if isTitle and nLine > 0:
-                    if nTitle > 0:
-                        lastText = "\n".join(theLines[nTitle-1:nLine-1])
-                        self._indexWordCounts(tHandle, isNovel, lastText, nTitle)
-                    nTitle = nLine
-
-            elif aLine.startswith(r"@"):
-                self._indexNoteRef(tHandle, aLine, nLine, nTitle)
-                self._indexTag(tHandle, aLine, nLine, nTitle, itemClass)
-
-            elif aLine.startswith(r"%"):
-                if nTitle > 0:
-                    toCheck = aLine[1:].lstrip()
-                    synTag = toCheck[:9].lower()
-                    tLen = len(aLine)
-                    cLen = len(toCheck)
-                    cOff = tLen - cLen
-                    if synTag == "synopsis:":
-                        self._indexSynopsis(tHandle, isNovel, aLine[cOff+9:].strip(), nTitle)
-
-        # Count words for remaining text after last heading
-        if nTitle > 0:
-            lastText = "\n".join(theLines[nTitle-1:])
-            self._indexWordCounts(tHandle, isNovel, lastText, nTitle)
+        self._dropTags(tHandle)
+
+        theOwned = set()
+        itemClass = theItem.itemClass.name
+        for theTag, nLine, sTitle in theScan["tags"]:
+            if theTag in self.tagIndex:
+                # The tag is taken over from another document
+                oHandle = self.tagIndex[theTag][1]
+                oOwned = self._tagOwned.get(oHandle, set())
+                oOwned.discard(theTag)
+                if not oOwned:
+                    self._tagOwned.pop(oHandle, None)
+            self.tagIndex[theTag] = [nLine, tHandle, itemClass, sTitle]
+            theOwned.add(theTag)
+        if theOwned:
+            self._tagOwned[tHandle] = theOwned
+        else:
+            self._tagOwned.pop(tHandle, None)
 
         # Update timestamps for index changes
-        nowTime = round(time())
         self.timeIndex = nowTime
-        if isNovel:
+        if theScan["novel"]:
             self.timeNovel = nowTime
         else:
             self.timeNote = nowTime
@@ -365,124 +606,589 @@ class NWIndex():
         return True
 
     ##
-    #  Internal Indexers
+    #  Lookup Maps
     ##
 
-    def _indexTitle(self, tHandle, isNovel, aLine, nLine, itemLayout):
-        """Save information about the title and its location in the
-        file to the index.
-        """
-        if aLine.startswith("# "):
-            hDepth = "H1"
-            hText  = aLine[2:].strip()
-        elif aLine.startswith("## "):
-            hDepth = "H2"
-            hText  = aLine[3:].strip()
-        elif aLine.startswith("### "):
-            hDepth = "H3"
-            hText  = aLine[4:].strip()
-        elif aLine.startswith("#### "):
-            hDepth = "H4"
-            hText  = aLine[5:].strip()
-        else:
+    def _buildLookupMaps(self):
+        """Build the tag ownership and back reference maps from the
+        tag and reference indices.
+        """
+        self._tagOwned = {}
+        self._tagRefs  = {}
+        for tTag, tEntry in self.tagIndex.items():
+            self._tagOwned.setdefault(tEntry[1], set()).add(tTag)
+        for tHandle in self.refIndex:
+            self._addRefs(tHandle)
+        return
+
+    def _dropTags(self, tHandle):
+        """Remove the tags defined by a handle from the tag index. Only
+        the handle's own tags are looked at.
+        """
+        for tTag in self._tagOwned.pop(tHandle, ()):
+            tEntry = self.tagIndex.get(tTag, None)
+            if tEntry is not None and tEntry[1] == tHandle:
+                self.tagIndex.pop(tTag)
+        return
+
+    def _addRefs(self, tHandle):
+        """Add the references made by a handle to the back reference
+        map. Only the first title referring to a tag is recorded.
+        """
+        for sTitle, theRefs in self.refIndex.get(tHandle, {}).items():
+            for _, _, tTag in theRefs["tags"]:
+                self._tagRefs.setdefault(tTag, {}).setdefault(tHandle, sTitle)
+        return
+
+    def _dropRefs(self, tHandle):
+        """Remove the references made by a handle from the back
+        reference map.
+        """
+        for theRefs in self.refIndex.get(tHandle, {}).values():
+            for _, _, tTag in theRefs["tags"]:
+                tagRefs = self._tagRefs.get(tTag, None)
+                if tagRefs is None:
+                    continue
+                tagRefs.pop(tHandle, None)
+                if not tagRefs:
+                    self._tagRefs.pop(tTag)
+        return
+
+    ##
+    #  Word Index
+    ##
+
+    def _addWords(self, tHandle, theWords):
+        """Add the word postings of a document to the word index.
+        """
+        for aWord, theLines in theWords.items():
+            self.wordIndex.setdefault(aWord, {})[tHandle] = theLines
+        self._wordOwn[tHandle] = set(theWords)
+        return
+
+    def _dropWords(self, tHandle):
+        """Remove the word postings of a document from the word index.
+        """
+        for aWord in self._wordOwn.pop(tHandle, ()):
+            wordRefs = self.wordIndex.get(aWord, None)
+            if wordRefs is not None:
+                wordRefs.pop(tHandle, None)
+                if not wordRefs:
+                    self.wordIndex.pop(aWord)
+        return
+
+    def _fillWords(self):
+        """The word index is not saved with the index, so documents
+        that have not been scanned in this session are read the first
+        time the word index is used.
+        """
+        nFill = 0
+        for tHandle in self.theProject.projTree.handles():
+            if tHandle in self._wordOwn:
+                continue
+            tItem = self.theProject.projTree[tHandle]
+            if tItem is None or tItem.itemType != nwItemType.FILE:
+                continue
+            docPath = os.path.join(self.theProject.projContent, tHandle+".nwd")
+            try:
+                theText = readDocText(docPath)
+            except Exception as e:
+                logger.error("Failed to read document %s" % tHandle)
+                logger.error(str(e))
+                continue
+            self._addWords(tHandle, scanDocWords(theText.splitlines()))
+            nFill += 1
+
+        if nFill > 0:
+            logger.debug("Added %d documents to the word index" % nFill)
+
+        return
+
+    ##
+    #  Index Files
+    ##
+
+    def _loadIndexFile(self, indexFile):
+        """Load the index from a single file.
+        """
+        logger.debug("Loading index file")
+        try:
+            with open(indexFile, mode="r", encoding="utf8") as inFile:
+                theData = json.load(inFile)
+            for mapName in ("novelIndex", "noteIndex"):
+                if mapName in theData.keys():
+                    theData[mapName] = {
+                        tHandle: _unpackHeads(theHeads)
+                        for tHandle, theHeads in theData[mapName].items()
+                    }
+        except Exception as e:
+            logger.error("Failed to load index file")
+            logger.error(str(e))
             return False
 
-        sTitle = "T%06d" % nLine
-        self.refIndex[tHandle][sTitle] = {
-            "tags"    : [],
-            "updated" : round(time()),
-        }
-        theData = {
-            "level"    : hDepth,
-            "title"    : hText,
-            "layout"   : itemLayout.name,
-            "synopsis" : "",
-            "cCount"   : 0,
-            "wCount"   : 0,
-            "pCount"   : 0,
-            "updated"  : round(time()),
-        }
+        if "tagIndex" in theData.keys():
+            self.tagIndex = theData["tagIndex"]
+        if "refIndex" in theData.keys():
+            self.refIndex = LazyIndexMap(self, theData["refIndex"])
+        if "novelIndex" in theData.keys():
+            self.novelIndex = LazyIndexMap(self, theData["novelIndex"])
+        if "noteIndex" in theData.keys():
+            self.noteIndex = LazyIndexMap(self, theData["noteIndex"])
+        if "textCounts" in theData.keys():
+            self.textCounts = theData["textCounts"]
 
-        if hText != "":
-            if isNovel:
-                if tHandle in self.novelIndex:
-                    self.novelIndex[tHandle][sTitle] = theData
-            else:
-                if tHandle in self.noteIndex:
-                    self.noteIndex[tHandle][sTitle] = theData
+        return True
+
+    def _saveIndexFile(self):
+        """Save the whole index as a single file.
+        """
+        logger.debug("Saving index file")
+        indexFile = os.path.join(self.theProject.projMeta, nwFiles.INDEX_FILE)
+
+        try:
+            with open(indexFile, mode="w+", encoding="utf8") as outFile:
+                json.dump({
+                    "tagIndex"   : self.tagIndex,
+                    "refIndex"   : dict(self.refIndex),
+                    "novelIndex" : {
+                        tHandle: _packHeads(theHeads)
+                        for tHandle, theHeads in self.novelIndex.items()
+                    },
+                    "noteIndex"  : {
+                        tHandle: _packHeads(theHeads)
+                        for tHandle, theHeads in self.noteIndex.items()
+                    },
+                    "textCounts" : self.textCounts,
+                }, outFile, indent=2)
+        except Exception as e:
+            logger.error("Failed to save index file")
+            logger.error(str(e))
+            return False
 
         return True
 
-    def _indexWordCounts(self, tHandle, isNovel, theText, nTitle):
-        """Count text stats and save the counts to the index.
-        """
-        cC, wC, pC = countWords(theText)
-        sTitle = "T%06d" % nTitle
-        if isNovel:
-            if tHandle in self.novelIndex:
-                if sTitle in self.novelIndex[tHandle]:
-                    self.novelIndex[tHandle][sTitle]["cCount"] = cC
-                    self.novelIndex[tHandle][sTitle]["wCount"] = wC
-                    self.novelIndex[tHandle][sTitle]["pCount"] = pC
-                    self.novelIndex[tHandle][sTitle]["updated"] = round(time())
-        else:
-            if tHandle in self.noteIndex:
-                if sTitle in self.noteIndex[tHandle]:
-                    self.noteIndex[tHandle][sTitle]["cCount"] = cC
-                    self.noteIndex[tHandle][sTitle]["wCount"] = wC
-                    self.noteIndex[tHandle][sTitle]["pCount"] = pC
-                    self.noteIndex[tHandle][sTitle]["updated"] = round(time())
-        return
+    def _loadIndexShards(self, shardFile):
+        """Load the index manifest. It holds the tags, counts and back
+        references, while the rest of the index is left in the shard
+        files until it is used.
+        """
+        logger.debug("Loading index manifest")
+        try:
+            with open(shardFile, mode="r", encoding="utf8") as inFile:
+                theData = json.load(inFile)
+        except Exception as e:
+            logger.error("Failed to load index manifest")
+            logger.error(str(e))
+            return False
+
+        self.tagIndex   = theData.get("tagIndex", {})
+        self.textCounts = theData.get("textCounts", {})
+        self._tagRefs   = theData.get("tagRefs", {})
+        self.refIndex   = LazyIndexMap(self)
+        self.novelIndex = LazyIndexMap(self)
+        self.noteIndex  = LazyIndexMap(self)
+
+        theMaps = self._shardMaps()
+        for tHandle, mapNames in theData.get("shards", {}).items():
+            for mapName in mapNames:
+                if mapName in theMaps:
+                    theMaps[mapName].setUnloaded(tHandle)
 
-    def _indexSynopsis(self, tHandle, isNovel, theText, nTitle):
-        """Save the synopsis to the index.
+        self._tagOwned = {}
+        for tTag, tEntry in self.tagIndex.items():
+            self._tagOwned.setdefault(tEntry[1], set()).add(tTag)
+
+        return True
+
+    def _saveIndexShards(self):
+        """Save the index manifest, and the shard files of the handles
+        that have changed since the last save.
         """
-        sTitle = "T%06d" % nTitle
-        if isNovel:
-            if tHandle in self.novelIndex:
-                if sTitle in self.novelIndex[tHandle]:
-                    self.novelIndex[tHandle][sTitle]["synopsis"] = theText
-                    self.novelIndex[tHandle][sTitle]["updated"] = round(time())
-        else:
-            if tHandle in self.noteIndex:
-                if sTitle in self.noteIndex[tHandle]:
-                    self.noteIndex[tHandle][sTitle]["synopsis"] = theText
-                    self.noteIndex[tHandle][sTitle]["updated"] = round(time())
+        logger.debug("Saving index shards")
+        shardPath = self._shardPath()
+        theMaps = self._shardMaps()
+
+        try:
+            if not os.path.isdir(shardPath):
+                os.mkdir(shardPath)
+
+            theHandles = set(self._dirtyHandles())
+            shardMain = os.path.join(shardPath, nwFiles.INDEX_MAIN)
+            if not (theHandles or self._allDirty) and os.path.isfile(shardMain):
+                logger.debug("No index shards have changed")
+                return True
+
+            if self._allDirty:
+                for fileName in os.listdir(shardPath):
+                    if fileName != nwFiles.INDEX_MAIN and fileName.endswith(".json"):
+                        theHandles.add(fileName[:-5])
+
+            theShards = {}
+            for mapName, theMap in theMaps.items():
+                for tHandle in theMap:
+                    theShards.setdefault(tHandle, []).append(mapName)
+
+            for tHandle in theHandles:
+                shardFile = os.path.join(shardPath, tHandle+".json")
+                theShard = self._packShard(tHandle)
+                if theShard:
+                    _writeJson(shardFile, theShard)
+                elif os.path.isfile(shardFile):
+                    os.unlink(shardFile)
+
+            _writeJson(shardMain, {
+                "tagIndex"   : self.tagIndex,
+                "textCounts" : self.textCounts,
+                "tagRefs"    : self._tagRefs,
+                "shards"     : theShards,
+            })
+
+        except Exception as e:
+            logger.error("Failed to save index shards")
+            logger.error(str(e))
+            return False
+
+        logger.debug("Saved %d index shards" % len(theHandles))
+
+        return True
+
+    def _loadShard(self, tHandle):
+        """Load the shard file of a handle into the index. If the file
+        is missing or broken, the entries are left empty, and the
+        fingerprint is dropped so the document is scanned again on the
+        next index update.
+        """
+        logger.verbose("Loading index shard for item %s" % tHandle)
+
+        theShard = {}
+        try:
+            if self._shardSource == "sqlite":
+                theShard = self._readShardSQLite(tHandle)
+            else:
+                shardFile = os.path.join(self._shardPath(), tHandle+".json")
+                with open(shardFile, mode="r", encoding="utf8") as inFile:
+                    theShard = json.load(inFile)
+            for mapName in ("novelIndex", "noteIndex"):
+                if mapName in theShard:
+                    theShard[mapName] = _unpackHeads(theShard[mapName])
+            if not self._checkRefs(theShard.get("refIndex", {})):
+                raise ValueError("Invalid reference entry")
+            if not self._checkHeads(theShard.get("novelIndex", {})):
+                raise ValueError("Invalid novel header entry")
+            if not self._checkHeads(theShard.get("noteIndex", {})):
+                raise ValueError("Invalid note header entry")
+        except Exception as e:
+            logger.error("Failed to load index shard for item %s" % tHandle)
+            logger.error(str(e))
+            theShard = {}
+            self.docStamps.pop(tHandle, None)
+            self._dirtyStamps.add(tHandle)
+
+        for mapName, theMap in self._shardMaps().items():
+            if tHandle in theMap and not theMap.isLoaded(tHandle):
+                theMap[tHandle] = theShard.get(mapName, {})
+
         return
 
-    def _indexNoteRef(self, tHandle, aLine, nLine, nTitle):
-        """Validate and save the information about a reference to a tag
-        in another file.
+    def _loadIndexSQLite(self, dbFile):
+        """Load the tags, counts and back references from the index
+        database. The rest of the index is read per document when it is
+        first used.
+        """
+        logger.debug("Loading index database")
+        try:
+            with closing(sqlite3.connect(dbFile)) as theDB:
+                tagIndex = {}
+                for tTag, tHandle, nLine, sClass, sTitle in theDB.execute(
+                    "SELECT tag, handle, line, class, title FROM tags ORDER BY rowid"
+                ):
+                    tagIndex[tTag] = [nLine, tHandle, sClass, sTitle]
+
+                tagRefs = {}
+                for tTag, tHandle, sTitle in theDB.execute(
+                    "SELECT tag, handle, title FROM tagrefs ORDER BY rowid"
+                ):
+                    tagRefs.setdefault(tTag, {})[tHandle] = sTitle
+
+                textCounts = {}
+                refIndex   = LazyIndexMap(self)
+                novelIndex = LazyIndexMap(self)
+                noteIndex  = LazyIndexMap(self)
+                for tHandle, theCounts, hasRefs, hasNovel, hasNote in theDB.execute(
+                    "SELECT handle, counts, refs NOT NULL, novel NOT NULL, note NOT NULL "
+                    "FROM docs ORDER BY rowid"
+                ):
+                    if theCounts is not None:
+                        textCounts[tHandle] = json.loads(theCounts)
+                    if hasRefs:
+                        refIndex.setUnloaded(tHandle)
+                    if hasNovel:
+                        novelIndex.setUnloaded(tHandle)
+                    if hasNote:
+                        noteIndex.setUnloaded(tHandle)
+
+        except Exception as e:
+            logger.error("Failed to load index database")
+            logger.error(str(e))
+            return False
+
+        self.tagIndex   = tagIndex
+        self.refIndex   = refIndex
+        self.novelIndex = novelIndex
+        self.noteIndex  = noteIndex
+        self.textCounts = textCounts
+        self._tagRefs   = tagRefs
+
+        self._tagOwned = {}
+        for tTag, tEntry in self.tagIndex.items():
+            self._tagOwned.setdefault(tEntry[1], set()).add(tTag)
+
+        return True
+
+    def _saveIndexSQLite(self):
+        """Write the documents that have changed since the last save
+        to the index database. All changes are written in a single
+        transaction, so an interrupted save leaves the previous index.
         """
-        isValid, theBits, _ = self.scanThis(aLine)
-        if not isValid or len(theBits) == 0:
+        logger.debug("Saving index database")
+        dbFile = os.path.join(self.theProject.projMeta, nwFiles.INDEX_DB)
+
+        try:
+            # Collect the rows first, as this may read from the database
+            theRows = [self._docRowsSQLite(tHandle) for tHandle in self._dirtyHandles()]
+            with closing(sqlite3.connect(dbFile)) as theDB:
+                theDB.executescript(_SQL_SCHEMA)
+                with theDB:
+                    if self._allDirty:
+                        theDB.execute("DELETE FROM docs")
+                        theDB.execute("DELETE FROM tags")
+                        theDB.execute("DELETE FROM tagrefs")
+                    for tHandle, docRow, tagRows, refRows in theRows:
+                        theDB.execute("DELETE FROM docs WHERE handle = ?", (tHandle,))
+                        theDB.execute("DELETE FROM tags WHERE handle = ?", (tHandle,))
+                        theDB.execute("DELETE FROM tagrefs WHERE handle = ?", (tHandle,))
+                        if docRow is not None:
+                            theDB.execute("INSERT INTO docs VALUES (?, ?, ?, ?, ?)", docRow)
+                        theDB.executemany(
+                            "INSERT OR REPLACE INTO tags VALUES (?, ?, ?, ?, ?)", tagRows
+                        )
+                        theDB.executemany("INSERT INTO tagrefs VALUES (?, ?, ?)", refRows)
+
+        except Exception as e:
+            logger.error("Failed to save index database")
+            logger.error(str(e))
             return False
 
-        sTitle = "T%06d" % nTitle
-        if sTitle in self.refIndex[tHandle] and theBits[0] != nwKeyWords.TAG_KEY:
-            for aVal in theBits[1:]:
-                self.refIndex[tHandle][sTitle]["tags"].append([nLine, theBits[0], aVal])
+        logger.debug("Saved %d documents to the index database" % len(theRows))
 
         return True
 
-    def _indexTag(self, tHandle, aLine, nLine, nTitle, itemClass):
-        """Validate and save the information from a tag.
+    def _docRowsSQLite(self, tHandle):
+        """Build the database rows of a document. The document row is
+        None if the document is not in the index.
+        """
+        docRow = [tHandle, None, None, None, None]
+        if tHandle in self.textCounts:
+            docRow[1] = json.dumps(self.textCounts[tHandle])
+        theShard = self._packShard(tHandle)
+        for i, mapName in enumerate(self._shardMaps()):
+            if mapName in theShard:
+                docRow[i+2] = json.dumps(theShard[mapName])
+        if docRow[1:] == [None, None, None, None]:
+            docRow = None
+
+        tagRows = []
+        for tTag in self._tagOwned.get(tHandle, ()):
+            nLine, _, sClass, sTitle = self.tagIndex[tTag]
+            tagRows.append((tTag, tHandle, nLine, sClass, sTitle))
+
+        refRows = []
+        refTags = set()
+        for theRefs in self.refIndex.get(tHandle, {}).values():
+            for _, _, tTag in theRefs["tags"]:
+                if tTag not in refTags:
+                    refTags.add(tTag)
+                    refRows.append((tTag, tHandle, self._tagRefs[tTag][tHandle]))
+
+        return tHandle, docRow, tagRows, refRows
+
+    def _readShardSQLite(self, tHandle):
+        """Read the references and headers of a document from the
+        index database.
+        """
+        theShard = {}
+        dbFile = os.path.join(self.theProject.projMeta, nwFiles.INDEX_DB)
+        with closing(sqlite3.connect(dbFile)) as theDB:
+            theRow = theDB.execute(
+                "SELECT refs, novel, note FROM docs WHERE handle = ?", (tHandle,)
+            ).fetchone()
+        if theRow is None:
+            raise ValueError("No database entry")
+        for mapName, theValue in zip(self._shardMaps(), theRow):
+            if theValue is not None:
+                theShard[mapName] = json.loads(theValue)
+        return theShard
+
+    def _packShard(self, tHandle):
+        """Return the entries of a handle in the shard maps, in the
+        same format as the index file.
+        """
+        theShard = {}
+        for mapName, theMap in self._shardMaps().items():
+            if tHandle in theMap:
+                if mapName == "refIndex":
+                    theShard[mapName] = theMap[tHandle]
+                else:
+                    theShard[mapName] = _packHeads(theMap[tHandle])
+        return theShard
+
+    def _dirtyHandles(self):
+        """Return the handles that must be written on the next save,
+        in index order if everything is to be written.
         """
-        isValid, theBits, thePos = self.scanThis(aLine)
-        if not isValid or len(theBits) != 2:
+        if not self._allDirty:
+            return list(self._dirtyShards)
+        theHandles = dict.fromkeys(self.textCounts)
+        for theMap in self._shardMaps().values():
+            theHandles.update(dict.fromkeys(theMap))
+        return list(theHandles)
+
+    def _indexFiles(self):
+        """Return the main index file of each storage format.
+        """
+        return {
+            "json"   : os.path.join(self.theProject.projMeta, nwFiles.INDEX_FILE),
+            "shards" : os.path.join(self._shardPath(), nwFiles.INDEX_MAIN),
+            "sqlite" : os.path.join(self.theProject.projMeta, nwFiles.INDEX_DB),
+        }
+
+    def _shardPath(self):
+        """Return the path to the index shards folder.
+        """
+        return os.path.join(self.theProject.projMeta, nwFiles.INDEX_DIR)
+
+    def _shardMaps(self):
+        """Return the index maps that are stored in the shard files.
+        """
+        return {
+            "refIndex"   : self.refIndex,
+            "novelIndex" : self.novelIndex,
+            "noteIndex"  : self.noteIndex,
+        }
+
+    ##
+    #  Document Fingerprints
+    ##
+
+    def _loadDocStamps(self):
+        """Load the document fingerprints from the project meta folder.
+        Each line of the file updates the fingerprints of the previous
+        lines, and a None value removes one. A missing or unreadable
+        file just means every document will be considered changed.
+        """
+        self.docStamps = {}
+        self._dirtyStamps = set()
+        self._stampLines  = None
+        stampFile = os.path.join(self.theProject.projMeta, nwFiles.INDEX_STAMP)
+        if not os.path.isfile(stampFile):
             return False
 
-        if theBits[0] == nwKeyWords.TAG_KEY:
-            sTitle = "T%06d" % nTitle
-            self.tagIndex[theBits[1]] = [nLine, tHandle, itemClass.name, sTitle]
+        theStamps = {}
+        nLines = 0
+        try:
+            with open(stampFile, mode="r", encoding="utf8") as inFile:
+                for aLine in inFile:
+                    if not aLine.strip():
+                        continue
+                    theData = json.loads(aLine)
+                    if not isinstance(theData, dict):
+                        raise ValueError("Invalid fingerprints entry")
+                    for tHandle, theStamp in theData.items():
+                        if theStamp is None:
+                            theStamps.pop(tHandle, None)
+                        else:
+                            theStamps[tHandle] = theStamp
+                    nLines += 1
+        except Exception as e:
+            logger.error("Failed to load index fingerprints file")
+            logger.error(str(e))
+            return False
+
+        self.docStamps   = theStamps
+        self._stampLines = nLines
+
+        return True
+
+    def _saveDocStamps(self):
+        """Save the document fingerprints next to the index file. Only
+        the fingerprints that have changed since the last save are
+        appended to the file, which is rewritten in full when it has
+        grown to STAMP_LINES lines.
+        """
+        stampFile = os.path.join(self.theProject.projMeta, nwFiles.INDEX_STAMP)
+        if self._stampLines is not None and not self._dirtyStamps:
+            return True
+
+        try:
+            if self._stampLines is None or self._stampLines >= self.STAMP_LINES:
+                _writeJson(stampFile, self.docStamps)
+                self._stampLines = 1
+            else:
+                theStamps = {
+                    tHandle: self.docStamps.get(tHandle, None) for tHandle in self._dirtyStamps
+                }
+                with open(stampFile, mode="a", encoding="utf8") as outFile:
+                    outFile.write("\n"+json.dumps(theStamps))
+                self._stampLines += 1
+        except Exception as e:
+            logger.error("Failed to save index fingerprints file")
+            logger.error(str(e))
+            self._stampLines = None
+            return False
+
+        self._dirtyStamps = set()
 
         return True
 
+    def _docFileStat(self, tHandle):
+        """Return the size and modification time of a document file, or
+        zeros if the file doesn't exist.
+        """
+        docPath = os.path.join(self.theProject.projContent, tHandle+".nwd")
+        try:
+            docStat = os.stat(docPath)
+        except Exception:
+            return 0, 0.0
+        return docStat.st_size, docStat.st_mtime
+
+    def _docLocation(self, tHandle):
+        """Describe where in the project tree an item sits, as far as the
+        index is concerned. A change in any of these values means the
+        content must be re-indexed.
+        """
+        theItem = self.theProject.projTree[tHandle]
+        if theItem is None:
+            return ""
+
+        if theItem.itemParent is None:
+            thePlace = "ORPHAN"
+        elif self.theProject.projTree.isTrashRoot(theItem.itemParent):
+            thePlace = "TRASH"
+        else:
+            theRoot = self.theProject.projTree.getRootItem(tHandle)
+            if theRoot is not None and theRoot.itemClass == nwItemClass.ARCHIVE:
+                thePlace = "ARCHIVE"
+            else:
+                thePlace = "ACTIVE"
+
+        return "%s:%s:%s" % (thePlace, theItem.itemClass.name, theItem.itemLayout.name)
+
     ##
     #  Check @ Lines
     ##
 
-    def scanThis(self, aLine):
+    @staticmethod
+    def scanThis(aLine):
         """Scan a line starting with @ to check that it's valid. Then
         split it up into its elements and positions as two arrays.
         """
@@ -559,20 +1265,31 @@ class NWIndex():
     ##
 
     def getNovelStructure(self, skipExcluded=True):
-        """Builds a list of all titles in the novel, in the correct
+        """Builds a tuple of all titles in the novel, in the correct
         order as they appear in the tree view and in the respective
-        document files, but skipping all note files.
+        document files, but skipping all note files. Each entry is a
+        tuple of handle and title key. The result is cached until the
+        novel index or the project tree changes.
         """
+        theKey = (self.theProject.projTree.treeVersion(), self._novelVersion)
+        theCache = self._novelCache.get(skipExcluded, None)
+        if theCache is not None and theCache[0] == theKey:
+            return theCache[1]
+
         theStructure = []
-        for tItem in self.theProject.projTree:
-            if tItem is not None:
-                if not tItem.isExported and skipExcluded:
-                    continue
-                tHandle = tItem.itemHandle
-                if tHandle not in self.novelIndex:
-                    continue
-                for sTitle in sorted(self.novelIndex[tHandle].keys()):
-                    theStructure.append("%s:%s" % (tHandle, sTitle))
+        for tHandle in self.theProject.projTree.handles():
+            if tHandle not in self.novelIndex:
+                continue
+            tItem = self.theProject.projTree[tHandle]
+            if tItem is None:
+                continue
+            if not tItem.isExported and skipExcluded:
+                continue
+            for nLine in sorted(self.novelIndex[tHandle].keys()):
+                theStructure.append((tHandle, "T%06d" % nLine))
+
+        theStructure = tuple(theStructure)
+        self._novelCache[skipExcluded] = (theKey, theStructure)
 
         return theStructure
 
@@ -590,19 +1307,25 @@ class NWIndex():
                 wC = self.textCounts[tHandle][1]
                 pC = self.textCounts[tHandle][2]
         else:
-            if tHandle in self.novelIndex:
-                if sTitle in self.novelIndex[tHandle]:
-                    cC = self.novelIndex[tHandle][sTitle]["cCount"]
-                    wC = self.novelIndex[tHandle][sTitle]["wCount"]
-                    pC = self.novelIndex[tHandle][sTitle]["pCount"]
-            elif tHandle in self.noteIndex:
-                if sTitle in self.noteIndex[tHandle]:
-                    cC = self.noteIndex[tHandle][sTitle]["cCount"]
-                    wC = self.noteIndex[tHandle][sTitle]["wCount"]
-                    pC = self.noteIndex[tHandle][sTitle]["pCount"]
+            theHead = self.getHeading(tHandle, sTitle)
+            if theHead is not None:
+                cC = theHead.cCount
+                wC = theHead.wCount
+                pC = theHead.pCount
 
         return cC, wC, pC
 
+    def getHeading(self, tHandle, sTitle):
+        """Returns the heading record of a file for a title key, or
+        None if there is no such heading.
+        """
+        nLine = _titleLine(sTitle)
+        if tHandle in self.novelIndex:
+            return self.novelIndex[tHandle].get(nLine, None)
+        elif tHandle in self.noteIndex:
+            return self.noteIndex[tHandle].get(nLine, None)
+        return None
+
     def getReferences(self, tHandle, sTitle=None):
         """Extract all references made in a file, and optionally title
         section. sTitle must be a string.
@@ -624,25 +1347,80 @@ class NWIndex():
 
     def getBackReferenceList(self, tHandle):
         """Build a list of files referring back to our file, specified
-        by tHandle.
+        by tHandle. The files are listed in project tree order, and any
+        files not in the tree are listed last, sorted by handle.
         """
         theRefs = {}
         if tHandle is None:
             return theRefs
 
-        theTags = set()
-        for tTag in self.tagIndex:
-            if tHandle == self.tagIndex[tTag][1]:
-                theTags.add(tTag)
+        for tTag in self._tagOwned.get(tHandle, ()):
+            for rHandle, sTitle in self._tagRefs.get(tTag, {}).items():
+                if rHandle not in theRefs or sTitle < theRefs[rHandle]:
+                    theRefs[rHandle] = sTitle
 
-        if theTags:
-            for tHandle in self.refIndex:
-                for sTitle in self.refIndex[tHandle]:
-                    for _, _, tTag in self.refIndex[tHandle][sTitle]["tags"]:
-                        if tTag in theTags and tHandle not in theRefs:
-                            theRefs[tHandle] = sTitle
+        if len(theRefs) < 2:
+            return theRefs
 
-        return theRefs
+        treeHandles = self.theProject.projTree.handles()
+        treeOrder = {}
+        for n, rHandle in enumerate(treeHandles):
+            if rHandle in theRefs:
+                treeOrder[rHandle] = n
+
+        nTree = len(treeHandles)
+        theOrder = sorted(theRefs, key=lambda h: (treeOrder.get(h, nTree), h))
+
+        return {rHandle: theRefs[rHandle] for rHandle in theOrder}
+
+    def searchProject(self, theText, wholeWord=False):
+        """Look up a search text in the word index. Returns a list of
+        handle and line number pairs, in project tree order, for all
+        the lines that contain all the words of the search text. The
+        word index is not case sensitive, so the lines are candidates
+        that must be checked if case matters. Returns None if the text
+        has no words to look up.
+        """
+        theWords = _WORD_RX.findall(theText.lower())
+        if not theWords:
+            return None
+
+        self._fillWords()
+
+        # Unless we search for whole words, the first and last words
+        # of the search text can be part of longer words in the text
+        theHits = None
+        nLast = len(theWords) - 1
+        for i, aWord in enumerate(theWords):
+            if wholeWord or 0 < i < nLast:
+                theMatches = [aWord] if aWord in self.wordIndex else []
+            elif nLast == 0:
+                theMatches = [x for x in self.wordIndex if aWord in x]
+            elif i == 0:
+                theMatches = [x for x in self.wordIndex if x.endswith(aWord)]
+            else:
+                theMatches = [x for x in self.wordIndex if x.startswith(aWord)]
+
+            wordHits = {}
+            for aMatch in theMatches:
+                for tHandle, theLines in self.wordIndex[aMatch].items():
+                    wordHits.setdefault(tHandle, set()).update(theLines)
+
+            if theHits is None:
+                theHits = wordHits
+            else:
+                theHits = {
+                    tHandle: theHits[tHandle] & theLines
+                    for tHandle, theLines in wordHits.items() if tHandle in theHits
+                }
+
+        theResult = []
+        for tHandle in self.theProject.projTree.handles():
+            if theHits.get(tHandle, None):
+                for nLine in sorted(theHits[tHandle]):
+                    theResult.append((tHandle, nLine))
+
+        return theResult
 
     def getTagSource(self, theTag):
         """Return the source location of a given tag.
@@ -654,3 +1432,342 @@ class NWIndex():
         return None, 0, "T000000"
 
 # END Class NWIndex
+
+# =============================================================================================== #
+#  Lazy Index Map
+#  A dictionary of index entries where entries can be loaded from their shard file on first use.
+# =============================================================================================== #
+
+class LazyIndexMap(MutableMapping):
+
+    def __init__(self, theOwner, theData=None):
+
+        self._theOwner = theOwner
+        self._theData  = {} if theData is None else theData
+
+        return
+
+    def __getitem__(self, tHandle):
+        theValue = self._theData[tHandle]
+        if theValue is None:
+            self._theOwner._loadShard(tHandle)
+            theValue = self._theData[tHandle]
+        return theValue
+
+    def __setitem__(self, tHandle, theValue):
+        self._theData[tHandle] = theValue
+
+    def __delitem__(self, tHandle):
+        del self._theData[tHandle]
+
+    def __contains__(self, tHandle):
+        return tHandle in self._theData
+
+    def __iter__(self):
+        return iter(self._theData)
+
+    def __len__(self):
+        return len(self._theData)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __deepcopy__(self, theMemo):
+        return LazyIndexMap(self._theOwner, deepcopy(self._theData, theMemo))
+
+    def setOwner(self, theOwner):
+        """Set the index that loads the entries of this map.
+        """
+        self._theOwner = theOwner
+        return
+
+    def setUnloaded(self, tHandle):
+        """Add an entry that is loaded from its shard on first use.
+        """
+        self._theData[tHandle] = None
+        return
+
+    def isLoaded(self, tHandle):
+        """Check if the entry of a handle has been loaded.
+        """
+        return self._theData.get(tHandle, None) is not None
+
+    def loadedValues(self):
+        """Return the entries that have been loaded, without loading
+        the rest.
+        """
+        return [theValue for theValue in self._theData.values() if theValue is not None]
+
+# END Class LazyIndexMap
+
+# =============================================================================================== #
+#  Index Heading
+#  A compact record of a heading in the novel or note index.
+# =============================================================================================== #
+
+class IndexHeading():
+
+    __slots__ = (
+        "level", "title", "layout", "synopsis", "cCount", "wCount", "pCount", "updated"
+    )
+
+    def __init__(self, level, title, layout, synopsis="", cCount=0, wCount=0, pCount=0, updated=0):
+
+        self.level    = sys.intern(level)
+        self.title    = title
+        self.layout   = sys.intern(layout)
+        self.synopsis = synopsis
+        self.cCount   = cCount
+        self.wCount   = wCount
+        self.pCount   = pCount
+        self.updated  = updated
+
+        return
+
+    def packData(self):
+        """Return the heading as a dictionary, as used in the index
+        files.
+        """
+        return {
+            "level"    : self.level,
+            "title"    : self.title,
+            "layout"   : self.layout,
+            "synopsis" : self.synopsis,
+            "cCount"   : self.cCount,
+            "wCount"   : self.wCount,
+            "pCount"   : self.pCount,
+            "updated"  : self.updated,
+        }
+
+    @classmethod
+    def unpackData(cls, theData):
+        """Create a heading from a dictionary read from an index file.
+        Raises a ValueError if the entry is not valid.
+        """
+        if not isinstance(theData, dict) or len(theData.keys()) != 8:
+            raise ValueError("Invalid heading entry")
+        return cls(
+            theData["level"], theData["title"], theData["layout"], theData["synopsis"],
+            theData["cCount"], theData["wCount"], theData["pCount"], theData["updated"]
+        )
+
+    def __eq__(self, theOther):
+        if not isinstance(theOther, IndexHeading):
+            return NotImplemented
+        return all(getattr(self, x) == getattr(theOther, x) for x in self.__slots__)
+
+    def __repr__(self):
+        return "IndexHeading(%s)" % ", ".join(repr(getattr(self, x)) for x in self.__slots__)
+
+# END Class IndexHeading
+
+# =============================================================================================== #
+#  Document Scanner
+#  These functions do not depend on the project, so that they can also run in worker processes.
+# =============================================================================================== #
+
+_SQL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    handle TEXT PRIMARY KEY, counts TEXT, refs TEXT, novel TEXT, note TEXT
+);
+CREATE TABLE IF NOT EXISTS tags (
+    tag TEXT PRIMARY KEY, handle TEXT NOT NULL, line INTEGER, class TEXT, title TEXT
+);
+CREATE INDEX IF NOT EXISTS tagsHandle ON tags (handle);
+CREATE TABLE IF NOT EXISTS tagrefs (
+    tag TEXT NOT NULL, handle TEXT NOT NULL, title TEXT, PRIMARY KEY (tag, handle)
+);
+CREATE INDEX IF NOT EXISTS tagrefsHandle ON tagrefs (handle);
+"""
+
+_WORD_RX = re.compile(r"\w+")
+
+def _writeJson(filePath, theData):
+    """Write a compact json file via a temp file.
+    """
+    tempPath = filePath+"~"
+    with open(tempPath, mode="w+", encoding="utf8") as outFile:
+        json.dump(theData, outFile)
+    os.replace(tempPath, filePath)
+    return
+
+def _packHeads(theHeads):
+    """Convert the heading records of a document to the format used
+    in the index files, keyed by title key.
+    """
+    return {"T%06d" % nLine: theHead.packData() for nLine, theHead in theHeads.items()}
+
+def _unpackHeads(theData):
+    """Convert the headings of a document read from an index file to
+    heading records, keyed by line number.
+    """
+    theHeads = {}
+    for sTitle, theHead in theData.items():
+        nLine = _titleLine(sTitle)
+        if nLine is None:
+            raise ValueError("Invalid title key '%s'" % str(sTitle))
+        theHeads[nLine] = IndexHeading.unpackData(theHead)
+    return theHeads
+
+def _titleLine(sTitle):
+    """Return the line number of a title key of the form T000000, or
+    None if it isn't a valid title key.
+    """
+    if not isinstance(sTitle, str) or not sTitle.startswith("T") or not sTitle[1:].isdecimal():
+        return None
+    return int(sTitle[1:])
+
+def textHash(theText):
+    """Compute the content hash used in a document fingerprint.
+    """
+    return sha256(theText.encode("utf8")).hexdigest()
+
+def readDocText(docPath):
+    """Read the text of a document file, skipping the meta data lines
+    at the top, the same way as NWDoc.openDocument does. A missing file
+    returns an empty string.
+    """
+    theText = ""
+    if not os.path.isfile(docPath):
+        return theText
+
+    with open(docPath, mode="r", encoding="utf8") as inFile:
+        for i in range(10):
+            inLine = inFile.readline()
+            if not inLine.startswith(r"%%~"):
+                theText = inLine
+                break
+        theText += inFile.read()
+
+    return theText
+
+def scanDocText(theText, layoutName, isNovel, doIndex):
+    """Parse the text of a document into the entries that go into the
+    index. If doIndex is False, only the counts and hash are computed.
+    """
+    cC, wC, pC = countWords(theText)
+    theLines = theText.splitlines()
+    theScan = {
+        "counts"  : [cC, wC, pC],
+        "hash"    : textHash(theText),
+        "indexed" : doIndex,
+        "novel"   : isNovel,
+        "refs"    : {},
+        "heads"   : {},
+        "tags"    : [],
+        "words"   : scanDocWords(theLines),
+    }
+    if not doIndex:
+        return theScan
+
+    # Add a dummy entry T000000 in case the file has no title
+    theRefs  = theScan["refs"]
+    theHeads = theScan["heads"]
+    theRefs["T000000"] = []
+
+    nLine  = 0
+    nTitle = 0
+    for aLine in theLines:
+        nLine += 1
+        nChar  = len(aLine.strip())
+        if nChar == 0:
+            continue
+
+        if aLine.startswith(r"#"):
+            if aLine.startswith("# "):
+                hDepth = "H1"
+                hText  = aLine[2:].strip()
+            elif aLine.startswith("## "):
+                hDepth = "H2"
+                hText  = aLine[3:].strip()
+            elif aLine.startswith("### "):
+                hDepth = "H3"
+                hText  = aLine[4:].strip()
+            elif aLine.startswith("#### "):
+                hDepth = "H4"
+                hText  = aLine[5:].strip()
+            else:
+                continue
+
+            sTitle = "T%06d" % nLine
+            theRefs[sTitle] = []
+            if hText != "":
+                theHeads[nLine] = IndexHeading(hDepth, hText, layoutName)
+
+            if nTitle > 0:
+                _scanWordCounts(theHeads, theLines[nTitle-1:nLine-1], nTitle)
+            nTitle = nLine
+
+        elif aLine.startswith(r"@"):
+            isValid, theBits, _ = NWIndex.scanThis(aLine)
+            if not isValid or len(theBits) == 0:
+                continue
+
+            sTitle = "T%06d" % nTitle
+            if theBits[0] == nwKeyWords.TAG_KEY:
+                if len(theBits) == 2:
+                    theScan["tags"].append([theBits[1], nLine, sTitle])
+            elif sTitle in theRefs:
+                for aVal in theBits[1:]:
+                    theRefs[sTitle].append([nLine, theBits[0], aVal])
+
+        elif aLine.startswith(r"%"):
+            if nTitle > 0:
+                toCheck = aLine[1:].lstrip()
+                synTag = toCheck[:9].lower()
+                tLen = len(aLine)
+                cLen = len(toCheck)
+                cOff = tLen - cLen
+                if synTag == "synopsis:" and nTitle in theHeads:
+                    theHeads[nTitle].synopsis = aLine[cOff+9:].strip()
+
+    # Count words for remaining text after last heading
+    if nTitle > 0:
+        _scanWordCounts(theHeads, theLines[nTitle-1:], nTitle)
+
+    return theScan
+
+def scanDocWords(theLines):
+    """Build the word postings of a document, that is, the lower case
+    words of the text with the line numbers they appear on.
+    """
+    theWords = {}
+    for nLine, aLine in enumerate(theLines, 1):
+        for aWord in set(_WORD_RX.findall(aLine.lower())):
+            if aWord in theWords:
+                theWords[aWord].append(nLine)
+            else:
+                theWords[aWord] = [nLine]
+    return theWords
+
+def _scanWordCounts(theHeads, theLines, nTitle):
+    """Count text stats for a section and save them to its heading.
+    """
+    if nTitle in theHeads:
+        cC, wC, pC = countWords("\n".join(theLines))
+        theHeads[nTitle].cCount = cC
+        theHeads[nTitle].wCount = wC
+        theHeads[nTitle].pCount = pC
+    return
+
+def _scanWorker(theJob):
+    """Process pool entry point. Reads and scans a single document, and
+    returns the arguments for NWIndex._mergeScan. Returns None if there
+    is nothing to merge or the file could not be read.
+    """
+    tHandle, theArgs = theJob
+    if theArgs is None:
+        return None
+
+    docPath, layoutName, isNovel, doIndex = theArgs
+    try:
+        theText = readDocText(docPath)
+        docStat = os.stat(docPath) if os.path.isfile(docPath) else None
+    except Exception:
+        return None
+
+    theScan = scanDocText(theText, layoutName, isNovel, doIndex)
+    if docStat is None:
+        return theScan, 0, 0.0
+
+    return theScan, docStat.st_size, docStat.st_mtime
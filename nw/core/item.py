@@ -253,10 +253,13 @@ class NWItem():
     def setExported(self, expState):
         """Save the export flag.
         """
+        wasExported = self.isExported
         if isinstance(expState, str):
             self.isExported = (expState == str(True))
         else:
             self.isExported = (expState == True) # noqa: E712
+        if self.isExported != wasExported:
+            self.theProject.projTree.updateVersion()
         return
 
     ##
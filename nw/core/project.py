@@ -40,6 +40,7 @@ from nw.core.item import NWItem
 from nw.core.document import NWDoc
 from nw.core.status import NWStatus
 from nw.core.options import OptionState
+from nw.core.tools import TextReplacer
 from nw.common import (
     checkString, checkBool, checkInt, isHandle, formatTimeStamp,
     makeFileNameSafe
@@ -87,6 +88,7 @@ class NWProject():
 
         # Project Settings
         self.autoReplace = {}    # Text to auto-replace on exports
+        self.autoReplacer = None # Compiled auto-replace, built on first use
         self.titleFormat = {}    # The formatting of titles for exports
         self.spellCheck  = False # Controls the spellcheck-as-you-type feature
         self.autoOutline = True  # If true, the Project Outline is updated automatically
@@ -198,6 +200,7 @@ class NWProject():
         self.bookTitle   = ""
         self.bookAuthors = []
         self.autoReplace = {}
+        self.autoReplacer = None
         self.titleFormat = {
             "title"      : r"%title%",
             "chapter"    : r"Chapter %ch%: %title%",
@@ -739,12 +742,15 @@ class NWProject():
 
         return True
 
-    def closeProject(self):
-        """Close the current project and clear all meta data.
+    def closeProject(self, readOnly=False):
+        """Close the current project and clear all meta data. If the
+        project was only opened to read from it, only the lock file is
+        removed, and the settings and session stats are left as is.
         """
-        self.optState.saveSettings()
-        self.projTree.writeToCFiles()
-        self._appendSessionStats()
+        if not readOnly:
+            self.optState.saveSettings()
+            self.projTree.writeToCFiles()
+            self._appendSessionStats()
         self._clearLockFile()
         self.clearProject()
         self.lockedBy = None
@@ -1087,6 +1093,7 @@ class NWProject():
         dictionary, so alterations have to be made in a copy.
         """
         self.autoReplace = autoReplace
+        self.autoReplacer = None
         return
 
     def setTitleFormat(self, titleFormat):
@@ -1117,6 +1124,17 @@ class NWProject():
         """
         return self.currWCount - self.lastWCount
 
+    def getAutoReplacer(self):
+        """Return the auto-replace dictionary compiled for replacing the
+        <keyword> tags in a text. It is compiled once, and shared by all
+        documents until the dictionary is changed.
+        """
+        if self.autoReplacer is None:
+            self.autoReplacer = TextReplacer({
+                "<%s>" % aKey: aVal for aKey, aVal in self.autoReplace.items()
+            })
+        return self.autoReplacer
+
     def getProjectItems(self):
         """This function ensures that the item tree loaded is sent to
         the GUI tree view in such a way that the tree can be built. That
@@ -27,11 +27,14 @@
 
 import nw
 import logging
+import json
 import os
+import threading
 
-from difflib import get_close_matches
+from itertools import chain
+from collections import OrderedDict
 
-from nw.constants import isoLanguage
+from nw.constants import isoLanguage, nwFiles
 
 logger = logging.getLogger(__name__)
 
@@ -45,12 +48,18 @@ class NWSpellCheck():
     SP_ENCHANT  = "enchant"
 
     theDict = None
-    PROJW = []
+    PROJW = set()
+
+    # The number of checked words to remember the result for
+    MEMO_SIZE = 10000
 
     def __init__(self):
         self.mainConf = nw.CONFIG
         self.projectDict = None
         self.spellLanguage = None
+        self.wordMemo = OrderedDict()
+        self.memoHits = 0
+        self.memoMiss = 0
         return
 
     def setLanguage(self, theLang, projectDict=None):
@@ -59,9 +68,23 @@ class NWSpellCheck():
         return
 
     def checkWord(self, theWord):
-        """Dummy function.
+        """Check a word, remembering the result for the most recently
+        checked words, as the syntax highlighter checks the same words
+        over and over. The lookup itself is done by _checkWord.
         """
-        return True
+        isGood = self.wordMemo.get(theWord)
+        if isGood is not None:
+            self.memoHits += 1
+            self.wordMemo.move_to_end(theWord)
+            return isGood
+
+        self.memoMiss += 1
+        isGood = self._checkWord(theWord)
+        self.wordMemo[theWord] = isGood
+        if len(self.wordMemo) > self.MEMO_SIZE:
+            self.wordMemo.popitem(last=False)
+
+        return isGood
 
     def suggestWords(self, theWord):
         """Dummy function.
@@ -71,9 +94,10 @@ class NWSpellCheck():
     def addWord(self, newWord):
         """Add a word to the project dictionary.
         """
+        self.clearMemo()
         if self.projectDict is not None and newWord not in self.PROJW:
             newWord = newWord.strip()
-            self.PROJW.append(newWord)
+            self.PROJW.add(newWord)
             try:
                 with open(self.projectDict, mode="a+", encoding="utf-8") as outFile:
                     outFile.write("%s\n" % newWord)
@@ -92,6 +116,29 @@ class NWSpellCheck():
         """
         return "", ""
 
+    def clearMemo(self):
+        """Forget the remembered results of checked words. This must be
+        done whenever the words in the dictionary change.
+        """
+        self.wordMemo.clear()
+        return
+
+    def memoHitRate(self):
+        """Return the fraction of checked words that were found in the
+        memo, since the counters were last reset.
+        """
+        nChecks = self.memoHits + self.memoMiss
+        if nChecks == 0:
+            return 0.0
+        return self.memoHits/nChecks
+
+    def resetMemoStats(self):
+        """Reset the memo hit and miss counters.
+        """
+        self.memoHits = 0
+        self.memoMiss = 0
+        return
+
     @staticmethod
     def expandLanguage(spTag):
         """Translate a language tag to something more user friendly.
@@ -106,11 +153,16 @@ class NWSpellCheck():
     #  Internal Functions
     ##
 
+    def _checkWord(self, theWord):
+        """Dummy function.
+        """
+        return True
+
     def _readProjectDictionary(self, projectDict):
         """Read the content of the project dictionary, and add it to the
         lookup lists.
         """
-        self.PROJW = []
+        self.PROJW = set()
         if projectDict is not None:
             self.projectDict = projectDict
             if not os.path.isfile(projectDict):
@@ -120,8 +172,8 @@ class NWSpellCheck():
                 with open(projectDict, mode="r", encoding="utf-8") as wordsFile:
                     for theLine in wordsFile:
                         theLine = theLine.strip()
-                        if len(theLine) > 0 and theLine not in self.PROJW:
-                            self.PROJW.append(theLine)
+                        if len(theLine) > 0:
+                            self.PROJW.add(theLine)
                 logger.debug("Project word list contains %d words" % len(self.PROJW))
             except Exception as e:
                 logger.error("Failed to load project word list")
@@ -146,6 +198,7 @@ class NWSpellEnchant(NWSpellCheck):
         If that fails, we load a dummy dictionary so that lookups don't
         crash.
         """
+        self.clearMemo()
         try:
             import enchant
             self.theDict = enchant.Dict(theLang)
@@ -162,7 +215,7 @@ class NWSpellEnchant(NWSpellCheck):
 
         return
 
-    def checkWord(self, theWord):
+    def _checkWord(self, theWord):
         """Wrapper function for pyenchant.
         """
         return self.theDict.check(theWord)
@@ -227,73 +280,127 @@ class NWSpellEnchantDummy:
 # END Class NWSpellEnchantDummy
 
 # =============================================================================================== #
-#  Fallback SpellChecking Using difflib
+#  Fallback SpellChecking Using a Word List
 # =============================================================================================== #
 
 class NWSpellSimple(NWSpellCheck):
     """Internal spell check tool that uses standard Python packages with
     no other external dependencies. This is the fallback spell checker
-    when no other is available. This method is fairly slow compared to
-    other implementations.
+    when no other is available. The words are looked up in a set, and
+    suggestions are made from an index of the first few characters of
+    the words with up to MAX_DIST characters deleted. This is the
+    symmetric delete method used by SymSpell.
     """
 
-    WORDS = []
+    WORDS = set()
+
+    # The suggestion index of the dictionary words, which is shared by
+    # all instances, and only kept for the last dictionary loaded
+    DICTI = {}
+
+    # Suggestions are looked up from the first PREFIX_LEN characters,
+    # and are at most MAX_DIST edits from the word
+    PREFIX_LEN = 6
+    MAX_DIST   = 2
 
     def __init__(self):
         NWSpellCheck.__init__(self)
         self.theLang = ""
+        self.dictIndex = None # Suggestion index of the dictionary words
+        self.projIndex = None # Suggestion index of the project words
         logger.debug("Simple spell checking activated")
         return
 
     def setLanguage(self, theLang, projectDict=None):
-        """Load a dictionary as a list from the app assets folder.
+        """Load a dictionary as a set from the app assets folder. The
+        words are read from the dictionary cache when it is up to date
+        with the dictionary and project word list, otherwise the cache
+        is rebuilt. The suggestion index of the dictionary words is
+        built in a background thread, unless it is already built for
+        the same dictionary file.
         """
+        self.clearMemo()
         self.theLang = theLang
-        self.WORDS = []
+        self.WORDS = set()
         dictFile = os.path.join(self.mainConf.dictPath, theLang+".dict")
-        try:
-            with open(dictFile, mode="r", encoding="utf-8") as wordsFile:
-                for theLine in wordsFile:
-                    if len(theLine) == 0 or theLine.startswith("#"):
-                        continue
-                    self.WORDS.append(theLine.strip().lower())
-            logger.debug("Spell check word list for language %s loaded" % theLang)
-            logger.debug("Word list contains %d words" % len(self.WORDS))
+        dictWords, projWords = self._loadDictCache(theLang, dictFile, projectDict)
+
+        if dictWords is None:
+            try:
+                with open(dictFile, mode="r", encoding="utf-8") as wordsFile:
+                    for theLine in wordsFile:
+                        if len(theLine) == 0 or theLine.startswith("#"):
+                            continue
+                        self.WORDS.add(theLine.strip().lower())
+                logger.debug("Spell check word list for language %s loaded" % theLang)
+                self.spellLanguage = theLang
+            except Exception as e:
+                logger.error("Failed to load spell check word list for language %s" % theLang)
+                logger.error(str(e))
+                self.spellLanguage = None
+        else:
+            self.WORDS = dictWords
+            logger.debug("Spell check word list for language %s loaded from cache" % theLang)
             self.spellLanguage = theLang
-        except Exception as e:
-            logger.error("Failed to load spell check word list for language %s" % theLang)
-            logger.error(str(e))
-            self.spellLanguage = None
 
-        self._readProjectDictionary(projectDict)
-        for pWord in self.PROJW:
-            if pWord not in self.WORDS:
-                self.WORDS.append(pWord)
+        if projWords is None:
+            self._readProjectDictionary(projectDict)
+        else:
+            self.projectDict = projectDict
+            self.PROJW = projWords
+
+        if self.spellLanguage is not None and (dictWords is None or projWords is None):
+            self._saveDictCache(theLang, dictFile, projectDict)
+
+        logger.debug("Word list contains %d words" % len(self.WORDS))
+
+        dictKey = (dictFile, self._fileTime(dictFile))
+        self.dictIndex = self.DICTI.get(dictKey, None)
+        if self.dictIndex is None:
+            self.dictIndex = NWSuggestIndex(self.PREFIX_LEN, self.MAX_DIST)
+            self.dictIndex.buildIndex(list(self.WORDS), inBackground=True)
+            if self.spellLanguage is not None:
+                NWSpellSimple.DICTI = {dictKey: self.dictIndex}
+
+        self.projIndex = NWSuggestIndex(self.PREFIX_LEN, self.MAX_DIST)
+        self.projIndex.buildIndex(self.PROJW)
+        self.WORDS.update(self.PROJW)
 
         return
 
-    def checkWord(self, theWord):
-        """Check if a word exists in the word list. Make sure to keep
-        this function as fast as possible as it is called for every
-        word by the syntax highlighter.
+    def _checkWord(self, theWord):
+        """Check if a word exists in the word list.
         """
         theWord = theWord.replace(self.mainConf.fmtApostrophe, "'").lower()
         return theWord in self.WORDS
 
     def suggestWords(self, theWord):
-        """Get suggestions for correct word from difflib, and make sure
-        the first character is upper case if that was also the case for
-        the word be3ing checked. Also make sure the apostrophe is
-        changed to the one in the dictionary, and then put back in the
-        results.
+        """Get suggestions for correct word from the suggestion index,
+        ordered by their edit distance from the word, and make sure the
+        first character is upper case if that was also the case for the
+        word being checked. Also make sure the apostrophe is changed to
+        the one in the dictionary, and then put back in the results.
         """
         theWord = theWord.strip()
         if len(theWord) == 0:
             return []
 
-        theMatches = get_close_matches(theWord.lower(), self.WORDS, n=10, cutoff=0.75)
+        if self.dictIndex is None:
+            return []
+
+        lookWord = theWord.replace(self.mainConf.fmtApostrophe, "'").lower()
+        theMatches = []
+        for aWord in set(chain(
+            self.dictIndex.lookupWords(lookWord), self.projIndex.lookupWords(lookWord)
+        )):
+            if abs(len(aWord) - len(lookWord)) > self.MAX_DIST:
+                continue
+            wDist = self._editDistance(lookWord, aWord)
+            if wDist <= self.MAX_DIST:
+                theMatches.append((wDist, abs(len(aWord) - len(lookWord)), aWord))
+
         theOptions = []
-        for aWord in theMatches:
+        for wDist, lDiff, aWord in sorted(theMatches)[:10]:
             if len(aWord) == 0:
                 continue
             if theWord[0].isupper():
@@ -308,7 +415,9 @@ class NWSpellSimple(NWSpellCheck):
         """
         newWord = newWord.strip().lower()
         if newWord not in self.WORDS:
-            self.WORDS.append(newWord)
+            self.WORDS.add(newWord)
+            if self.projIndex is not None:
+                self.projIndex.addWord(newWord)
         NWSpellCheck.addWord(self, newWord)
         return
 
@@ -335,4 +444,244 @@ class NWSpellSimple(NWSpellCheck):
         """
         return self.theLang, "internal"
 
+    ##
+    #  Internal Functions
+    ##
+
+    def _loadDictCache(self, theLang, dictFile, projectDict):
+        """Load the dictionary and project words from the dictionary
+        cache. Each of the two is returned as None if the file it was
+        read from has changed since the cache was saved.
+        """
+        cacheFile = self._dictCacheFile(theLang)
+        if cacheFile is None or not os.path.isfile(cacheFile):
+            return None, None
+
+        try:
+            with open(cacheFile, mode="r", encoding="utf-8") as inFile:
+                cacheMeta = json.loads(inFile.readline())
+                theWords = inFile.read().split("\n")[:-1]
+        except Exception as e:
+            logger.error("Failed to load spell check cache for language %s" % theLang)
+            logger.error(str(e))
+            return None, None
+
+        nDict = cacheMeta.get("dictWords", 0)
+        dictWords = None
+        if cacheMeta.get("dictFile") == dictFile:
+            if cacheMeta.get("dictTime") == self._fileTime(dictFile):
+                dictWords = set(theWords[:nDict])
+
+        projWords = None
+        if cacheMeta.get("projFile") == projectDict:
+            if cacheMeta.get("projTime") == self._fileTime(projectDict):
+                projWords = set(theWords[nDict:])
+
+        return dictWords, projWords
+
+    def _saveDictCache(self, theLang, dictFile, projectDict):
+        """Save the dictionary and project words to the dictionary
+        cache in the user data folder, with the modification times of
+        the files they were read from.
+        """
+        cacheFile = self._dictCacheFile(theLang)
+        if cacheFile is None:
+            return False
+
+        dictWords = sorted(self.WORDS)
+        cacheMeta = {
+            "dictFile"  : dictFile,
+            "dictTime"  : self._fileTime(dictFile),
+            "dictWords" : len(dictWords),
+            "projFile"  : projectDict,
+            "projTime"  : self._fileTime(projectDict),
+        }
+
+        cacheTemp = cacheFile+"~"
+        try:
+            cacheDir = os.path.dirname(cacheFile)
+            if not os.path.isdir(cacheDir):
+                os.mkdir(cacheDir)
+            with open(cacheTemp, mode="w", encoding="utf-8") as outFile:
+                outFile.write(json.dumps(cacheMeta)+"\n")
+                outFile.write("".join(aWord+"\n" for aWord in dictWords))
+                outFile.write("".join(aWord+"\n" for aWord in sorted(self.PROJW)))
+            os.replace(cacheTemp, cacheFile)
+        except Exception as e:
+            logger.error("Failed to save spell check cache for language %s" % theLang)
+            logger.error(str(e))
+            return False
+
+        return True
+
+    def _dictCacheFile(self, theLang):
+        """Return the path to the dictionary cache file, or None if
+        there is no user data folder.
+        """
+        if self.mainConf.dataPath is None:
+            return None
+        return os.path.join(self.mainConf.dataPath, nwFiles.DICT_CACHE, theLang+".cache")
+
+    def _fileTime(self, theFile):
+        """Return the modification time of a file, or None if it does
+        not exist.
+        """
+        if theFile is None or not os.path.isfile(theFile):
+            return None
+        return os.stat(theFile).st_mtime_ns
+
+    def _editDistance(self, wordA, wordB):
+        """Compute the edit distance between two words, counting
+        insertions, deletions, substitutions and transpositions of
+        adjacent characters. Only distances up to the maximum distance
+        are of interest, so only the band of the table within it from
+        the diagonal is computed, and larger distances are returned as
+        the maximum distance plus one.
+        """
+        maxDist = self.MAX_DIST
+        tooFar = maxDist + 1
+
+        # Skip the characters the words start with in common
+        nSame = 0
+        for charA, charB in zip(wordA, wordB):
+            if charA != charB:
+                break
+            nSame += 1
+        wordA = wordA[nSame:]
+        wordB = wordB[nSame:]
+
+        lenA = len(wordA)
+        lenB = len(wordB)
+        if abs(lenA - lenB) > maxDist:
+            return tooFar
+
+        prevRow = None
+        thisRow = [j if j <= maxDist else tooFar for j in range(lenB + 1)]
+        for i in range(1, lenA + 1):
+            prevPrev, prevRow = prevRow, thisRow
+            thisRow = [tooFar]*(lenB + 1)
+            if i <= maxDist:
+                thisRow[0] = i
+            for j in range(max(1, i - maxDist), min(lenB, i + maxDist) + 1):
+                theCost = 0 if wordA[i-1] == wordB[j-1] else 1
+                theDist = min(prevRow[j] + 1, thisRow[j-1] + 1, prevRow[j-1] + theCost)
+                if i > 1 and j > 1 and wordA[i-1] == wordB[j-2] and wordA[i-2] == wordB[j-1]:
+                    theDist = min(theDist, prevPrev[j-2] + 1)
+                thisRow[j] = min(theDist, tooFar)
+            if min(thisRow) > maxDist:
+                return tooFar
+
+        return thisRow[lenB]
+
 # END Class NWSpellSimple
+
+# =============================================================================================== #
+#  Suggestion Index for the Fallback Spell Checker
+# =============================================================================================== #
+
+class NWSuggestIndex():
+    """An index of the first prefixLen characters of a list of words by
+    the deletes of up to maxDist characters, and of the words by their
+    prefix. The index can be built in a background thread, in which
+    case it is only read after the thread has finished.
+    """
+
+    def __init__(self, prefixLen, maxDist):
+        self.prefixLen = prefixLen
+        self.maxDist   = maxDist
+        self.suggW = {}
+        self.prefW = {}
+        self.buildThread = None
+        return
+
+    def buildIndex(self, theWords, inBackground=False):
+        """Add a list of words to the index, either directly or in a
+        background thread.
+        """
+        if inBackground:
+            self.buildThread = threading.Thread(
+                target=self._indexWords, args=(theWords,), daemon=True
+            )
+            self.buildThread.start()
+        else:
+            self._indexWords(theWords)
+        return
+
+    def addWord(self, theWord):
+        """Add a single word to the index.
+        """
+        self._waitIndex()
+        self._indexWord(theWord)
+        return
+
+    def lookupWords(self, lookWord):
+        """Return the words with a prefix that shares a delete with the
+        prefix of the word being looked up.
+        """
+        self._waitIndex()
+        thePrefixes = set()
+        for aKey in self._wordDeletes(lookWord[:self.prefixLen]):
+            keyPrefixes = self.suggW.get(aKey, ())
+            if isinstance(keyPrefixes, str):
+                thePrefixes.add(keyPrefixes)
+            else:
+                thePrefixes.update(keyPrefixes)
+        return chain.from_iterable(self.prefW[x] for x in thePrefixes)
+
+    ##
+    #  Internal Functions
+    ##
+
+    def _waitIndex(self):
+        """Wait for the background build to finish, if there is one.
+        """
+        if self.buildThread is not None:
+            self.buildThread.join()
+            self.buildThread = None
+        return
+
+    def _indexWords(self, theWords):
+        """Add the words to the index.
+        """
+        for aWord in theWords:
+            self._indexWord(aWord)
+        logger.debug("Spell check suggestion index contains %d keys" % len(self.suggW))
+        return
+
+    def _indexWord(self, theWord):
+        """Add a word to the index. The deletes are only added the first
+        time a prefix is seen. Most deletes belong to a single prefix,
+        and these are stored as the prefix itself rather than as a list
+        to save memory.
+        """
+        thePrefix = theWord[:self.prefixLen]
+        if thePrefix in self.prefW:
+            self.prefW[thePrefix].append(theWord)
+            return
+        self.prefW[thePrefix] = [theWord]
+        for aKey in self._wordDeletes(thePrefix):
+            keyPrefixes = self.suggW.get(aKey, None)
+            if keyPrefixes is None:
+                self.suggW[aKey] = thePrefix
+            elif isinstance(keyPrefixes, str):
+                self.suggW[aKey] = [keyPrefixes, thePrefix]
+            else:
+                keyPrefixes.append(thePrefix)
+        return
+
+    def _wordDeletes(self, theWord):
+        """Return the word, and the word with every combination of up to
+        maxDist characters deleted.
+        """
+        theKeys = {theWord}
+        lastKeys = {theWord}
+        for n in range(self.maxDist):
+            newKeys = set()
+            for aKey in lastKeys:
+                for i in range(len(aKey)):
+                    newKeys.add(aKey[:i] + aKey[i+1:])
+            theKeys.update(newKeys)
+            lastKeys = newKeys
+        return theKeys
+
+# END Class NWSuggestIndex
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""novelWriter EPUB Converter
+
+ novelWriter – EPUB Converter
+==============================
+ Extends the ToHtml class to write EPUB e-books
+
+ File History:
+ Created: 2026-10-18 [1.0b5]
+
+ This file is a part of novelWriter
+ Copyright 2018–2020, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import nw
+import logging
+import uuid
+
+from time import strftime, gmtime
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
+from lxml import etree
+
+from nw.core.tohtml import ToHtml
+
+logger = logging.getLogger(__name__)
+
+# EPUB Namespaces
+XML_NS = {
+    "opf"       : "http://www.idpf.org/2007/opf",
+    "dc"        : "http://purl.org/dc/elements/1.1/",
+    "xhtml"     : "http://www.w3.org/1999/xhtml",
+    "epub"      : "http://www.idpf.org/2007/ops",
+    "container" : "urn:oasis:names:tc:opendocument:xmlns:container",
+}
+EPUB_MIME = "application/epub+zip"
+
+def _mkTag(nsName, tagName):
+    """Assemble a namespaced xml tag name.
+    """
+    return "{%s}%s" % (XML_NS[nsName], tagName)
+
+class ToEpub(ToHtml):
+
+    def __init__(self, theProject, theParent):
+        ToHtml.__init__(self, theProject, theParent)
+
+        self.genMode = self.M_EBOOK
+        self.linkHeaders = True
+
+        # The chapters are xml, so only the characters that must be
+        # escaped are replaced
+        self.repDict = {
+            "<" : "&lt;",
+            ">" : "&gt;",
+            "&" : "&amp;",
+        }
+        self._buildRegEx()
+
+        return
+
+    ##
+    #  Class Methods
+    ##
+
+    def saveEpub(self, savePath, theChapters):
+        """Write an EPUB file. The chapters are pairs of project item
+        and converted text, and each is written to the package as its
+        own XHTML file as it is converted. The navigation document and
+        package file are written last, from the chapters written and
+        the novel structure in the index.
+        """
+        theLang = self._bookLanguage()
+        theTitle = self.theProject.bookTitle or self.theProject.projName
+
+        theFiles = []
+        theAnchors = {}
+        with ZipFile(savePath, mode="w", compression=ZIP_DEFLATED) as outZip:
+
+            # The mimetype must be the first file, and not compressed
+            outZip.writestr("mimetype", EPUB_MIME, compress_type=ZIP_STORED)
+            outZip.writestr("META-INF/container.xml", self._xmlString(self._makeContainer()))
+            outZip.writestr("OEBPS/style.css", "\n".join(self.getStyleSheet()))
+
+            for tItem, theText in theChapters:
+                fileName = "%s.xhtml" % tItem.itemHandle
+                outZip.writestr("OEBPS/%s" % fileName, (
+                    "<?xml version='1.0' encoding='UTF-8'?>\n"
+                    "<!DOCTYPE html>\n"
+                    "<html xmlns='{nsXhtml:s}' xmlns:epub='{nsEpub:s}' "
+                    "xml:lang='{bookLang:s}' lang='{bookLang:s}'>\n"
+                    "<head>\n"
+                    "<title>{docTitle:s}</title>\n"
+                    "<link rel='stylesheet' type='text/css' href='style.css'/>\n"
+                    "</head>\n"
+                    "<body>\n"
+                    "{docText:s}"
+                    "</body>\n"
+                    "</html>\n"
+                ).format(
+                    nsXhtml  = XML_NS["xhtml"],
+                    nsEpub   = XML_NS["epub"],
+                    bookLang = theLang,
+                    docTitle = _xmlEscape(tItem.itemName),
+                    docText  = theText,
+                ))
+                theFiles.append((tItem, fileName))
+                theAnchors[fileName] = set(self.theAnchors)
+
+            outZip.writestr("OEBPS/nav.xhtml", self._xmlString(
+                self._makeNavigation(theTitle, theLang, theFiles, theAnchors)
+            ))
+            outZip.writestr("OEBPS/content.opf", self._xmlString(
+                self._makePackage(theTitle, theLang, theFiles)
+            ))
+
+        return
+
+    ##
+    #  Internal Functions
+    ##
+
+    def _bookLanguage(self):
+        """Return the language of the book as a language tag.
+        """
+        theLang = self.theProject.projLang or nw.CONFIG.spellLanguage or "en"
+        return theLang.replace("_", "-")
+
+    def _navEntries(self, theFiles, theAnchors):
+        """Build the list of navigation entries for the chapter files.
+        Novel documents get an entry for each of their headings in the
+        index that was written with an anchor, and other documents an
+        entry with the item name. Headings that were turned into
+        separators or skipped by the header formats have no anchor.
+        """
+        novelHeads = {}
+        for tHandle, sTitle in self.theParent.theIndex.getNovelStructure(skipExcluded=False):
+            theHead = self.theParent.theIndex.getHeading(tHandle, sTitle)
+            if theHead is None:
+                continue
+            novelHeads.setdefault(tHandle, []).append((sTitle, theHead))
+
+        navEntries = []
+        for tItem, fileName in theFiles:
+            if tItem.itemHandle in novelHeads:
+                for sTitle, theHead in novelHeads[tItem.itemHandle]:
+                    if sTitle not in theAnchors.get(fileName, ()):
+                        continue
+                    navEntries.append((
+                        int(theHead.level[1]), "%s#%s" % (fileName, sTitle), theHead.title
+                    ))
+            else:
+                navEntries.append((1, fileName, tItem.itemName))
+
+        return navEntries
+
+    def _makeNavigation(self, theTitle, theLang, theFiles, theAnchors):
+        """Build the navigation document xml tree, with the entries
+        nested by heading level.
+        """
+        xRoot = etree.Element(_mkTag("xhtml", "html"), nsmap={
+            None   : XML_NS["xhtml"],
+            "epub" : XML_NS["epub"],
+        })
+        xRoot.set("{http://www.w3.org/XML/1998/namespace}lang", theLang)
+        xHead = etree.SubElement(xRoot, _mkTag("xhtml", "head"))
+        etree.SubElement(xHead, _mkTag("xhtml", "title")).text = theTitle
+        xBody = etree.SubElement(xRoot, _mkTag("xhtml", "body"))
+        xNav = etree.SubElement(xBody, _mkTag("xhtml", "nav"))
+        xNav.set(_mkTag("epub", "type"), "toc")
+        etree.SubElement(xNav, _mkTag("xhtml", "h1")).text = theTitle
+
+        navEntries = self._navEntries(theFiles, theAnchors)
+        if not navEntries:
+            # The list must have at least one entry
+            navEntries = [(1, "nav.xhtml", theTitle)]
+
+        # The navigation must be a single list, so it starts at the
+        # lowest heading level used
+        topLevel = min(x[0] for x in navEntries)
+        xList = etree.SubElement(xNav, _mkTag("xhtml", "ol"))
+        xStack = [(topLevel, xList, None)]
+        for nLevel, theHref, theText in navEntries:
+            while len(xStack) > 1 and nLevel <= xStack[-2][0]:
+                xStack.pop()
+            if nLevel > xStack[-1][0] and xStack[-1][2] is not None:
+                xList = etree.SubElement(xStack[-1][2], _mkTag("xhtml", "ol"))
+                xStack.append((nLevel, xList, None))
+            xItem = etree.SubElement(xStack[-1][1], _mkTag("xhtml", "li"))
+            xLink = etree.SubElement(xItem, _mkTag("xhtml", "a"))
+            xLink.set("href", theHref)
+            xLink.text = theText
+            xStack[-1] = (xStack[-1][0], xStack[-1][1], xItem)
+
+        return xRoot
+
+    def _makePackage(self, theTitle, theLang, theFiles):
+        """Build the package document xml tree with the metadata, the
+        manifest of all files, and the reading order.
+        """
+        xRoot = etree.Element(_mkTag("opf", "package"), nsmap={
+            None : XML_NS["opf"],
+            "dc" : XML_NS["dc"],
+        })
+        xRoot.set("version", "3.0")
+        xRoot.set("unique-identifier", "book-id")
+
+        bookId = uuid.uuid5(uuid.NAMESPACE_URL, "novelwriter:%s" % self.theProject.projPath)
+        xMeta = etree.SubElement(xRoot, _mkTag("opf", "metadata"))
+        xId = etree.SubElement(xMeta, _mkTag("dc", "identifier"))
+        xId.set("id", "book-id")
+        xId.text = "urn:uuid:%s" % bookId
+        etree.SubElement(xMeta, _mkTag("dc", "title")).text = theTitle
+        etree.SubElement(xMeta, _mkTag("dc", "language")).text = theLang
+        for theAuthor in self.theProject.bookAuthors:
+            etree.SubElement(xMeta, _mkTag("dc", "creator")).text = theAuthor
+        xMod = etree.SubElement(xMeta, _mkTag("opf", "meta"))
+        xMod.set("property", "dcterms:modified")
+        xMod.text = strftime("%Y-%m-%dT%H:%M:%SZ", gmtime())
+
+        xManifest = etree.SubElement(xRoot, _mkTag("opf", "manifest"))
+        xSpine = etree.SubElement(xRoot, _mkTag("opf", "spine"))
+        for itemId, fileName, mediaType in (
+            ("nav", "nav.xhtml", "application/xhtml+xml"),
+            ("css", "style.css", "text/css"),
+        ):
+            xItem = etree.SubElement(xManifest, _mkTag("opf", "item"))
+            xItem.set("id", itemId)
+            xItem.set("href", fileName)
+            xItem.set("media-type", mediaType)
+            if itemId == "nav":
+                xItem.set("properties", "nav")
+
+        for tItem, fileName in theFiles:
+            xItem = etree.SubElement(xManifest, _mkTag("opf", "item"))
+            xItem.set("id", "doc_%s" % tItem.itemHandle)
+            xItem.set("href", fileName)
+            xItem.set("media-type", "application/xhtml+xml")
+            xRef = etree.SubElement(xSpine, _mkTag("opf", "itemref"))
+            xRef.set("idref", "doc_%s" % tItem.itemHandle)
+
+        if not theFiles:
+            xRef = etree.SubElement(xSpine, _mkTag("opf", "itemref"))
+            xRef.set("idref", "nav")
+
+        return xRoot
+
+    def _makeContainer(self):
+        """Build the container xml tree pointing to the package file.
+        """
+        xRoot = etree.Element(_mkTag("container", "container"), nsmap={
+            None : XML_NS["container"],
+        })
+        xRoot.set("version", "1.0")
+        xFiles = etree.SubElement(xRoot, _mkTag("container", "rootfiles"))
+        xFile = etree.SubElement(xFiles, _mkTag("container", "rootfile"))
+        xFile.set("full-path", "OEBPS/content.opf")
+        xFile.set("media-type", "application/oebps-package+xml")
+        return xRoot
+
+    def _xmlString(self, xRoot):
+        """Serialise an xml tree with the xml declaration.
+        """
+        return etree.tostring(
+            xRoot, xml_declaration=True, encoding="UTF-8", pretty_print=True
+        ).decode("utf-8")
+
+# END Class ToEpub
+
+def _xmlEscape(theText):
+    """Escape the characters that are not allowed in xml text.
+    """
+    return theText.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
@@ -26,9 +26,9 @@
 """
 
 import logging
-import re
 
 from nw.core.tokenizer import Tokenizer
+from nw.core.tools import TextReplacer
 from nw.constants import nwUnicode, nwLabels, nwKeyWords
 
 logger = logging.getLogger(__name__)
@@ -45,6 +45,9 @@ class ToHtml(Tokenizer):
         self.genMode = self.M_EXPORT
         self.cssStyles = True
 
+        # The header anchors written by the last conversion
+        self.theAnchors = []
+
         self.repDict = {
             "<" : "&lt;",
             ">" : "&gt;",
@@ -57,9 +60,8 @@ class ToHtml(Tokenizer):
             nwUnicode.U_THNBSP : nwUnicode.H_THNBSP,
             nwUnicode.U_MAPOSS : nwUnicode.H_RSQUO,
         }
-        self.revDict = {}
-        self.reReplace = []
-        self.reReverse = []
+        self.repReplacer = None
+        self.revReplacer = None
         self._buildRegEx()
 
         return
@@ -91,16 +93,6 @@ class ToHtml(Tokenizer):
     #  Class Methods
     ##
 
-    def doAutoReplace(self):
-        """Extend the auto-replace to also properly encode some unicode
-        characters into their respective HTML entities.
-        """
-        Tokenizer.doAutoReplace(self)
-        self.theText = self.reReplace.sub(
-            lambda x: self.repDict[x.group(0)], self.theText
-        )
-        return
-
     def doPostProcessing(self):
         """Reverse the html entities replacement on the markdown text.
         Otherwise, all the &something; bits will also be in there.
@@ -109,9 +101,7 @@ class ToHtml(Tokenizer):
         if self.genMode == self.M_PREVIEW:
             # Doesn't matter for preview as we don't use the markdown
             return
-        self.theMarkdown = self.reReverse.sub(
-            lambda x: self.revDict[x.group(0)], self.theMarkdown
-        )
+        self.theMarkdown = self.revReplacer.replace(self.theMarkdown)
         return
 
     def doConvert(self):
@@ -152,6 +142,7 @@ class ToHtml(Tokenizer):
             h4 = "h4"
 
         self.theResult = ""
+        self.theAnchors = []
 
         thisPar = []
         parStyle = None
@@ -160,39 +151,25 @@ class ToHtml(Tokenizer):
         for tType, tLine, tText, tFormat, tStyle in self.theTokens:
 
             # Styles
-            aStyle = []
-            if tStyle is not None and self.cssStyles:
-                if tStyle & self.A_LEFT:
-                    aStyle.append("text-align: left;")
-                if tStyle & self.A_RIGHT:
-                    aStyle.append("text-align: right;")
-                if tStyle & self.A_CENTRE:
-                    aStyle.append("text-align: center;")
-                if tStyle & self.A_JUSTIFY:
-                    aStyle.append("text-align: justify;")
-                if tStyle & self.A_PBB:
-                    aStyle.append("page-break-before: always;")
-                if tStyle & self.A_PBB_AV:
-                    aStyle.append("page-break-before: avoid;")
-                if tStyle & self.A_PBB_NO:
-                    aStyle.append("page-break-before: never;")
-                if tStyle & self.A_PBA:
-                    aStyle.append("page-break-after: always;")
-                if tStyle & self.A_PBA_AV:
-                    aStyle.append("page-break-after: avoid;")
-                if tStyle & self.A_PBA_NO:
-                    aStyle.append("page-break-after: never;")
-
-            if len(aStyle) > 0:
-                hStyle = " style='%s'" % (" ".join(aStyle))
+            if tStyle and self.cssStyles:
+                hStyle = _HTML_STYLES.get(tStyle, None)
+                if hStyle is None:
+                    hStyle = _htmlStyle(tStyle)
             else:
                 hStyle = ""
 
-            if self.linkHeaders:
+            if self.linkHeaders and self.genMode == self.M_EBOOK:
+                aNm = "<a id='T%06d'></a>" % tLine
+            elif self.linkHeaders:
                 aNm = "<a name='T%06d'></a>" % tLine
             else:
                 aNm = ""
 
+            if aNm and tType in (
+                self.T_TITLE, self.T_HEAD1, self.T_HEAD2, self.T_HEAD3, self.T_HEAD4
+            ):
+                self.theAnchors.append("T%06d" % tLine)
+
             # Process TextType
             if tType == self.T_EMPTY:
                 if parStyle is None:
@@ -231,6 +208,9 @@ class ToHtml(Tokenizer):
             elif tType == self.T_SEP:
                 tmpResult.append("<p class='sep'>%s</p>\n" % tText)
 
+            elif tType == self.T_SKIP and self.genMode == self.M_EBOOK:
+                tmpResult.append("<p class='skip'>&#160;</p>\n")
+
             elif tType == self.T_SKIP:
                 tmpResult.append("<p class='skip'>&nbsp;</p>\n")
 
@@ -238,8 +218,16 @@ class ToHtml(Tokenizer):
                 tTemp = tText
                 if parStyle is None:
                     parStyle = hStyle
-                for xPos, xLen, xFmt in reversed(tFormat):
-                    tTemp = tTemp[:xPos]+htmlTags[xFmt]+tTemp[xPos+xLen:]
+                if tFormat:
+                    # Assemble the line from the text between the tags
+                    tSegs = []
+                    lastPos = 0
+                    for xPos, xLen, xFmt in tFormat:
+                        tSegs.append(tText[lastPos:xPos])
+                        tSegs.append(htmlTags[xFmt])
+                        lastPos = xPos + xLen
+                    tSegs.append(tText[lastPos:])
+                    tTemp = "".join(tSegs)
                 if tText.endswith("  "):
                     thisPar.append(tTemp.rstrip()+"<br/>")
                     hasHardBreak = True
@@ -318,7 +306,10 @@ class ToHtml(Tokenizer):
         if theBits[0] in nwLabels.KEY_NAME:
             retText += "<span class='tags'>%s:</span> " % nwLabels.KEY_NAME[theBits[0]]
             if len(theBits) > 1:
-                if theBits[0] == nwKeyWords.TAG_KEY:
+                if self.genMode == self.M_EBOOK:
+                    # The tags may be in other chapters, so no links
+                    retText += ", ".join(theBits[1:])
+                elif theBits[0] == nwKeyWords.TAG_KEY:
                     retText += "<a name='tag_%s'>%s</a>" % (
                         theBits[1], theBits[1]
                     )
@@ -338,16 +329,59 @@ class ToHtml(Tokenizer):
 
         return "<div>%s</div>" % retText
 
+    def _replacers(self):
+        """Extend the auto-replace to also properly encode some unicode
+        characters into their respective HTML entities.
+        """
+        return Tokenizer._replacers(self) + [self.repReplacer]
+
     def _buildRegEx(self):
-        """Build the regular expressions
+        """Compile the entity replacement, and its reverse.
         """
-        self.revDict = dict(map(reversed, self.repDict.items()))
-        self.reReplace = re.compile(
-            "|".join([re.escape(k) for k in self.repDict.keys()]), flags=re.DOTALL
-        )
-        self.reReverse = re.compile(
-            "|".join([re.escape(k) for k in self.revDict.keys()]), flags=re.DOTALL
-        )
+        self.repReplacer = TextReplacer(self.repDict)
+        self.revReplacer = TextReplacer(dict(map(reversed, self.repDict.items())))
         return
 
 # END Class ToHtml
+
+# =============================================================================================== #
+#  Block Styles
+#  The inline CSS of each combination of block style flags, built once.
+# =============================================================================================== #
+
+_HTML_STYLES = {}
+
+def _htmlStyle(tStyle):
+    """Build the style attribute of a block style bitmask, and store it
+    for the next block with the same style.
+    """
+    aStyle = []
+    if tStyle & Tokenizer.A_LEFT:
+        aStyle.append("text-align: left;")
+    if tStyle & Tokenizer.A_RIGHT:
+        aStyle.append("text-align: right;")
+    if tStyle & Tokenizer.A_CENTRE:
+        aStyle.append("text-align: center;")
+    if tStyle & Tokenizer.A_JUSTIFY:
+        aStyle.append("text-align: justify;")
+    if tStyle & Tokenizer.A_PBB:
+        aStyle.append("page-break-before: always;")
+    if tStyle & Tokenizer.A_PBB_AV:
+        aStyle.append("page-break-before: avoid;")
+    if tStyle & Tokenizer.A_PBB_NO:
+        aStyle.append("page-break-before: never;")
+    if tStyle & Tokenizer.A_PBA:
+        aStyle.append("page-break-after: always;")
+    if tStyle & Tokenizer.A_PBA_AV:
+        aStyle.append("page-break-after: avoid;")
+    if tStyle & Tokenizer.A_PBA_NO:
+        aStyle.append("page-break-after: never;")
+
+    if len(aStyle) > 0:
+        hStyle = " style='%s'" % (" ".join(aStyle))
+    else:
+        hStyle = ""
+
+    _HTML_STYLES[tStyle] = hStyle
+
+    return hStyle
@@ -25,20 +25,25 @@
  along with this program. If not, see <https://www.gnu.org/licenses/>.
 """
 
+import os
 import logging
 import re
 
 from operator import itemgetter
-from PyQt5.QtCore import QRegularExpression
 
 from nw.core.document import NWDoc
-from nw.core.tools import numberToWord, numberToRoman
+from nw.core.index import readDocText, textHash
+from nw.core.tools import TextReplacer, numberToWord, numberToRoman, runWorkers
 from nw.constants import nwConst, nwItemLayout, nwItemType, nwRegEx
 
 logger = logging.getLogger(__name__)
 
 class Tokenizer():
 
+    # Automatic parallel tokenizing is only used for at least this many
+    # documents, as starting the worker processes has a cost
+    PARALLEL_MIN = 100
+
     FMT_B_B    = 1 # Begin bold
     FMT_B_E    = 2 # End bold
     FMT_I_B    = 3 # Begin italics
@@ -83,6 +88,7 @@ class Tokenizer():
         self.theTokens   = None # The list of the processed tokens
         self.theResult   = None # The result text after conversion
         self.theMarkdown = None # The result text in novelWriter markdown
+        self.tokenCache  = None # Cache of tokenized documents, if enabled
 
         # User Settings
         self.doBodyText  = True  # Include body text
@@ -175,6 +181,14 @@ class Tokenizer():
         self.doJustify = doJustify
         return
 
+    def setTokenCache(self, tokenCache):
+        """Set a dictionary to cache the tokenized documents in. The
+        cache can be reused for later builds, so that only documents
+        that have changed are tokenized again.
+        """
+        self.tokenCache = tokenCache
+        return
+
     ##
     #  Class Methods
     ##
@@ -223,16 +237,23 @@ class Tokenizer():
             self.theText = "# ERROR\n\n%s\n\n" % errVal
             self.errData.append(errVal)
 
-        self.isNone  = self.theItem.itemLayout == nwItemLayout.NO_LAYOUT
-        self.isTitle = self.theItem.itemLayout == nwItemLayout.TITLE
-        self.isBook  = self.theItem.itemLayout == nwItemLayout.BOOK
-        self.isPage  = self.theItem.itemLayout == nwItemLayout.PAGE
-        self.isPart  = self.theItem.itemLayout == nwItemLayout.PARTITION
-        self.isUnNum = self.theItem.itemLayout == nwItemLayout.UNNUMBERED
-        self.isChap  = self.theItem.itemLayout == nwItemLayout.CHAPTER
-        self.isScene = self.theItem.itemLayout == nwItemLayout.SCENE
-        self.isNote  = self.theItem.itemLayout == nwItemLayout.NOTE
-        self.isNovel = self.isBook or self.isUnNum or self.isChap or self.isScene
+        self._setItemLayout()
+
+        return
+
+    def setTokens(self, theHandle, theTokens, theMarkdown):
+        """Set the tokens of a document that has been tokenized
+        elsewhere, instead of setting and tokenizing its text.
+        """
+        self.theHandle = theHandle
+        self.theItem   = self.theProject.projTree[theHandle]
+        if self.theItem is None:
+            return
+
+        self.theText     = None
+        self.theTokens   = list(theTokens)
+        self.theMarkdown = theMarkdown
+        self._setItemLayout()
 
         return
 
@@ -252,32 +273,18 @@ class Tokenizer():
         return self.theMarkdown
 
     def doAutoReplace(self):
-        """Run through the user's auto-replace dictionary.
+        """Run through the user's auto-replace dictionary, and any other
+        replacements added by subclasses.
         """
-        if len(self.theProject.autoReplace) > 0:
-            repDict = {}
-            for aKey, aVal in self.theProject.autoReplace.items():
-                repDict["<%s>" % aKey] = aVal
-            xRep = re.compile("|".join([re.escape(k) for k in repDict.keys()]), flags=re.DOTALL)
-            self.theText = xRep.sub(lambda x: repDict[x.group(0)], self.theText)
-
+        for theReplacer in self._replacers():
+            self.theText = theReplacer.replace(self.theText)
         return
 
     def doPostProcessing(self):
         """Do some postprocessing. Overloaded by subclasses. This just
         does the standard escaped characters.
         """
-        escapeDict = {
-            r"\*" : "*",
-            r"\~" : "~",
-            r"\_" : "_",
-        }
-        escReplace = re.compile(
-            "|".join([re.escape(k) for k in escapeDict.keys()]), flags=re.DOTALL
-        )
-        self.theResult = escReplace.sub(
-            lambda x: escapeDict[x.group(0)], self.theResult
-        )
+        self.theResult = _ESC_REPLACER.replace(self.theResult)
         return
 
     def tokenizeText(self):
@@ -294,148 +301,28 @@ class Tokenizer():
           3: The text content of the block, without leading tags
           4: The internal formatting map of the text, self.FMT_*
           5: The style of the block, self.A_*
-        """
-        # RegExes for adding formatting tags within text lines
-        rxFormats = [
-            (QRegularExpression(nwRegEx.FMT_EI), [None, self.FMT_I_B, None, self.FMT_I_E]),
-            (QRegularExpression(nwRegEx.FMT_EB), [None, self.FMT_B_B, None, self.FMT_B_E]),
-            (QRegularExpression(nwRegEx.FMT_ST), [None, self.FMT_D_B, None, self.FMT_D_E]),
-        ]
-
-        self.theTokens = []
-        self.theMarkdown = ""
-        tmpMarkdown = []
-        nLine = 0
-        for aLine in self.theText.splitlines():
-            nLine += 1
-
-            # Tag lines starting with specific characters
-            if len(aLine.strip()) == 0:
-                self.theTokens.append((
-                    self.T_EMPTY,
-                    nLine,
-                    "",
-                    None,
-                    self.A_NONE
-                ))
-                tmpMarkdown.append("\n")
-
-            elif aLine[0] == "%":
-                cLine = aLine[1:].lstrip()
-                synTag = cLine[:9].lower()
-                if synTag == "synopsis:":
-                    self.theTokens.append((
-                        self.T_SYNOPSIS,
-                        nLine,
-                        cLine[9:].strip(),
-                        None,
-                        self.A_NONE
-                    ))
-                    if self.doSynopsis:
-                        tmpMarkdown.append("%s\n" % aLine)
-                else:
-                    self.theTokens.append((
-                        self.T_COMMENT,
-                        nLine,
-                        aLine[1:].strip(),
-                        None,
-                        self.A_NONE
-                    ))
-                    if self.doComments:
-                        tmpMarkdown.append("%s\n" % aLine)
-
-            elif aLine[0] == "@":
-                self.theTokens.append((
-                    self.T_KEYWORD,
-                    nLine,
-                    aLine[1:].strip(),
-                    None,
-                    self.A_NONE
-                ))
-                if self.doKeywords:
-                    tmpMarkdown.append("%s\n" % aLine)
-
-            elif aLine[:2] == "# ":
-                self.theTokens.append((
-                    self.T_HEAD1,
-                    nLine,
-                    aLine[2:].strip(),
-                    None,
-                    self.A_NONE
-                ))
-                tmpMarkdown.append("%s\n" % aLine)
-
-            elif aLine[:3] == "## ":
-                self.theTokens.append((
-                    self.T_HEAD2,
-                    nLine,
-                    aLine[3:].strip(),
-                    None,
-                    self.A_NONE
-                ))
-                tmpMarkdown.append("%s\n" % aLine)
-
-            elif aLine[:4] == "### ":
-                self.theTokens.append((
-                    self.T_HEAD3,
-                    nLine,
-                    aLine[4:].strip(),
-                    None,
-                    self.A_NONE
-                ))
-                tmpMarkdown.append("%s\n" % aLine)
 
-            elif aLine[:5] == "#### ":
-                self.theTokens.append((
-                    self.T_HEAD4,
-                    nLine,
-                    aLine[5:].strip(),
-                    None,
-                    self.A_NONE
-                ))
-                tmpMarkdown.append("%s\n" % aLine)
-
-            else:
-                if not self.doBodyText:
-                    # Skip all body text
-                    continue
-
-                # Otherwise we use RegEx to find formatting tags within a line of text
-                fmtPos = []
-                for theRX, theKeys in rxFormats:
-                    rxThis = theRX.globalMatch(aLine, 0)
-                    while rxThis.hasNext():
-                        rxMatch = rxThis.next()
-                        for n in range(1, len(theKeys)):
-                            if theKeys[n] is not None:
-                                xPos = rxMatch.capturedStart(n)
-                                xLen = rxMatch.capturedLength(n)
-                                fmtPos.append([xPos, xLen, theKeys[n]])
-
-                # Save the line as is, but append the array of formatting locations
-                # sorted by position
-                fmtPos = sorted(fmtPos, key=itemgetter(0))
-                self.theTokens.append((
-                    self.T_TEXT,
-                    nLine,
-                    aLine,
-                    fmtPos,
-                    self.A_NONE
-                ))
-                tmpMarkdown.append("%s\n" % aLine)
-
-        # Always add an empty line at the end
-        self.theTokens.append((
-            self.T_EMPTY,
-            nLine,
-            "",
-            None,
-            self.A_NONE
-        ))
-        tmpMarkdown.append("\n")
+        The tokens do not depend on the header formats, so if a token
+        cache is set, they are reused as long as the text and the
+        settings that affect tokenizing are unchanged.
+        """
+        cacheKey = None
+        if self.tokenCache is not None:
+            cacheKey = self._tokenCacheKey(textHash(self.theText))
+            theCache = self.tokenCache.get(self.theHandle, None)
+            if theCache is not None and theCache[0] == cacheKey:
+                self.theTokens = list(theCache[1])
+                self.theMarkdown = theCache[2]
+                return
+
+        self.theTokens, self.theMarkdown = tokenizeDocText(
+            self.theText, self.doBodyText, self.doSynopsis, self.doComments, self.doKeywords
+        )
 
-        self.theMarkdown = "".join(tmpMarkdown)
-        tmpMarkdown = []
+        if cacheKey is not None:
+            self.tokenCache[self.theHandle] = (
+                cacheKey, tuple(self.theTokens), self.theMarkdown
+            )
 
         return
 
@@ -669,6 +556,88 @@ class Tokenizer():
     #  Internal Functions
     ##
 
+    def tokenizeDocuments(self, theHandles, numWorkers=1):
+        """Set and tokenize a list of documents. With more than one
+        worker, documents that are not in the token cache are loaded
+        and tokenized in a pool of worker processes. This is a generator
+        that yields each handle, in the order of the list, once its
+        tokens are ready, so the caller can apply the header formatting
+        and convert each document in order. A numWorkers of 0 or less
+        means automatic.
+        """
+        theJobs = []
+        nWork = 0
+        for tHandle in theHandles:
+            theItem = self.theProject.projTree[tHandle]
+            if theItem is None or self.tokenCache is not None and tHandle in self.tokenCache:
+                # The cache is checked when the document is set
+                theJobs.append((tHandle, None))
+            else:
+                docPath = os.path.join(self.theProject.projContent, tHandle+".nwd")
+                theJobs.append((tHandle, (
+                    docPath, self._replacers(), self.doBodyText,
+                    self.doSynopsis, self.doComments, self.doKeywords
+                )))
+                nWork += 1
+
+        if numWorkers < 1:
+            numWorkers = os.cpu_count() or 1
+            if nWork < self.PARALLEL_MIN:
+                numWorkers = 1
+        numWorkers = min(numWorkers, nWork)
+
+        if numWorkers > 1:
+            logger.debug("Tokenizing %d documents using %d workers" % (nWork, numWorkers))
+            theResults = runWorkers(_tokenizeWorker, theJobs, numWorkers)
+        else:
+            theResults = ((tHandle, None) for tHandle, _ in theJobs)
+
+        for tHandle, theResult in theResults:
+            if theResult is None:
+                # Serial path, or the worker could not process the file
+                self.setText(tHandle)
+                self.doAutoReplace()
+                self.tokenizeText()
+            else:
+                theHash, theTokens, theMarkdown = theResult
+                self.setTokens(tHandle, theTokens, theMarkdown)
+                if self.tokenCache is not None:
+                    self.tokenCache[tHandle] = (
+                        self._tokenCacheKey(theHash), tuple(theTokens), theMarkdown
+                    )
+            yield tHandle
+
+        return
+
+    def _replacers(self):
+        """Return the compiled text replacements to be applied by
+        doAutoReplace, in order. The auto-replace of the project is
+        compiled once and shared by all documents.
+        """
+        return [self.theProject.getAutoReplacer()]
+
+    def _tokenCacheKey(self, theHash):
+        """Return the token cache key for a text hash and the current
+        settings.
+        """
+        return (theHash, self.doBodyText, self.doSynopsis, self.doComments, self.doKeywords)
+
+    def _setItemLayout(self):
+        """Set the layout flags of the current item.
+        """
+        self.isNone  = self.theItem.itemLayout == nwItemLayout.NO_LAYOUT
+        self.isTitle = self.theItem.itemLayout == nwItemLayout.TITLE
+        self.isBook  = self.theItem.itemLayout == nwItemLayout.BOOK
+        self.isPage  = self.theItem.itemLayout == nwItemLayout.PAGE
+        self.isPart  = self.theItem.itemLayout == nwItemLayout.PARTITION
+        self.isUnNum = self.theItem.itemLayout == nwItemLayout.UNNUMBERED
+        self.isChap  = self.theItem.itemLayout == nwItemLayout.CHAPTER
+        self.isScene = self.theItem.itemLayout == nwItemLayout.SCENE
+        self.isNote  = self.theItem.itemLayout == nwItemLayout.NOTE
+        self.isNovel = self.isBook or self.isUnNum or self.isChap or self.isScene
+
+        return
+
     def _formatHeading(self, theTitle, theText):
         """Replaces the %keyword% strings.
         """
@@ -685,3 +654,203 @@ class Tokenizer():
         return theTitle
 
 # END Class Tokenizer
+
+# =============================================================================================== #
+#  Document Tokenizer
+#  These functions do not depend on the project, so that they can also run in worker processes.
+# =============================================================================================== #
+
+# RegExes for adding formatting tags within text lines, with the tag text
+# that must be present in a line for each of them to match
+_ESC_REPLACER = TextReplacer({
+    r"\*" : "*",
+    r"\~" : "~",
+    r"\_" : "_",
+})
+
+_FMT_RX = (
+    ("_",  re.compile(nwRegEx.FMT_EI), Tokenizer.FMT_I_B, Tokenizer.FMT_I_E),
+    ("**", re.compile(nwRegEx.FMT_EB), Tokenizer.FMT_B_B, Tokenizer.FMT_B_E),
+    ("~~", re.compile(nwRegEx.FMT_ST), Tokenizer.FMT_D_B, Tokenizer.FMT_D_E),
+)
+
+def scanFormats(theLine):
+    """Find the inline formatting tags of a line of text. Returns a list
+    of [position, length, format] entries sorted by position.
+    """
+    fmtPos = []
+    nFormats = 0
+    for fmtTag, theRX, fmtBeg, fmtEnd in _FMT_RX:
+        if fmtTag not in theLine:
+            # Most lines have no formatting, so skip the RegEx if the
+            # tag character isn't there at all
+            continue
+        nBefore = len(fmtPos)
+        for rxMatch in theRX.finditer(theLine):
+            xLen = len(rxMatch.group(1))
+            fmtPos.append([rxMatch.start(1), xLen, fmtBeg])
+            fmtPos.append([rxMatch.start(3), xLen, fmtEnd])
+        if len(fmtPos) > nBefore:
+            nFormats += 1
+
+    # The matches of each format are already in order, so only mixed
+    # formats need sorting
+    if nFormats > 1:
+        fmtPos.sort(key=itemgetter(0))
+
+    return fmtPos
+
+def tokenizeDocText(theText, doBodyText, doSynopsis, doComments, doKeywords):
+    """Split a text into tokens as described in
+    Tokenizer.tokenizeText, and build the filtered markdown. Returns
+    the list of tokens and the markdown.
+    """
+    theTokens = []
+    tmpMarkdown = []
+    nLine = 0
+    for aLine in theText.splitlines():
+        nLine += 1
+
+        # Tag lines starting with specific characters
+        if len(aLine.strip()) == 0:
+            theTokens.append((
+                Tokenizer.T_EMPTY,
+                nLine,
+                "",
+                None,
+                Tokenizer.A_NONE
+            ))
+            tmpMarkdown.append("\n")
+
+        elif aLine[0] == "%":
+            cLine = aLine[1:].lstrip()
+            synTag = cLine[:9].lower()
+            if synTag == "synopsis:":
+                theTokens.append((
+                    Tokenizer.T_SYNOPSIS,
+                    nLine,
+                    cLine[9:].strip(),
+                    None,
+                    Tokenizer.A_NONE
+                ))
+                if doSynopsis:
+                    tmpMarkdown.append("%s\n" % aLine)
+            else:
+                theTokens.append((
+                    Tokenizer.T_COMMENT,
+                    nLine,
+                    aLine[1:].strip(),
+                    None,
+                    Tokenizer.A_NONE
+                ))
+                if doComments:
+                    tmpMarkdown.append("%s\n" % aLine)
+
+        elif aLine[0] == "@":
+            theTokens.append((
+                Tokenizer.T_KEYWORD,
+                nLine,
+                aLine[1:].strip(),
+                None,
+                Tokenizer.A_NONE
+            ))
+            if doKeywords:
+                tmpMarkdown.append("%s\n" % aLine)
+
+        elif aLine[:2] == "# ":
+            theTokens.append((
+                Tokenizer.T_HEAD1,
+                nLine,
+                aLine[2:].strip(),
+                None,
+                Tokenizer.A_NONE
+            ))
+            tmpMarkdown.append("%s\n" % aLine)
+
+        elif aLine[:3] == "## ":
+            theTokens.append((
+                Tokenizer.T_HEAD2,
+                nLine,
+                aLine[3:].strip(),
+                None,
+                Tokenizer.A_NONE
+            ))
+            tmpMarkdown.append("%s\n" % aLine)
+
+        elif aLine[:4] == "### ":
+            theTokens.append((
+                Tokenizer.T_HEAD3,
+                nLine,
+                aLine[4:].strip(),
+                None,
+                Tokenizer.A_NONE
+            ))
+            tmpMarkdown.append("%s\n" % aLine)
+
+        elif aLine[:5] == "#### ":
+            theTokens.append((
+                Tokenizer.T_HEAD4,
+                nLine,
+                aLine[5:].strip(),
+                None,
+                Tokenizer.A_NONE
+            ))
+            tmpMarkdown.append("%s\n" % aLine)
+
+        else:
+            if not doBodyText:
+                # Skip all body text
+                continue
+
+            # Save the line as is, but append the array of formatting locations
+            # sorted by position
+            fmtPos = scanFormats(aLine)
+            theTokens.append((
+                Tokenizer.T_TEXT,
+                nLine,
+                aLine,
+                fmtPos,
+                Tokenizer.A_NONE
+            ))
+            tmpMarkdown.append("%s\n" % aLine)
+
+    # Always add an empty line at the end
+    theTokens.append((
+        Tokenizer.T_EMPTY,
+        nLine,
+        "",
+        None,
+        Tokenizer.A_NONE
+    ))
+    tmpMarkdown.append("\n")
+
+    return theTokens, "".join(tmpMarkdown)
+
+def _tokenizeWorker(theJob):
+    """Process pool entry point. Reads, auto-replaces and tokenizes a
+    single document, and returns the text hash, the tokens and the
+    markdown. Returns None if there is nothing to do, or if the file
+    could not be read or is too big, so it is handled by the caller.
+    """
+    tHandle, theArgs = theJob
+    if theArgs is None:
+        return None
+
+    docPath, theReplacers, doBodyText, doSynopsis, doComments, doKeywords = theArgs
+    try:
+        if not os.path.isfile(docPath):
+            return None
+        theText = readDocText(docPath)
+    except Exception:
+        return None
+
+    if len(theText) > nwConst.maxDocSize:
+        return None
+
+    for theReplacer in theReplacers:
+        theText = theReplacer.replace(theText)
+    theTokens, theMarkdown = tokenizeDocText(
+        theText, doBodyText, doSynopsis, doComments, doKeywords
+    )
+
+    return textHash(theText), theTokens, theMarkdown
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Markdown Converter
+
+ novelWriter – Markdown Converter
+==================================
+ Extends the Tokenizer class to write standard Markdown
+
+ File History:
+ Created: 2026-10-18 [1.0b5]
+
+ This file is a part of novelWriter
+ Copyright 2018–2020, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+
+from nw.core.tokenizer import Tokenizer
+from nw.constants import nwLabels
+
+logger = logging.getLogger(__name__)
+
+class ToMarkdown(Tokenizer):
+
+    def __init__(self, theProject, theParent):
+        Tokenizer.__init__(self, theProject, theParent)
+        return
+
+    ##
+    #  Class Methods
+    ##
+
+    def doPostProcessing(self):
+        """The escaped characters are also escapes in Markdown, so they
+        are left as they are.
+        """
+        return
+
+    def doConvert(self):
+        """Convert the list of text tokens into Markdown saved to
+        theResult. The emphasis and strikethrough tags are already
+        valid Markdown, so the text lines are kept as they are.
+        """
+        if self.isNovel:
+            # For novel files, we bump the titles one level up, like
+            # for the HTML export
+            h1 = "#"
+            h2 = "#"
+            h3 = "##"
+            h4 = "###"
+        else:
+            h1 = "#"
+            h2 = "##"
+            h3 = "###"
+            h4 = "####"
+
+        self.theResult = ""
+
+        thisPar = []
+        tmpResult = []
+        for tType, tLine, tText, tFormat, tStyle in self.theTokens:
+
+            if tType == self.T_EMPTY:
+                if len(thisPar) > 0:
+                    tmpResult.append("%s\n\n" % "".join(thisPar).rstrip())
+                thisPar = []
+
+            elif tType == self.T_TITLE:
+                tmpResult.append("# %s\n\n" % tText.replace(r"\\", " "))
+
+            elif tType == self.T_HEAD1:
+                tmpResult.append("%s %s\n\n" % (h1, tText.replace(r"\\", " ")))
+
+            elif tType == self.T_HEAD2:
+                tmpResult.append("%s %s\n\n" % (h2, tText.replace(r"\\", " ")))
+
+            elif tType == self.T_HEAD3:
+                tmpResult.append("%s %s\n\n" % (h3, tText.replace(r"\\", " ")))
+
+            elif tType == self.T_HEAD4:
+                tmpResult.append("%s %s\n\n" % (h4, tText.replace(r"\\", " ")))
+
+            elif tType == self.T_SEP:
+                tmpResult.append("%s\n\n" % tText)
+
+            elif tType == self.T_SKIP:
+                tmpResult.append("&nbsp;\n\n")
+
+            elif tType == self.T_TEXT:
+                if tText.endswith("  "):
+                    thisPar.append(tText.rstrip()+"  \n")
+                else:
+                    thisPar.append(tText.rstrip()+"\n")
+
+            elif tType == self.T_SYNOPSIS and self.doSynopsis:
+                tmpResult.append("**Synopsis:** %s\n\n" % tText)
+
+            elif tType == self.T_COMMENT and self.doComments:
+                tmpResult.append("**Comment:** %s\n\n" % tText)
+
+            elif tType == self.T_KEYWORD and self.doKeywords:
+                tmpResult.append(self._formatKeywords(tText))
+
+        self.theResult = "".join(tmpResult)
+        tmpResult = []
+
+        return
+
+    ##
+    #  Internal Functions
+    ##
+
+    def _formatKeywords(self, tText):
+        """Write a keyword line as the keyword label in bold, followed
+        by its values.
+        """
+        isValid, theBits, thePos = self.theParent.theIndex.scanThis("@"+tText)
+        if not isValid or not theBits:
+            return ""
+
+        if theBits[0] not in nwLabels.KEY_NAME:
+            return ""
+
+        return "**%s:** %s\n\n" % (nwLabels.KEY_NAME[theBits[0]], ", ".join(theBits[1:]))
+
+# END Class ToMarkdown
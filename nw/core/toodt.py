@@ -0,0 +1,514 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Open Document Converter
+
+ novelWriter – Open Document Converter
+=======================================
+ Extends the Tokenizer class to write Open Document text files
+
+ File History:
+ Created: 2026-10-18 [1.0b5]
+
+ This file is a part of novelWriter
+ Copyright 2018–2020, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import nw
+import logging
+import re
+
+from zipfile import ZipFile, ZIP_STORED, ZIP_DEFLATED
+from lxml import etree
+
+from nw.core.tokenizer import Tokenizer
+from nw.constants import nwLabels
+
+logger = logging.getLogger(__name__)
+
+# Open Document Namespaces
+XML_NS = {
+    "office"   : "urn:oasis:names:tc:opendocument:xmlns:office:1.0",
+    "style"    : "urn:oasis:names:tc:opendocument:xmlns:style:1.0",
+    "text"     : "urn:oasis:names:tc:opendocument:xmlns:text:1.0",
+    "fo"       : "urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0",
+    "svg"      : "urn:oasis:names:tc:opendocument:xmlns:svg-compatible:1.0",
+    "meta"     : "urn:oasis:names:tc:opendocument:xmlns:meta:1.0",
+    "dc"       : "http://purl.org/dc/elements/1.1/",
+    "manifest" : "urn:oasis:names:tc:opendocument:xmlns:manifest:1.0",
+}
+ODT_MIME = "application/vnd.oasis.opendocument.text"
+
+def _mkTag(nsName, tagName):
+    """Assemble a namespaced xml tag name.
+    """
+    return "{%s}%s" % (XML_NS[nsName], tagName)
+
+class ToOdt(Tokenizer):
+
+    # Character styles for the inline formatting
+    FMT_STYLE = {
+        Tokenizer.FMT_B_B : "T_Bold",
+        Tokenizer.FMT_I_B : "T_Italic",
+        Tokenizer.FMT_D_B : "T_Strike",
+    }
+    FMT_END = {
+        Tokenizer.FMT_B_E : Tokenizer.FMT_B_B,
+        Tokenizer.FMT_I_E : Tokenizer.FMT_I_B,
+        Tokenizer.FMT_D_E : Tokenizer.FMT_D_B,
+    }
+
+    def __init__(self, theProject, theParent):
+        Tokenizer.__init__(self, theProject, theParent)
+
+        self.textFont  = nw.CONFIG.textFont
+        self.textSize  = nw.CONFIG.textSize
+        self.parStyles = {} # Paragraph styles used by the converted text
+
+        self.reSpaces = re.compile(r"  +")
+
+        return
+
+    ##
+    #  Setters
+    ##
+
+    def setFont(self, textFont, textSize):
+        """Set the font used for the document text.
+        """
+        self.textFont = textFont
+        self.textSize = textSize
+        return
+
+    ##
+    #  Class Methods
+    ##
+
+    def doConvert(self):
+        """Convert the list of text tokens into the paragraphs of the
+        Open Document content saved to theResult. Only the body of the
+        document is generated here, the package itself is written by
+        saveOdt as the documents are converted.
+        """
+        if self.isNovel:
+            # For novel files, we bump the titles one level up, like
+            # for the HTML export
+            h1 = ("Title", 1)
+            h2 = ("Heading_1", 1)
+            h3 = ("Heading_2", 2)
+            h4 = ("Heading_3", 3)
+        else:
+            h1 = ("Heading_1", 1)
+            h2 = ("Heading_2", 2)
+            h3 = ("Heading_3", 3)
+            h4 = ("Heading_4", 4)
+
+        self.theResult = ""
+
+        thisPar = []
+        parStyle = None
+        tmpResult = []
+        for tType, tLine, tText, tFormat, tStyle in self.theTokens:
+
+            if tType == self.T_EMPTY:
+                if len(thisPar) > 0:
+                    tmpResult.append("<text:p text:style-name=\"%s\">%s</text:p>\n" % (
+                        parStyle, "".join(thisPar).rstrip()
+                    ))
+                thisPar = []
+                parStyle = None
+
+            elif tType == self.T_TITLE:
+                tmpResult.append(self._formatHeader(("Title", 1), tText, tStyle))
+
+            elif tType == self.T_HEAD1:
+                tmpResult.append(self._formatHeader(h1, tText, tStyle))
+
+            elif tType == self.T_HEAD2:
+                tmpResult.append(self._formatHeader(h2, tText, tStyle))
+
+            elif tType == self.T_HEAD3:
+                tmpResult.append(self._formatHeader(h3, tText, tStyle))
+
+            elif tType == self.T_HEAD4:
+                tmpResult.append(self._formatHeader(h4, tText, tStyle))
+
+            elif tType == self.T_SEP:
+                tmpResult.append("<text:p text:style-name=\"%s\">%s</text:p>\n" % (
+                    self._paraStyle("Separator", tStyle), self._xmlText(tText)
+                ))
+
+            elif tType == self.T_SKIP:
+                tmpResult.append("<text:p text:style-name=\"%s\"/>\n" % (
+                    self._paraStyle("Text_Body", tStyle)
+                ))
+
+            elif tType == self.T_TEXT:
+                if parStyle is None:
+                    parStyle = self._paraStyle("Text_Body", tStyle)
+                tTemp = self._formatText(tText.rstrip(), tFormat)
+                if tText.endswith("  "):
+                    thisPar.append(tTemp+"<text:line-break/>")
+                else:
+                    thisPar.append(tTemp+" ")
+
+            elif tType == self.T_SYNOPSIS and self.doSynopsis:
+                tmpResult.append(self._formatMeta("Synopsis", tText))
+
+            elif tType == self.T_COMMENT and self.doComments:
+                tmpResult.append(self._formatMeta("Comment", tText))
+
+            elif tType == self.T_KEYWORD and self.doKeywords:
+                tmpResult.append(self._formatKeywords(tText))
+
+        self.theResult = "".join(tmpResult)
+        tmpResult = []
+
+        return
+
+    def saveOdt(self, savePath, theParts):
+        """Write an Open Document text file. The parts are the converted
+        documents, which are written to the content of the package one
+        at a time, so the whole text is never held in memory. The styles
+        are written last, as they depend on the converted text.
+        """
+        with ZipFile(savePath, mode="w", compression=ZIP_DEFLATED) as outZip:
+
+            # The mimetype must be the first file, and not compressed
+            outZip.writestr("mimetype", ODT_MIME, compress_type=ZIP_STORED)
+
+            # The content is written up to the body text, followed by
+            # the text of each part and the remainder
+            xRoot = etree.Element(_mkTag("office", "document-content"), nsmap={
+                "office" : XML_NS["office"],
+                "style"  : XML_NS["style"],
+                "text"   : XML_NS["text"],
+                "fo"     : XML_NS["fo"],
+            })
+            xRoot.set(_mkTag("office", "version"), "1.2")
+            etree.SubElement(xRoot, _mkTag("office", "automatic-styles"))
+            xBody = etree.SubElement(xRoot, _mkTag("office", "body"))
+            etree.SubElement(xBody, _mkTag("office", "text"))
+
+            xmlText = self._xmlString(xRoot)
+            splitPos = xmlText.rindex("<office:text/>")
+            with outZip.open("content.xml", mode="w", force_zip64=True) as outFile:
+                outFile.write(xmlText[:splitPos].encode("utf-8"))
+                outFile.write(b"<office:text>\n")
+                for thePart in theParts:
+                    outFile.write(thePart.encode("utf-8"))
+                outFile.write(b"</office:text>")
+                outFile.write(xmlText[splitPos+14:].encode("utf-8"))
+
+            outZip.writestr("styles.xml", self._xmlString(self._makeStyles()))
+            outZip.writestr("meta.xml", self._xmlString(self._makeMeta()))
+            outZip.writestr("META-INF/manifest.xml", self._xmlString(self._makeManifest()))
+
+        return
+
+    ##
+    #  Internal Functions
+    ##
+
+    def _xmlText(self, theText):
+        """Encode a piece of text for the content xml. Tabs and repeated
+        spaces must be written as elements to be preserved.
+        """
+        theText = theText.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        if "\t" in theText:
+            theText = theText.replace("\t", "<text:tab/>")
+        if "  " in theText:
+            theText = self.reSpaces.sub(
+                lambda x: " <text:s text:c=\"%d\"/>" % (len(x.group(0)) - 1), theText
+            )
+        return theText
+
+    def _formatText(self, tText, tFormat):
+        """Apply the inline formatting to a line of text. The format
+        tags may overlap, so spans are closed and reopened as needed to
+        keep the xml valid.
+        """
+        if not tFormat:
+            return self._xmlText(tText)
+
+        retText = []
+        fmtOpen = []
+        lastPos = 0
+        for xPos, xLen, xFmt in tFormat:
+            retText.append(self._xmlText(tText[lastPos:xPos]))
+            lastPos = xPos + xLen
+            if xFmt in self.FMT_STYLE:
+                fmtOpen.append(xFmt)
+                retText.append("<text:span text:style-name=\"%s\">" % self.FMT_STYLE[xFmt])
+            elif self.FMT_END.get(xFmt) in fmtOpen:
+                fmtBeg = self.FMT_END[xFmt]
+                fmtIdx = fmtOpen.index(fmtBeg)
+                retText.append("</text:span>"*(len(fmtOpen) - fmtIdx))
+                fmtOpen.remove(fmtBeg)
+                for fmtKey in fmtOpen[fmtIdx:]:
+                    retText.append("<text:span text:style-name=\"%s\">" % self.FMT_STYLE[fmtKey])
+
+        retText.append(self._xmlText(tText[lastPos:]))
+        retText.append("</text:span>"*len(fmtOpen))
+
+        return "".join(retText)
+
+    def _formatHeader(self, hStyle, tText, tStyle):
+        """Write a heading. Titles are written as paragraphs, and the
+        other headings with their outline level.
+        """
+        styleName, outLevel = hStyle
+        tHead = "<text:line-break/>".join(self._xmlText(x) for x in tText.split(r"\\"))
+        if styleName == "Title":
+            return "<text:p text:style-name=\"%s\">%s</text:p>\n" % (
+                self._paraStyle(styleName, tStyle), tHead
+            )
+        return "<text:h text:style-name=\"%s\" text:outline-level=\"%d\">%s</text:h>\n" % (
+            self._paraStyle(styleName, tStyle), outLevel, tHead
+        )
+
+    def _formatMeta(self, theLabel, tText):
+        """Write a synopsis or comment paragraph with a bold label.
+        """
+        return (
+            "<text:p text:style-name=\"Text_Meta\">"
+            "<text:span text:style-name=\"T_Bold\">%s:</text:span> %s</text:p>\n"
+        ) % (theLabel, self._xmlText(tText))
+
+    def _formatKeywords(self, tText):
+        """Write a keyword line as the keyword label in bold, followed
+        by its values.
+        """
+        isValid, theBits, thePos = self.theParent.theIndex.scanThis("@"+tText)
+        if not isValid or not theBits:
+            return ""
+
+        if theBits[0] not in nwLabels.KEY_NAME:
+            return ""
+
+        return self._formatMeta(nwLabels.KEY_NAME[theBits[0]], ", ".join(theBits[1:]))
+
+    def _paraStyle(self, parentName, tStyle):
+        """Return the name of a paragraph style derived from a parent
+        style with the alignment and page breaks of a token, and record
+        it so that it is written to the styles.
+        """
+        if not tStyle:
+            return parentName
+
+        theAlign = None
+        if tStyle & self.A_LEFT:
+            theAlign = "left"
+        elif tStyle & self.A_RIGHT:
+            theAlign = "end"
+        elif tStyle & self.A_CENTRE:
+            theAlign = "center"
+        elif tStyle & self.A_JUSTIFY:
+            theAlign = "justify"
+
+        breakBefore = tStyle & self.A_PBB > 0
+        breakAfter = tStyle & self.A_PBA > 0
+        if theAlign is None and not breakBefore and not breakAfter:
+            return parentName
+
+        styleName = "%s_%s%s%s" % (
+            parentName,
+            "" if theAlign is None else theAlign[0].upper(),
+            "B" if breakBefore else "",
+            "A" if breakAfter else "",
+        )
+        self.parStyles[styleName] = (parentName, theAlign, breakBefore, breakAfter)
+
+        return styleName
+
+    def _makeStyles(self):
+        """Build the styles xml tree with the common styles, and the
+        paragraph styles recorded while converting the text.
+        """
+        xRoot = etree.Element(_mkTag("office", "document-styles"), nsmap={
+            "office" : XML_NS["office"],
+            "style"  : XML_NS["style"],
+            "text"   : XML_NS["text"],
+            "fo"     : XML_NS["fo"],
+            "svg"    : XML_NS["svg"],
+        })
+        xRoot.set(_mkTag("office", "version"), "1.2")
+
+        # The font is not known until the GUI has set it, in which case
+        # the default font of the word processor is used
+        txtProps = {"fo:font-size": "%dpt" % self.textSize}
+        if self.textFont:
+            xFonts = etree.SubElement(xRoot, _mkTag("office", "font-face-decls"))
+            xFont = etree.SubElement(xFonts, _mkTag("style", "font-face"))
+            xFont.set(_mkTag("style", "name"), self.textFont)
+            xFont.set(_mkTag("svg", "font-family"), "'%s'" % self.textFont)
+            txtProps["style:font-name"] = self.textFont
+
+        xStyles = etree.SubElement(xRoot, _mkTag("office", "styles"))
+        xDefault = etree.SubElement(xStyles, _mkTag("style", "default-style"))
+        xDefault.set(_mkTag("style", "family"), "paragraph")
+        self._addProps(xDefault, "text-properties", txtProps)
+
+        self._addStyle(xStyles, "Standard", None, {}, {})
+        self._addStyle(xStyles, "Text_Body", "Standard", {
+            "fo:margin-top"    : "0cm",
+            "fo:margin-bottom" : "0.25cm",
+            "fo:line-height"   : "115%",
+            "fo:text-align"    : "justify" if self.doJustify else "start",
+        }, {})
+        self._addStyle(xStyles, "Text_Meta", "Text_Body", {
+            "fo:text-align" : "start",
+        }, {
+            "fo:font-style" : "italic",
+            "fo:color"      : "#646464",
+        })
+        self._addStyle(xStyles, "Separator", "Text_Body", {
+            "fo:margin-top"    : "0.5cm",
+            "fo:margin-bottom" : "0.5cm",
+            "fo:text-align"    : "center",
+        }, {})
+        self._addStyle(xStyles, "Heading", "Standard", {
+            "fo:margin-top"     : "0.5cm",
+            "fo:margin-bottom"  : "0.25cm",
+            "fo:keep-with-next" : "always",
+        }, {
+            "fo:font-weight" : "bold",
+        })
+        self._addStyle(xStyles, "Title", "Heading", {
+            "fo:text-align" : "center",
+        }, {
+            "fo:font-size" : "250%",
+            "fo:color"     : "#4271ae",
+        })
+        for hNum, hSize, hColour in ((1, 180, "#4271ae"), (2, 150, "#4271ae"),
+                                     (3, 130, "#323232"), (4, 115, "#323232")):
+            self._addStyle(xStyles, "Heading_%d" % hNum, "Heading", {}, {
+                "fo:font-size" : "%d%%" % hSize,
+                "fo:color"     : hColour,
+            })
+
+        for styleName, fmtProp, fmtValue in (
+            ("T_Bold",   "fo:font-weight",                "bold"),
+            ("T_Italic", "fo:font-style",                 "italic"),
+            ("T_Strike", "style:text-line-through-style", "solid"),
+        ):
+            xStyle = etree.SubElement(xStyles, _mkTag("style", "style"))
+            xStyle.set(_mkTag("style", "name"), styleName)
+            xStyle.set(_mkTag("style", "family"), "text")
+            self._addProps(xStyle, "text-properties", {fmtProp: fmtValue})
+
+        for styleName in sorted(self.parStyles):
+            parentName, theAlign, breakBefore, breakAfter = self.parStyles[styleName]
+            parProps = {}
+            if theAlign is not None:
+                parProps["fo:text-align"] = theAlign
+            if breakBefore:
+                parProps["fo:break-before"] = "page"
+            if breakAfter:
+                parProps["fo:break-after"] = "page"
+            self._addStyle(xStyles, styleName, parentName, parProps, {})
+
+        # Page layout
+        xAuto = etree.SubElement(xRoot, _mkTag("office", "automatic-styles"))
+        xLayout = etree.SubElement(xAuto, _mkTag("style", "page-layout"))
+        xLayout.set(_mkTag("style", "name"), "PM1")
+        self._addProps(xLayout, "page-layout-properties", {
+            "fo:page-width"    : "21.0cm",
+            "fo:page-height"   : "29.7cm",
+            "fo:margin-top"    : "2.0cm",
+            "fo:margin-bottom" : "2.0cm",
+            "fo:margin-left"   : "2.5cm",
+            "fo:margin-right"  : "2.5cm",
+        })
+
+        xMaster = etree.SubElement(xRoot, _mkTag("office", "master-styles"))
+        xPage = etree.SubElement(xMaster, _mkTag("style", "master-page"))
+        xPage.set(_mkTag("style", "name"), "Standard")
+        xPage.set(_mkTag("style", "page-layout-name"), "PM1")
+
+        return xRoot
+
+    def _makeMeta(self):
+        """Build the meta xml tree with the project details.
+        """
+        xRoot = etree.Element(_mkTag("office", "document-meta"), nsmap={
+            "office" : XML_NS["office"],
+            "meta"   : XML_NS["meta"],
+            "dc"     : XML_NS["dc"],
+        })
+        xRoot.set(_mkTag("office", "version"), "1.2")
+
+        xMeta = etree.SubElement(xRoot, _mkTag("office", "meta"))
+        xGen = etree.SubElement(xMeta, _mkTag("meta", "generator"))
+        xGen.text = "novelWriter/%s" % nw.__version__
+        xTitle = etree.SubElement(xMeta, _mkTag("dc", "title"))
+        xTitle.text = self.theProject.bookTitle or self.theProject.projName
+        if self.theProject.bookAuthors:
+            xAuthor = etree.SubElement(xMeta, _mkTag("meta", "initial-creator"))
+            xAuthor.text = ", ".join(self.theProject.bookAuthors)
+
+        return xRoot
+
+    def _makeManifest(self):
+        """Build the manifest xml tree listing the files of the package.
+        """
+        xRoot = etree.Element(_mkTag("manifest", "manifest"), nsmap={
+            "manifest" : XML_NS["manifest"],
+        })
+        xRoot.set(_mkTag("manifest", "version"), "1.2")
+
+        for filePath, mediaType in (("/", ODT_MIME),
+                                    ("content.xml", "text/xml"),
+                                    ("styles.xml", "text/xml"),
+                                    ("meta.xml", "text/xml")):
+            xEntry = etree.SubElement(xRoot, _mkTag("manifest", "file-entry"))
+            xEntry.set(_mkTag("manifest", "full-path"), filePath)
+            xEntry.set(_mkTag("manifest", "media-type"), mediaType)
+            if filePath == "/":
+                xEntry.set(_mkTag("manifest", "version"), "1.2")
+
+        return xRoot
+
+    def _addStyle(self, xParent, styleName, parentName, parProps, txtProps):
+        """Add a paragraph style with its properties.
+        """
+        xStyle = etree.SubElement(xParent, _mkTag("style", "style"))
+        xStyle.set(_mkTag("style", "name"), styleName)
+        xStyle.set(_mkTag("style", "family"), "paragraph")
+        if parentName is not None:
+            xStyle.set(_mkTag("style", "parent-style-name"), parentName)
+        if parProps:
+            self._addProps(xStyle, "paragraph-properties", parProps)
+        if txtProps:
+            self._addProps(xStyle, "text-properties", txtProps)
+        return
+
+    def _addProps(self, xParent, propName, theProps):
+        """Add a style properties element. The property names are given
+        with their namespace prefix.
+        """
+        xProps = etree.SubElement(xParent, _mkTag("style", propName))
+        for propKey, propValue in theProps.items():
+            nsName, attName = propKey.split(":")
+            xProps.set(_mkTag(nsName, attName), propValue)
+        return
+
+    def _xmlString(self, xRoot):
+        """Serialise an xml tree with the xml declaration.
+        """
+        return etree.tostring(
+            xRoot, xml_declaration=True, encoding="UTF-8", pretty_print=True
+        ).decode("utf-8")
+
+# END Class ToOdt
@@ -29,6 +29,8 @@
 """
 
 import logging
+import multiprocessing
+import re
 
 from nw.constants import nwUnicode
 
@@ -182,3 +184,96 @@ def _numberToWordEN(numVal):
                 return f"{hunWord} {tenWord}-{oneWord}".strip()
 
     return ""
+
+# =============================================================================================== #
+#  Worker Processes
+# =============================================================================================== #
+
+def runWorkers(theWorker, theJobs, numWorkers):
+    """Run a list of jobs, each a tuple starting with a handle, through
+    a worker function in a pool of spawned processes, and yield each
+    handle with its result in the order of the job list. If the pool
+    cannot be used, the remaining jobs are yielded with None as result
+    so they can be processed by the caller instead. If the generator is
+    closed early, the pool is terminated and the pending jobs dropped.
+    """
+    nDone = 0
+    try:
+        mpContext = multiprocessing.get_context("spawn")
+        with mpContext.Pool(numWorkers) as thePool:
+            nChunk = max(1, len(theJobs)//(4*numWorkers))
+            for theResult in thePool.imap(theWorker, theJobs, chunksize=nChunk):
+                yield theJobs[nDone][0], theResult
+                nDone += 1
+    except Exception as e:
+        logger.error("Parallel processing failed, falling back to serial processing")
+        logger.error(str(e))
+        for theJob in theJobs[nDone:]:
+            yield theJob[0], None
+    return
+
+# =============================================================================================== #
+#  Text Replacement
+#  A compiled set of text replacements, applied in a single pass.
+# =============================================================================================== #
+
+class TextReplacer():
+
+    def __init__(self, repDict):
+
+        self.repDict = dict(repDict)
+        self.repRegEx = None
+
+        if self.repDict:
+            # The keys are matched through a trie of their characters,
+            # so the RegEx only tries the keys that share a prefix with
+            # the text, and the longest key wins if they overlap
+            theTrie = {}
+            for aKey in self.repDict:
+                theNode = theTrie
+                for aChar in aKey:
+                    theNode = theNode.setdefault(aChar, {})
+                theNode[""] = {}
+            self.repRegEx = re.compile(_triePattern(theTrie), flags=re.DOTALL)
+
+        return
+
+    def replace(self, theText):
+        """Replace all occurrences of the keys in a text with their
+        values.
+        """
+        if self.repRegEx is None:
+            return theText
+        return self.repRegEx.sub(lambda x: self.repDict[x.group(0)], theText)
+
+# END Class TextReplacer
+
+def _triePattern(theNode):
+    """Build a RegEx pattern matching all the keys of a trie node.
+    """
+    theAlts = []
+    theChars = []
+    isOpt = False
+    for aChar in sorted(theNode):
+        if aChar == "":
+            isOpt = True
+            continue
+        subPattern = _triePattern(theNode[aChar])
+        if subPattern:
+            theAlts.append(re.escape(aChar) + subPattern)
+        else:
+            theChars.append(re.escape(aChar))
+
+    if len(theChars) == 1:
+        theAlts.append(theChars[0])
+    elif len(theChars) > 1:
+        theAlts.append("[%s]" % "".join(theChars))
+
+    if not theAlts:
+        return ""
+    elif len(theAlts) == 1 and not isOpt:
+        return theAlts[0]
+    elif len(theAlts) == 1 and len(theAlts[0]) == 1:
+        return theAlts[0] + "?"
+
+    return "(?:%s)%s" % ("|".join(theAlts), "?" if isOpt else "")
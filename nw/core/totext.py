@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Plain Text Converter
+
+ novelWriter – Plain Text Converter
+====================================
+ Extends the Tokenizer class to write plain text
+
+ File History:
+ Created: 2026-10-18 [1.0b5]
+
+ This file is a part of novelWriter
+ Copyright 2018–2020, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import logging
+
+from nw.core.tokenizer import Tokenizer
+from nw.constants import nwLabels
+
+logger = logging.getLogger(__name__)
+
+class ToText(Tokenizer):
+
+    def __init__(self, theProject, theParent):
+        Tokenizer.__init__(self, theProject, theParent)
+        return
+
+    ##
+    #  Class Methods
+    ##
+
+    def doConvert(self):
+        """Convert the list of text tokens into plain text saved to
+        theResult. Formatting tags are removed, and each paragraph is
+        written as a single line.
+        """
+        self.theResult = ""
+
+        thisPar = []
+        tmpResult = []
+        inBlock = False
+        for tType, tLine, tText, tFormat, tStyle in self.theTokens:
+
+            if tType == self.T_EMPTY:
+                if len(thisPar) > 0:
+                    tmpResult.append("%s\n\n" % "".join(thisPar).rstrip())
+                elif inBlock:
+                    tmpResult.append("\n")
+                thisPar = []
+                inBlock = False
+
+            elif tType in (self.T_TITLE, self.T_HEAD1, self.T_HEAD2, self.T_HEAD3, self.T_HEAD4):
+                tmpResult.append("%s\n\n" % tText.replace(r"\\", "\n"))
+
+            elif tType == self.T_SEP:
+                tmpResult.append("%s\n\n" % tText)
+
+            elif tType == self.T_SKIP:
+                tmpResult.append("\n\n")
+
+            elif tType == self.T_TEXT:
+                tTemp = tText
+                if tFormat:
+                    # Assemble the line from the text between the tags
+                    tSegs = []
+                    lastPos = 0
+                    for xPos, xLen, xFmt in tFormat:
+                        tSegs.append(tText[lastPos:xPos])
+                        lastPos = xPos + xLen
+                    tSegs.append(tText[lastPos:])
+                    tTemp = "".join(tSegs)
+                if tText.endswith("  "):
+                    thisPar.append(tTemp.rstrip()+"\n")
+                else:
+                    thisPar.append(tTemp.rstrip()+" ")
+
+            elif tType == self.T_SYNOPSIS and self.doSynopsis:
+                tmpResult.append("Synopsis: %s\n" % tText)
+                inBlock = True
+
+            elif tType == self.T_COMMENT and self.doComments:
+                tmpResult.append("Comment: %s\n" % tText)
+                inBlock = True
+
+            elif tType == self.T_KEYWORD and self.doKeywords:
+                tTemp = self._formatKeywords(tText)
+                if tTemp:
+                    tmpResult.append(tTemp)
+                    inBlock = True
+
+        self.theResult = "".join(tmpResult)
+        tmpResult = []
+
+        return
+
+    ##
+    #  Internal Functions
+    ##
+
+    def _formatKeywords(self, tText):
+        """Write a keyword line as the keyword label and its values.
+        """
+        isValid, theBits, thePos = self.theParent.theIndex.scanThis("@"+tText)
+        if not isValid or not theBits:
+            return ""
+
+        if theBits[0] not in nwLabels.KEY_NAME:
+            return ""
+
+        return "%s: %s\n" % (nwLabels.KEY_NAME[theBits[0]], ", ".join(theBits[1:]))
+
+# END Class ToText
@@ -30,6 +30,7 @@ import json
 import os
 
 from lxml import etree
+from copy import copy
 from hashlib import sha256
 from time import time
 
@@ -51,6 +52,7 @@ class NWTree():
         self._trashRoot   = None  # The handle of the trash root folder
         self._theIndex    = 0     # The current iterator index
         self._treeChanged = False # True if tree structure has changed
+        self._treeVersion = 0     # Incremented on every change to the tree
         self._handleSeed  = None  # Used for generating handles for testing
 
         return
@@ -69,6 +71,7 @@ class NWTree():
         self._archRoot  = None
         self._theIndex  = 0
         self._treeChanged = False
+        self._treeVersion += 1
         return
 
     def handles(self):
@@ -76,6 +79,19 @@ class NWTree():
         """
         return self._treeOrder.copy()
 
+    def copyTree(self):
+        """Returns a copy of the tree with copies of all the items. The
+        copy can be read from another thread while this tree changes.
+        """
+        theCopy = NWTree(self.theProject)
+        theCopy._projTree    = {tHandle: copy(tItem) for tHandle, tItem in self._projTree.items()}
+        theCopy._treeOrder   = self._treeOrder.copy()
+        theCopy._treeRoots   = self._treeRoots.copy()
+        theCopy._trashRoot   = self._trashRoot
+        theCopy._archRoot    = self.archiveRoot()
+        theCopy._treeVersion = self._treeVersion
+        return theCopy
+
     def append(self, tHandle, pHandle, nwItem):
         """Add a new item to the end of the tree.
         """
@@ -343,10 +359,23 @@ class NWTree():
 
         return True
 
+    def updateVersion(self):
+        """Increment the tree version counter. Called by items when a
+        setting affecting the tree's content changes.
+        """
+        self._treeVersion += 1
+        return
+
     ##
     #  Getters
     ##
 
+    def treeVersion(self):
+        """Returns a counter that changes every time the tree order or
+        the content of the tree changes. Used for cache invalidation.
+        """
+        return self._treeVersion
+
     def countTypes(self):
         """Count the number of files, folders and roots in the project.
         """
@@ -450,6 +479,7 @@ class NWTree():
         """
         self._treeChanged = theState
         if theState:
+            self._treeVersion += 1
             self.theProject.setProjectChanged(True)
         return
 
@@ -33,10 +33,10 @@ import os
 from time import time
 from datetime import datetime
 
-from PyQt5.QtCore import Qt, QByteArray, QTimer
+from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtPrintSupport import QPrinter, QPrintPreviewDialog
 from PyQt5.QtGui import (
-    QPalette, QColor, QTextDocumentWriter, QFont, QCursor
+    QPalette, QColor, QFont, QCursor
 )
 from PyQt5.QtWidgets import (
     qApp, QDialog, QVBoxLayout, QHBoxLayout, QTextBrowser, QPushButton, QLabel,
@@ -47,23 +47,23 @@ from PyQt5.QtWidgets import (
 
 from nw.common import fuzzyTime, makeFileNameSafe
 from nw.gui.custom import QSwitch
-from nw.core import ToHtml
-from nw.constants import (
-    nwConst, nwAlert, nwFiles, nwItemType, nwItemLayout, nwItemClass
-)
+from nw.core import NWBuild, ToHtml, ToOdt
+from nw.core.build import newConverter, reFmtCodes
+from nw.constants import nwConst, nwAlert, nwFiles
 
 logger = logging.getLogger(__name__)
 
 class GuiBuildNovel(QDialog):
 
-    FMT_ODT    = 1
+    FMT_ODT    = NWBuild.FMT_ODT
     FMT_PDF    = 2
-    FMT_HTM    = 3
-    FMT_MD     = 4
-    FMT_NWD    = 5
-    FMT_TXT    = 6
-    FMT_JSON_H = 7
-    FMT_JSON_M = 8
+    FMT_HTM    = NWBuild.FMT_HTM
+    FMT_MD     = NWBuild.FMT_MD
+    FMT_NWD    = NWBuild.FMT_NWD
+    FMT_TXT    = NWBuild.FMT_TXT
+    FMT_JSON_H = NWBuild.FMT_JSON_H
+    FMT_JSON_M = NWBuild.FMT_JSON_M
+    FMT_EPUB   = NWBuild.FMT_EPUB
 
     def __init__(self, theParent, theProject):
         QDialog.__init__(self, theParent)
@@ -82,6 +82,9 @@ class GuiBuildNovel(QDialog):
         self.nwdText   = [] # List of markdown documents
         self.buildTime = 0  # The timestamp of the last build
 
+        # Tokenized documents, reused by the next build if unchanged
+        self.tokenCache = {}
+
         self.setWindowTitle("Build Novel Project")
         self.setMinimumWidth(self.mainConf.pxInt(700))
         self.setMinimumHeight(self.mainConf.pxInt(600))
@@ -124,7 +127,7 @@ class GuiBuildNovel(QDialog):
         self.fmtTitle.setMinimumWidth(xFmt)
         self.fmtTitle.setToolTip(fmtHelp)
         self.fmtTitle.setText(
-            self._reFmtCodes(self.theProject.titleFormat["title"])
+            reFmtCodes(self.theProject.titleFormat["title"])
         )
 
         self.fmtChapter = QLineEdit()
@@ -132,7 +135,7 @@ class GuiBuildNovel(QDialog):
         self.fmtChapter.setMinimumWidth(xFmt)
         self.fmtChapter.setToolTip(fmtHelp)
         self.fmtChapter.setText(
-            self._reFmtCodes(self.theProject.titleFormat["chapter"])
+            reFmtCodes(self.theProject.titleFormat["chapter"])
         )
 
         self.fmtUnnumbered = QLineEdit()
@@ -140,7 +143,7 @@ class GuiBuildNovel(QDialog):
         self.fmtUnnumbered.setMinimumWidth(xFmt)
         self.fmtUnnumbered.setToolTip(fmtHelp)
         self.fmtUnnumbered.setText(
-            self._reFmtCodes(self.theProject.titleFormat["unnumbered"])
+            reFmtCodes(self.theProject.titleFormat["unnumbered"])
         )
 
         self.fmtScene = QLineEdit()
@@ -148,7 +151,7 @@ class GuiBuildNovel(QDialog):
         self.fmtScene.setMinimumWidth(xFmt)
         self.fmtScene.setToolTip(fmtHelp + fmtScHelp)
         self.fmtScene.setText(
-            self._reFmtCodes(self.theProject.titleFormat["scene"])
+            reFmtCodes(self.theProject.titleFormat["scene"])
         )
 
         self.fmtSection = QLineEdit()
@@ -156,7 +159,7 @@ class GuiBuildNovel(QDialog):
         self.fmtSection.setMinimumWidth(xFmt)
         self.fmtSection.setToolTip(fmtHelp + fmtScHelp)
         self.fmtSection.setText(
-            self._reFmtCodes(self.theProject.titleFormat["section"])
+            reFmtCodes(self.theProject.titleFormat["section"])
         )
 
         # Dummy boxes due to QGridView and QLineEdit expand bug
@@ -391,6 +394,10 @@ class GuiBuildNovel(QDialog):
         self.savePDF.triggered.connect(lambda: self._saveDocument(self.FMT_PDF))
         self.saveMenu.addAction(self.savePDF)
 
+        self.saveEPUB = QAction("E-Book (.epub)", self)
+        self.saveEPUB.triggered.connect(lambda: self._saveDocument(self.FMT_EPUB))
+        self.saveMenu.addAction(self.saveEPUB)
+
         self.saveHTM = QAction("novelWriter HTML (.htm)", self)
         self.saveHTM.triggered.connect(lambda: self._saveDocument(self.FMT_HTM))
         self.saveMenu.addAction(self.saveHTM)
@@ -399,10 +406,9 @@ class GuiBuildNovel(QDialog):
         self.saveNWD.triggered.connect(lambda: self._saveDocument(self.FMT_NWD))
         self.saveMenu.addAction(self.saveNWD)
 
-        if self.mainConf.verQtValue >= 51400:
-            self.saveMD = QAction("Markdown (.md)", self)
-            self.saveMD.triggered.connect(lambda: self._saveDocument(self.FMT_MD))
-            self.saveMenu.addAction(self.saveMD)
+        self.saveMD = QAction("Markdown (.md)", self)
+        self.saveMD.triggered.connect(lambda: self._saveDocument(self.FMT_MD))
+        self.saveMenu.addAction(self.saveMD)
 
         self.saveTXT = QAction("Plain Text (.txt)", self)
         self.saveTXT.triggered.connect(lambda: self._saveDocument(self.FMT_TXT))
@@ -534,39 +540,12 @@ class GuiBuildNovel(QDialog):
         """Build a preview of the project in the document viewer.
         """
         # Get Settings
-        fmtTitle      = self.fmtTitle.text().strip()
-        fmtChapter    = self.fmtChapter.text().strip()
-        fmtUnnumbered = self.fmtUnnumbered.text().strip()
-        fmtScene      = self.fmtScene.text().strip()
-        fmtSection    = self.fmtSection.text().strip()
-        justifyText   = self.justifyText.isChecked()
-        noStyling     = self.noStyling.isChecked()
-        textFont      = self.textFont.text()
-        textSize      = self.textSize.value()
-        incSynopsis   = self.includeSynopsis.isChecked()
-        incComments   = self.includeComments.isChecked()
-        incKeywords   = self.includeKeywords.isChecked()
-        novelFiles    = self.novelFiles.isChecked()
-        noteFiles     = self.noteFiles.isChecked()
-        ignoreFlag    = self.ignoreFlag.isChecked()
-        includeBody   = self.includeBody.isChecked()
-        replaceTabs   = self.replaceTabs.isChecked()
-
-        makeHtml = ToHtml(self.theProject, self.theParent)
-        makeHtml.setTitleFormat(fmtTitle)
-        makeHtml.setChapterFormat(fmtChapter)
-        makeHtml.setUnNumberedFormat(fmtUnnumbered)
-        makeHtml.setSceneFormat(fmtScene, fmtScene == "")
-        makeHtml.setSectionFormat(fmtSection, fmtSection == "")
-        makeHtml.setBodyText(includeBody)
-        makeHtml.setSynopsis(incSynopsis)
-        makeHtml.setComments(incComments)
-        makeHtml.setKeywords(incKeywords)
-        makeHtml.setJustify(justifyText)
-        makeHtml.setStyles(not noStyling)
+        justifyText = self.justifyText.isChecked()
+        noStyling   = self.noStyling.isChecked()
+        textFont    = self.textFont.text()
+        textSize    = self.textSize.value()
 
-        # Make sure the tree order is correct
-        self.theParent.treeView.flushTreeOrder()
+        makeHtml = self._makeConverter(NWBuild.FMT_HTM)
 
         self.buildProgress.setMaximum(len(self.theProject.projTree))
         self.buildProgress.setValue(0)
@@ -579,44 +558,20 @@ class GuiBuildNovel(QDialog):
 
         htmlSize = 0
 
-        for nItt, tItem in enumerate(self.theProject.projTree):
-
-            noteRoot  = noteFiles
-            noteRoot &= tItem.itemType == nwItemType.ROOT
-            noteRoot &= tItem.itemClass != nwItemClass.NOVEL
-            noteRoot &= tItem.itemClass != nwItemClass.ARCHIVE
-
-            try:
-                if noteRoot:
-                    # Add headers for root folders of notes
-                    makeHtml.addRootHeading(tItem.itemHandle)
-                    makeHtml.doConvert()
-                    self.htmlText.append(makeHtml.getResult())
-                    self.nwdText.append(makeHtml.getFilteredMarkdown())
-                    htmlSize += makeHtml.getResultSize()
-
-                elif self._checkInclude(tItem, noteFiles, novelFiles, ignoreFlag):
-                    makeHtml.setText(tItem.itemHandle)
-                    makeHtml.doAutoReplace()
-                    makeHtml.tokenizeText()
-                    makeHtml.doHeaders()
-                    makeHtml.doConvert()
-                    makeHtml.doPostProcessing()
-                    self.htmlText.append(makeHtml.getResult())
-                    self.nwdText.append(makeHtml.getFilteredMarkdown())
-                    htmlSize += makeHtml.getResultSize()
+        try:
+            theBuild = self._makeBuild().iterBuild(makeHtml)
+            for nItt, (tItem, theHtml, theNwd) in enumerate(theBuild):
+                if theHtml is not None:
+                    self.htmlText.append(theHtml)
+                    self.nwdText.append(theNwd)
+                    htmlSize += len(theHtml)
 
-            except Exception as e:
-                logger.error("Failed to generate html of document '%s'" % tItem.itemHandle)
-                logger.error(str(e))
-                self.docView.setText((
-                    "Failed to generate preview. "
-                    "Document with title '%s' could not be parsed."
-                ) % tItem.itemName)
-                return False
+                # Update progress bar, also for skipped items
+                self.buildProgress.setValue(nItt+1)
 
-            # Update progress bar, also for skipped items
-            self.buildProgress.setValue(nItt+1)
+        except Exception as e:
+            self.docView.setText("Failed to generate preview. %s" % str(e))
+            return False
 
         if makeHtml.errData:
             self.theParent.makeAlert((
@@ -624,18 +579,6 @@ class GuiBuildNovel(QDialog):
                 "<br>-&nbsp;%s"
             ) % "<br>-&nbsp;".join(makeHtml.errData), nwAlert.ERROR)
 
-        if replaceTabs:
-            htmlText = []
-            eightSpace = "&nbsp;"*8
-            for aLine in self.htmlText:
-                htmlText.append(aLine.replace("\t", eightSpace))
-            self.htmlText = htmlText
-
-            nwdText = []
-            for aLine in self.nwdText:
-                nwdText.append(aLine.replace("\t", "        "))
-            self.nwdText = nwdText
-
         tEnd = int(time())
         logger.debug("Built project in %.3f ms" % (1000*(tEnd-tStart)))
         self.htmlStyle = makeHtml.getStyleSheet()
@@ -662,76 +605,83 @@ class GuiBuildNovel(QDialog):
 
         return
 
-    def _checkInclude(self, theItem, noteFiles, novelFiles, ignoreFlag):
-        """This function checks whether a file should be included in the
-        export or not. For standard note and novel files, this is
-        controlled by the options selected by the user. For other files
-        classified as non-exportable, a few checks must be made, and the
-        following are not:
-        * Items that are not actual files.
-        * Items that have been orphaned which are tagged as NO_LAYOUT
-          and NO_CLASS.
-        * Items that appear in the TRASH folder or have parent set to
-          None (orphaned files).
+    def _makeConverter(self, theFormat):
+        """Create a converter for a format with the current build
+        settings.
         """
-        if theItem is None:
-            return False
-
-        if not theItem.isExported and not ignoreFlag:
-            return False
-
-        isNone  = theItem.itemType != nwItemType.FILE
-        isNone |= theItem.itemLayout == nwItemLayout.NO_LAYOUT
-        isNone |= theItem.itemClass == nwItemClass.NO_CLASS
-        isNone |= theItem.itemClass == nwItemClass.TRASH
-        isNone |= theItem.itemParent == self.theProject.projTree.trashRoot()
-        isNone |= theItem.itemParent is None
-        isNote  = theItem.itemLayout == nwItemLayout.NOTE
-        isNovel = not isNone and not isNote
+        fmtTitle      = self.fmtTitle.text().strip()
+        fmtChapter    = self.fmtChapter.text().strip()
+        fmtUnnumbered = self.fmtUnnumbered.text().strip()
+        fmtScene      = self.fmtScene.text().strip()
+        fmtSection    = self.fmtSection.text().strip()
 
-        if isNone:
-            return False
-        if isNote and not noteFiles:
-            return False
-        if isNovel and not novelFiles:
-            return False
+        theConv = newConverter(theFormat, self.theProject, self.theParent)
+        theConv.setTitleFormat(fmtTitle)
+        theConv.setChapterFormat(fmtChapter)
+        theConv.setUnNumberedFormat(fmtUnnumbered)
+        theConv.setSceneFormat(fmtScene, fmtScene == "")
+        theConv.setSectionFormat(fmtSection, fmtSection == "")
+        theConv.setBodyText(self.includeBody.isChecked())
+        theConv.setSynopsis(self.includeSynopsis.isChecked())
+        theConv.setComments(self.includeComments.isChecked())
+        theConv.setKeywords(self.includeKeywords.isChecked())
+        theConv.setJustify(self.justifyText.isChecked())
+        if isinstance(theConv, ToHtml):
+            theConv.setStyles(not self.noStyling.isChecked())
+        if isinstance(theConv, ToOdt):
+            theConv.setFont(self.textFont.text(), self.textSize.value())
+        theConv.setTokenCache(self.tokenCache)
+
+        return theConv
+
+    def _makeBuild(self):
+        """Create a project builder with the current build settings.
+        """
+        theBuild = NWBuild(self.theProject, self.theParent)
+        theBuild.setIncludes(
+            self.novelFiles.isChecked(),
+            self.noteFiles.isChecked(),
+            self.ignoreFlag.isChecked(),
+        )
+        theBuild.setReplaceTabs(self.replaceTabs.isChecked())
 
-        rootItem = self.theProject.projTree.getRootItem(theItem.itemHandle)
-        if rootItem.itemClass == nwItemClass.ARCHIVE:
-            return False
+        # Make sure the tree order is correct
+        self.theParent.treeView.flushTreeOrder()
 
-        return True
+        return theBuild
 
     def _saveDocument(self, theFormat):
         """Save the document to various formats.
         """
-        byteFmt = QByteArray()
         fileExt = ""
         textFmt = ""
         outTool = ""
 
         # Create the settings
         if theFormat == self.FMT_ODT:
-            byteFmt.append("odf")
             fileExt = "odt"
             textFmt = "Open Document"
-            outTool = "Qt"
+            outTool = "NW"
 
         elif theFormat == self.FMT_PDF:
             fileExt = "pdf"
             textFmt = "PDF"
             outTool = "QtPrint"
 
+        elif theFormat == self.FMT_EPUB:
+            fileExt = "epub"
+            textFmt = "EPUB"
+            outTool = "NW"
+
         elif theFormat == self.FMT_HTM:
             fileExt = "htm"
             textFmt = "Plain HTML"
             outTool = "NW"
 
         elif theFormat == self.FMT_MD:
-            byteFmt.append("markdown")
             fileExt = "md"
             textFmt = "Markdown"
-            outTool = "Qt"
+            outTool = "NW"
 
         elif theFormat == self.FMT_NWD:
             fileExt = "nwd"
@@ -739,10 +689,9 @@ class GuiBuildNovel(QDialog):
             outTool = "NW"
 
         elif theFormat == self.FMT_TXT:
-            byteFmt.append("plaintext")
             fileExt = "txt"
             textFmt = "Plain Text"
-            outTool = "Qt"
+            outTool = "NW"
 
         elif theFormat == self.FMT_JSON_H:
             fileExt = "json"
@@ -784,78 +733,11 @@ class GuiBuildNovel(QDialog):
         # Do the actual writing
         wSuccess = False
         errMsg = ""
-        if outTool == "Qt":
-            docWriter = QTextDocumentWriter()
-            docWriter.setFileName(savePath)
-            docWriter.setFormat(byteFmt)
-            wSuccess = docWriter.write(self.docView.qDocument)
-
-        elif outTool == "NW":
+        if outTool == "NW":
             try:
-                with open(savePath, mode="w", encoding="utf8") as outFile:
-                    if theFormat == self.FMT_HTM:
-                        # Write novelWriter HTML data
-                        theStyle = self.htmlStyle.copy()
-                        theStyle.append(r"article {width: 800px; margin: 40px auto;}")
-                        bodyText = "".join(self.htmlText)
-                        bodyText = bodyText.replace("\t", "&#09;")
-
-                        theHtml = (
-                            "<!DOCTYPE html>\n"
-                            "<html>\n"
-                            "<head>\n"
-                            "<meta charset='utf-8'>\n"
-                            "<title>{projTitle:s}</title>\n"
-                            "</head>\n"
-                            "<style>\n"
-                            "{htmlStyle:s}\n"
-                            "</style>\n"
-                            "<body>\n"
-                            "<article>\n"
-                            "{bodyText:s}\n"
-                            "</article>\n"
-                            "</body>\n"
-                            "</html>\n"
-                        ).format(
-                            projTitle = self.theProject.projName,
-                            htmlStyle = "\n".join(theStyle),
-                            bodyText = bodyText,
-                        )
-                        outFile.write(theHtml)
-
-                    elif theFormat == self.FMT_NWD:
-                        # Write novelWriter markdown data
-                        for aLine in self.nwdText:
-                            outFile.write(aLine)
-
-                    elif theFormat == self.FMT_JSON_H or theFormat == self.FMT_JSON_M:
-                        jsonData = {
-                            "meta" : {
-                                "workingTitle" : self.theProject.projName,
-                                "novelTitle"   : self.theProject.bookTitle,
-                                "authors"      : self.theProject.bookAuthors,
-                                "buildTime"    : self.buildTime,
-                            }
-                        }
-
-                        if theFormat == self.FMT_JSON_H:
-                            theBody = []
-                            for htmlPage in self.htmlText:
-                                theBody.append(htmlPage.rstrip("\n").split("\n"))
-                            jsonData["text"] = {
-                                "css"  : self.htmlStyle,
-                                "html" : theBody,
-                            }
-                        elif theFormat == self.FMT_JSON_M:
-                            theBody = []
-                            for nwdPage in self.nwdText:
-                                theBody.append(nwdPage.split("\n"))
-                            jsonData["text"] = {
-                                "nwd" : theBody,
-                            }
-
-                        outFile.write(json.dumps(jsonData, indent=2))
-
+                self._makeBuild().saveDocument(
+                    savePath, theFormat, self._makeConverter(theFormat)
+                )
                 wSuccess = True
 
             except Exception as e:
@@ -1011,11 +893,7 @@ class GuiBuildNovel(QDialog):
         """Set the enabled status of Save menu entries that depend on
         the QTextDocument.
         """
-        self.saveODT.setEnabled(theState)
         self.savePDF.setEnabled(theState)
-        self.saveTXT.setEnabled(theState)
-        if self.mainConf.verQtValue >= 51400:
-            self.saveMD.setEnabled(theState)
         return
 
     def _saveSettings(self):
@@ -1076,15 +954,6 @@ class GuiBuildNovel(QDialog):
 
         return
 
-    def _reFmtCodes(self, theFormat):
-        """Translates old formatting codes to new ones.
-        """
-        theFormat = theFormat.replace(r"%chnum%",     r"%ch%")
-        theFormat = theFormat.replace(r"%scnum%",     r"%sc%")
-        theFormat = theFormat.replace(r"%scabsnum%",  r"%sca%")
-        theFormat = theFormat.replace(r"%chnumword%", r"%chw%")
-        return theFormat
-
 # END Class GuiBuildNovel
 
 class GuiBuildNovelDocView(QTextBrowser):
@@ -7,12 +7,11 @@
 
  File History:
  Created:   2018-09-29 [0.0.1]  GuiDocEditor
- Created:   2019-04-22 [0.0.1]  BackgroundWordCounter
  Created:   2019-09-29 [0.2.1]  GuiDocEditSearch
  Created:   2020-04-25 [0.4.5]  GuiDocEditHeader
  Rewritten: 2020-06-15 [0.9.0]  GuiDocEditSearch
  Created:   2020-06-27 [0.10.0] GuiDocEditFooter
- Rewritten: 2020-10-07 [1.0b3]  BackgroundWordCounter
+ Created:   2020-10-18 [1.0b5]  BlockCountData
 
  This file is a part of novelWriter
  Copyright 2018–2020, Veronica Berglyd Olsen
@@ -37,12 +36,12 @@ import logging
 from time import time
 
 from PyQt5.QtCore import (
-    Qt, QSize, QTimer, pyqtSlot, pyqtSignal, QRegExp, QRegularExpression,
-    QPointF, QObject, QRunnable, QPropertyAnimation
+    Qt, QSize, QTimer, pyqtSlot, QRegExp, QRegularExpression, QPointF,
+    QPropertyAnimation
 )
 from PyQt5.QtGui import (
     QTextCursor, QTextOption, QKeySequence, QFont, QColor, QPalette,
-    QTextDocument, QCursor, QPixmap
+    QTextDocument, QCursor, QPixmap, QTextBlockUserData
 )
 from PyQt5.QtWidgets import (
     qApp, QTextEdit, QAction, QMenu, QShortcut, QMessageBox, QWidget, QLabel,
@@ -88,6 +87,11 @@ class GuiDocEditor(QTextEdit):
         self.charCount  = 0     # Character count
         self.wordCount  = 0     # Word count
         self.paraCount  = 0     # Paragraph count
+        self.docChars   = 0     # Running total of characters
+        self.docWords   = 0     # Running total of words
+        self.docParas   = 0     # Running total of paragraphs
+        self.docBlocks  = 0     # Block count at the last count update
+        self.sumCounts  = True  # Flag for totals to be summed from the blocks
         self.lastEdit   = 0     # Time stamp of last edit
         self.lastFind   = None  # Position of the last found search word
         self.bigDoc     = False # Flag for very large document size
@@ -148,10 +152,6 @@ class GuiDocEditor(QTextEdit):
         self.wcTimer.setInterval(int(self.wcInterval*1000))
         self.wcTimer.timeout.connect(self._runCounter)
 
-        self.wCounter = BackgroundWordCounter(self)
-        self.wCounter.setAutoDelete(False)
-        self.wCounter.signals.countsReady.connect(self._updateCounts)
-
         self.initEditor()
 
         logger.debug("GuiDocEditor initialisation complete")
@@ -171,6 +171,11 @@ class GuiDocEditor(QTextEdit):
         self.charCount = 0
         self.wordCount = 0
         self.paraCount = 0
+        self.docChars  = 0
+        self.docWords  = 0
+        self.docParas  = 0
+        self.docBlocks = 0
+        self.sumCounts = True
         self.lastEdit  = 0
         self.lastFind  = None
         self.bigDoc    = False
@@ -304,6 +309,7 @@ class GuiDocEditor(QTextEdit):
             self.hLight.spellCheck = False
 
         bfTime = time()
+        self.theDict.resetMemoStats()
         self._allowAutoReplace(False)
         self.setPlainText(theDoc)
         qApp.processEvents()
@@ -311,6 +317,7 @@ class GuiDocEditor(QTextEdit):
         self._allowAutoReplace(True)
         afTime = time()
         logger.debug("Document highlighted in %.3f ms" % (1000*(afTime-bfTime)))
+        logger.debug("Spell check memo hit rate was %.1f %%" % (100*self.theDict.memoHitRate()))
 
         self.lastEdit = time()
         self._runCounter()
@@ -387,8 +394,9 @@ class GuiDocEditor(QTextEdit):
 
         docText = self.getText()
 
-        cC, wC, pC = countWords(docText)
-        self._updateCounts(cC, wC, pC)
+        if self.sumCounts:
+            self._sumBlockCounts()
+        self._updateCounts(self.docChars, self.docWords, self.docParas)
 
         theItem.setCharCount(self.charCount)
         theItem.setWordCount(self.wordCount)
@@ -593,6 +601,7 @@ class GuiDocEditor(QTextEdit):
         logger.verbose("Running spell checker")
         if self.spellCheck:
             bfTime = time()
+            self.theDict.resetMemoStats()
             qApp.setOverrideCursor(QCursor(Qt.WaitCursor))
             if self.bigDoc:
                 theText = self.getText()
@@ -604,6 +613,9 @@ class GuiDocEditor(QTextEdit):
             logger.debug(
                 "Document highlighted in %.3f ms" % (1000*(afTime-bfTime))
             )
+            logger.debug(
+                "Spell check memo hit rate was %.1f %%" % (100*self.theDict.memoHitRate())
+            )
             self.theParent.statusBar.showMessage("Spell check complete")
 
         return True
@@ -864,8 +876,10 @@ class GuiDocEditor(QTextEdit):
                 "The document has grown too big and you cannot add more text to it. "
                 "The maximum size of a single novelWriter document is %.2f\u202fMB."
             ) % (nwConst.maxDocSize/1.0e6), nwAlert.ERROR)
+            self.sumCounts = True
             self.undo()
             return
+        self._countBlocks(thePos, charsAdded)
         if not self.docChanged:
             self.setDocumentChanged(True)
         if not self.wcTimer.isActive():
@@ -1001,22 +1015,21 @@ class GuiDocEditor(QTextEdit):
 
     @pyqtSlot()
     def _runCounter(self):
-        """Decide whether to run the word counter, or not due to
-        inactivity.
+        """Decide whether to update the word counts, or not due to
+        inactivity. The counts are kept up to date as the text changes,
+        and only have to be summed from the blocks after some edits.
         """
-        if self.wCounter.isRunning():
-            logger.verbose("Word counter is busy")
-            return
-
         if time() - self.lastEdit < 5*self.wcInterval:
             logger.verbose("Running word counter")
-            self.theParent.threadPool.start(self.wCounter)
+            if self.sumCounts:
+                self._sumBlockCounts()
+            self._updateCounts(self.docChars, self.docWords, self.docParas)
 
         return
 
-    @pyqtSlot(int, int, int)
     def _updateCounts(self, cCount, wCount, pCount):
-        """Slot for the word counter's finished signal
+        """Update the document counts, and the project item and the GUI
+        elements showing them.
         """
         theItem = self.nwDocument.getCurrentItem()
         if self.theHandle is None or theItem is None:
@@ -1241,6 +1254,72 @@ class GuiDocEditor(QTextEdit):
 
         return
 
+    def _countBlocks(self, thePos, charsAdded):
+        """Recount the blocks touched by a change of the document text.
+        An edit inside a single block adjusts the running totals by the
+        change in its counts. If blocks were added or removed, or the
+        block changed between text and other lines, the paragraphs can
+        change beyond the touched blocks, so the totals are summed from
+        the blocks again instead.
+        """
+        theBlock = self.qDocument.findBlock(thePos)
+        lastBlock = self.qDocument.findBlock(thePos + charsAdded)
+        if not lastBlock.isValid():
+            lastBlock = self.qDocument.lastBlock()
+
+        nBlocks = self.qDocument.blockCount()
+        if nBlocks != self.docBlocks or theBlock != lastBlock:
+            self.sumCounts = True
+        self.docBlocks = nBlocks
+
+        while theBlock.isValid():
+            oldData = theBlock.userData()
+            newData = BlockCountData(theBlock.text())
+            if oldData is None or oldData.lineType != newData.lineType:
+                self.sumCounts = True
+            elif not self.sumCounts:
+                self.docChars += newData.charCount - oldData.charCount
+                self.docWords += newData.wordCount - oldData.wordCount
+            theBlock.setUserData(newData)
+            if theBlock == lastBlock:
+                break
+            theBlock = theBlock.next()
+
+        return
+
+    def _sumBlockCounts(self):
+        """Sum the running totals from the counts cached in the blocks.
+        A paragraph starts at each text line that follows an empty line
+        or a heading, skipping comments and meta data.
+        """
+        cC = 0
+        wC = 0
+        pC = 0
+        prevBreak = True
+        theBlock = self.qDocument.firstBlock()
+        while theBlock.isValid():
+            theData = theBlock.userData()
+            if theData is None:
+                theData = BlockCountData(theBlock.text())
+                theBlock.setUserData(theData)
+            cC += theData.charCount
+            wC += theData.wordCount
+            if theData.lineType == BlockCountData.LINE_TEXT:
+                if prevBreak:
+                    pC += 1
+                prevBreak = False
+            elif theData.lineType == BlockCountData.LINE_BREAK:
+                prevBreak = True
+            theBlock = theBlock.next()
+
+        self.docChars  = cC
+        self.docWords  = wC
+        self.docParas  = pC
+        self.docBlocks = self.qDocument.blockCount()
+        self.sumCounts = False
+
+        return
+
     def _wrapSelection(self, tBefore, tAfter=None):
         """Wraps the selected text in whatever is in tBefore and tAfter.
         If there is no selection, the autoSelect setting decides the
@@ -1526,9 +1605,13 @@ class GuiDocEditor(QTextEdit):
         wasFound  = self.find(searchFor, findOpt)
         if not wasFound:
             if self.docSearch.doNextFile and not isBackward:
-                self.theParent.openNextDocument(
-                    self.theHandle, wrapAround=self.docSearch.doLoop
-                )
+                searchHits = self._searchProject()
+                if searchHits is None:
+                    self.theParent.openNextDocument(
+                        self.theHandle, wrapAround=self.docSearch.doLoop
+                    )
+                else:
+                    wasFound = self._findInNextDocument(searchFor, findOpt, searchHits)
             elif self.docSearch.doLoop:
                 theCursor = self.textCursor()
                 theCursor.movePosition(
@@ -1543,6 +1626,46 @@ class GuiDocEditor(QTextEdit):
 
         return
 
+    def _findInNextDocument(self, searchFor, findOpt, searchHits):
+        """Open the next document with a hit in the word index, and find
+        the search text from the line of the hit. The index matches the
+        lower case words, so for instance a case sensitive search may
+        not match in the document, in which case the next document with
+        a hit is tried instead.
+        """
+        checkedHandles = set()
+        while True:
+            prevHandle = self.theHandle
+            self.theParent.openNextDocument(
+                prevHandle, wrapAround=self.docSearch.doLoop, searchHits=searchHits
+            )
+            if self.theHandle == prevHandle or self.theHandle in checkedHandles:
+                return False
+            checkedHandles.add(self.theHandle)
+            if self.find(searchFor, findOpt):
+                return True
+
+    def _searchProject(self):
+        """Look up the search bar text in the project's word index, and
+        return the line of the first hit in each matching document.
+        Returns None if the index cannot be used for the search.
+        """
+        if self.docSearch.isRegEx:
+            return None
+
+        theHits = self.theParent.theIndex.searchProject(
+            self.docSearch.getSearchText(), wholeWord=self.docSearch.isWholeWord
+        )
+        if theHits is None:
+            return None
+
+        searchHits = {}
+        for tHandle, nLine in theHits:
+            if tHandle not in searchHits:
+                searchHits[tHandle] = nLine - 1
+
+        return searchHits
+
     def _replaceNext(self):
         """Searches for the next occurrence of the search bar text in
         the document and replaces it with the replace text. Calls search
@@ -1633,41 +1756,32 @@ class GuiDocEditor(QTextEdit):
 # END Class GuiDocEditor
 
 # =============================================================================================== #
-#  The Off-GUI Thread Word Counter
-#  A runnable for the word counter to be run in the thread pool off the main GUI thread.
+#  The Block Word Counts
+#  The counts of each text block, cached in the block's user data by the document editor.
 # =============================================================================================== #
 
-class BackgroundWordCounter(QRunnable):
+class BlockCountData(QTextBlockUserData):
 
-    def __init__(self, docEditor):
-        QRunnable.__init__(self)
-        self.docEditor = docEditor
-        self.signals = BackgroundWordCounterSignals()
-        self._isRunning = False
-        return
-
-    def isRunning(self):
-        return self._isRunning
-
-    @pyqtSlot()
-    def run(self):
-        """Overloaded run function for the word counter, forwarding the
-        call to the function that does the actual counting.
-        """
-        self._isRunning = True
-        theText = self.docEditor.getText()
-        cC, wC, pC = countWords(theText)
-        self.signals.countsReady.emit(cC, wC, pC)
-        self._isRunning = False
-        return
+    LINE_BREAK = 0 # Empty lines and headings, which end a paragraph
+    LINE_TEXT  = 1 # Text lines, which are part of a paragraph
+    LINE_SKIP  = 2 # Comments and meta data, which are not counted
 
-## END Class BackgroundWordCounter
+    def __init__(self, theText):
+        QTextBlockUserData.__init__(self)
 
-class BackgroundWordCounterSignals(QObject):
+        # A single text line is always counted as a paragraph, so the
+        # paragraph count tells a text line from a heading
+        self.charCount, self.wordCount, paraCount = countWords(theText)
+        if theText[:1] in ("@", "%"):
+            self.lineType = self.LINE_SKIP
+        elif paraCount > 0:
+            self.lineType = self.LINE_TEXT
+        else:
+            self.lineType = self.LINE_BREAK
 
-    countsReady = pyqtSignal(int, int, int)
+        return
 
-# END Class BackgroundWordCounterSignals
+# END Class BlockCountData
 
 # =============================================================================================== #
 #  The Embedded Document Search/Replace Feature
@@ -29,6 +29,7 @@ import nw
 import logging
 
 from time import time
+from itertools import groupby
 
 from PyQt5.QtCore import Qt, QRegularExpression
 from PyQt5.QtGui import (
@@ -61,6 +62,8 @@ class GuiDocHighlighter(QSyntaxHighlighter):
         self.spellRx    = None
         self.hRules     = []
         self.hStyles    = {}
+        self.fmtCache   = {}
+        self.hidCache   = {}
 
         self.colHead   = QColor(0, 0, 0)
         self.colHeadH  = QColor(0, 0, 0)
@@ -129,21 +132,28 @@ class GuiDocHighlighter(QSyntaxHighlighter):
             "keyword"    : self._makeFormat(self.colKey),
             "modifier"   : self._makeFormat(self.colMod),
             "value"      : self._makeFormat(self.colVal, "underline"),
+            "spell"      : self._makeFormat(),
         }
+        self.hStyles["spell"].setUnderlineColor(self.colSpell)
+        self.hStyles["spell"].setUnderlineStyle(QTextCharFormat.SpellCheckUnderline)
+
+        # The merged formats are built from the styles above
+        self.fmtCache = {}
+        self.hidCache = {}
 
         self.hRules = []
 
         # Trailing Spaces, 2+
         self.hRules.append((
             r"[ ]{2,}$", {
-                0 : self.hStyles["trailing"],
+                0 : "trailing",
             }
         ))
 
         # Non-Breaking Spaces
         self.hRules.append((
             "[%s%s]+" % (nwUnicode.U_NBSP, nwUnicode.U_THNBSP), {
-                0 : self.hStyles["nobreak"],
+                0 : "nobreak",
             }
         ))
 
@@ -155,47 +165,47 @@ class GuiDocHighlighter(QSyntaxHighlighter):
             fmtSC = self.mainConf.fmtSingleQuotes[1]
             self.hRules.append((
                 "\\B\"(.*?)\"\\B", {
-                    0 : self.hStyles["dialogue1"],
+                    0 : "dialogue1",
                 }
             ))
             self.hRules.append((
                 f"\\B{fmtDO:s}(.*?){fmtDC:s}\\B", {
-                    0 : self.hStyles["dialogue2"],
+                    0 : "dialogue2",
                 }
             ))
             self.hRules.append((
                 f"\\B{fmtSO:s}(.*?){fmtSC:s}\\B", {
-                    0 : self.hStyles["dialogue3"],
+                    0 : "dialogue3",
                 }
             ))
 
         # Markdown
         self.hRules.append((
             nwRegEx.FMT_EI, {
-                1 : self.hStyles["hidden"],
-                2 : self.hStyles["italic"],
-                3 : self.hStyles["hidden"],
+                1 : "hidden",
+                2 : "italic",
+                3 : "hidden",
             }
         ))
         self.hRules.append((
             nwRegEx.FMT_EB, {
-                1 : self.hStyles["hidden"],
-                2 : self.hStyles["bold"],
-                3 : self.hStyles["hidden"],
+                1 : "hidden",
+                2 : "bold",
+                3 : "hidden",
             }
         ))
         self.hRules.append((
             nwRegEx.FMT_ST, {
-                1 : self.hStyles["hidden"],
-                2 : self.hStyles["strike"],
-                3 : self.hStyles["hidden"],
+                1 : "hidden",
+                2 : "strike",
+                3 : "hidden",
             }
         ))
 
         # Auto-Replace Tags
         self.hRules.append((
             r"<(\S+?)>", {
-                0 : self.hStyles["replace"],
+                0 : "replace",
             }
         ))
 
@@ -299,25 +309,26 @@ class GuiDocHighlighter(QSyntaxHighlighter):
             # so we force a return here
             return
 
-        elif theText.startswith("# "): # Header 1
+        # The formats are collected for each character as the names of
+        # the styles to merge, and applied in runs of equal formats
+        bLen = self.currentBlock().length() - 1
+        fmtKeys = [()]*bLen
+
+        if theText.startswith("# "): # Header 1
             self.setCurrentBlockState(self.BLOCK_TITLE)
-            self.setFormat(0, 1, self.hStyles["header1h"])
-            self.setFormat(1, len(theText), self.hStyles["header1"])
+            fmtKeys = [("header1h",)]*1 + [("header1",)]*(bLen - 1)
 
         elif theText.startswith("## "): # Header 2
             self.setCurrentBlockState(self.BLOCK_TITLE)
-            self.setFormat(0, 2, self.hStyles["header2h"])
-            self.setFormat(2, len(theText), self.hStyles["header2"])
+            fmtKeys = [("header2h",)]*2 + [("header2",)]*(bLen - 2)
 
         elif theText.startswith("### "): # Header 3
             self.setCurrentBlockState(self.BLOCK_TITLE)
-            self.setFormat(0, 3, self.hStyles["header3h"])
-            self.setFormat(3, len(theText), self.hStyles["header3"])
+            fmtKeys = [("header3h",)]*3 + [("header3",)]*(bLen - 3)
 
         elif theText.startswith("#### "): # Header 4
             self.setCurrentBlockState(self.BLOCK_TITLE)
-            self.setFormat(0, 4, self.hStyles["header4h"])
-            self.setFormat(4, len(theText), self.hStyles["header4"])
+            fmtKeys = [("header4h",)]*4 + [("header4",)]*(bLen - 4)
 
         elif theText.startswith("%"): # Comments
             self.setCurrentBlockState(self.BLOCK_TEXT)
@@ -327,10 +338,10 @@ class GuiDocHighlighter(QSyntaxHighlighter):
             cLen = len(toCheck)
             cOff = tLen - cLen
             if synTag == "synopsis:":
-                self.setFormat(0, cOff+9, self.hStyles["modifier"])
-                self.setFormat(cOff+9, tLen, self.hStyles["hidden"])
+                sLen = min(cOff+9, bLen)
+                fmtKeys = [("modifier",)]*sLen + [("hidden",)]*(bLen - sLen)
             else:
-                self.setFormat(0, tLen, self.hStyles["hidden"])
+                fmtKeys = [("hidden",)]*bLen
 
         else: # Text Paragraph
             self.setCurrentBlockState(self.BLOCK_TEXT)
@@ -338,31 +349,33 @@ class GuiDocHighlighter(QSyntaxHighlighter):
                 rxItt = rX.globalMatch(theText, 0)
                 while rxItt.hasNext():
                     rxMatch = rxItt.next()
-                    for xM in xFmt:
+                    for xM, fmtName in xFmt.items():
                         xPos = rxMatch.capturedStart(xM)
-                        xLen = rxMatch.capturedLength(xM)
-                        for x in range(xPos, xPos+xLen):
-                            spFmt = self.format(x)
-                            if spFmt != self.hStyles["hidden"]:
-                                spFmt.merge(xFmt[xM])
-                                self.setFormat(x, 1, spFmt)
-
-        if self.theDict is None or not self.spellCheck:
-            return
-
-        rxSpell = self.spellRx.globalMatch(theText, 0)
-        while rxSpell.hasNext():
-            rxMatch = rxSpell.next()
-            if not self.theDict.checkWord(rxMatch.captured(0)):
-                if rxMatch.captured(0).isupper() or rxMatch.captured(0).isnumeric():
-                    continue
-                xPos = rxMatch.capturedStart(0)
-                xLen = rxMatch.capturedLength(0)
-                for x in range(xPos, xPos+xLen):
-                    spFmt = self.format(x)
-                    spFmt.setUnderlineColor(self.colSpell)
-                    spFmt.setUnderlineStyle(QTextCharFormat.SpellCheckUnderline)
-                    self.setFormat(x, 1, spFmt)
+                        xEnd = xPos + rxMatch.capturedLength(xM)
+                        if xPos < 0 or xEnd <= xPos:
+                            continue
+                        fmtKeys[xPos:xEnd] = [
+                            k if self._isHidden(k) else k + (fmtName,)
+                            for k in fmtKeys[xPos:xEnd]
+                        ]
+
+        if self.theDict is not None and self.spellCheck:
+            rxSpell = self.spellRx.globalMatch(theText, 0)
+            while rxSpell.hasNext():
+                rxMatch = rxSpell.next()
+                if not self.theDict.checkWord(rxMatch.captured(0)):
+                    if rxMatch.captured(0).isupper() or rxMatch.captured(0).isnumeric():
+                        continue
+                    xPos = rxMatch.capturedStart(0)
+                    xEnd = xPos + rxMatch.capturedLength(0)
+                    fmtKeys[xPos:xEnd] = [k + ("spell",) for k in fmtKeys[xPos:xEnd]]
+
+        xPos = 0
+        for fmtKey, fmtRun in groupby(fmtKeys):
+            xLen = len(list(fmtRun))
+            if fmtKey:
+                self.setFormat(xPos, xLen, self._mergedFormat(fmtKey))
+            xPos += xLen
 
         return
 
@@ -370,6 +383,26 @@ class GuiDocHighlighter(QSyntaxHighlighter):
     #  Internal Functions
     ##
 
+    def _mergedFormat(self, fmtKey):
+        """Return the character format made by merging the named styles
+        in order. The formats are cached, as there are only a few
+        combinations in use.
+        """
+        if fmtKey not in self.fmtCache:
+            theFormat = QTextCharFormat()
+            for fmtName in fmtKey:
+                theFormat.merge(self.hStyles[fmtName])
+            self.fmtCache[fmtKey] = theFormat
+        return self.fmtCache[fmtKey]
+
+    def _isHidden(self, fmtKey):
+        """Check if the merged format is the one used for hidden text,
+        which is not formatted further.
+        """
+        if fmtKey not in self.hidCache:
+            self.hidCache[fmtKey] = self._mergedFormat(fmtKey) == self.hStyles["hidden"]
+        return self.hidCache[fmtKey]
+
     def _makeFormat(self, fmtCol=None, fmtStyle=None, fmtSize=None):
         """Generate a valid character format to be applied to the text
         that is to be highlighted.
@@ -802,6 +802,21 @@ class GuiMainMenu(QMenuBar):
         self.aRebuildIndex.triggered.connect(lambda: self.theParent.rebuildIndex())
         self.toolsMenu.addAction(self.aRebuildIndex)
 
+        # Tools > Update Index
+        self.aUpdateIndex = QAction("Update Index", self)
+        self.aUpdateIndex.setStatusTip("Re-index only the documents that have changed")
+        self.aUpdateIndex.setShortcut("Shift+F9")
+        self.aUpdateIndex.triggered.connect(
+            lambda: self.theParent.rebuildIndex(fullRebuild=False)
+        )
+        self.toolsMenu.addAction(self.aUpdateIndex)
+
+        # Tools > Cancel Indexing
+        self.aCancelIndex = QAction("Cancel Indexing", self)
+        self.aCancelIndex.setStatusTip("Stop the index rebuild running in the background")
+        self.aCancelIndex.triggered.connect(lambda: self.theParent.cancelIndexing())
+        self.toolsMenu.addAction(self.aCancelIndex)
+
         # Tools > Rebuild Outline
         self.aRebuildOutline = QAction("Rebuild Outline", self)
         self.aRebuildOutline.setStatusTip("Rebuild the novel outline tree")
@@ -377,22 +377,15 @@ class GuiOutline(QTreeWidget):
         currChapter = None
         currScene   = None
 
-        for titleKey in self.theIndex.getNovelStructure(skipExcluded=True):
+        for tHandle, sTitle in self.theIndex.getNovelStructure(skipExcluded=True):
 
-            if len(titleKey) < 16:
+            theHead = self.theIndex.getHeading(tHandle, sTitle)
+            if theHead is None:
                 continue
 
-            tHandle = titleKey[:13]
-            sTitle  = titleKey[14:]
-
-            if tHandle not in self.theIndex.novelIndex:
-                continue
-            if sTitle not in self.theIndex.novelIndex[tHandle]:
-                continue
-
-            tLevel = self.theIndex.novelIndex[tHandle][sTitle]["level"]
-            tItem  = self._createTreeItem(tHandle, sTitle, tLevel)
-            self.treeMap[titleKey] = tItem
+            tLevel = theHead.level
+            tItem  = self._createTreeItem(tHandle, sTitle, theHead)
+            self.treeMap[(tHandle, sTitle)] = tItem
 
             if tLevel == "H1":
                 currTitle = tItem
@@ -430,28 +423,27 @@ class GuiOutline(QTreeWidget):
 
         return
 
-    def _createTreeItem(self, tHandle, sTitle, tLevel):
+    def _createTreeItem(self, tHandle, sTitle, novIdx):
         """Populate a tree item with all the column values.
         """
         nwItem = self.theProject.projTree[tHandle]
-        novIdx = self.theIndex.novelIndex[tHandle][sTitle]
 
         newItem = QTreeWidgetItem()
-        hIcon   = "doc_%s" % tLevel.lower()
+        hIcon   = "doc_%s" % novIdx.level.lower()
 
-        cC = int(novIdx["cCount"])
-        wC = int(novIdx["wCount"])
-        pC = int(novIdx["pCount"])
+        cC = int(novIdx.cCount)
+        wC = int(novIdx.wCount)
+        pC = int(novIdx.pCount)
 
-        newItem.setText(self.colIndex[nwOutline.TITLE],  novIdx["title"])
+        newItem.setText(self.colIndex[nwOutline.TITLE],  novIdx.title)
         newItem.setData(self.colIndex[nwOutline.TITLE],  Qt.UserRole, tHandle)
         newItem.setIcon(self.colIndex[nwOutline.TITLE],  self.theTheme.getIcon(hIcon))
-        newItem.setText(self.colIndex[nwOutline.LEVEL],  novIdx["level"])
+        newItem.setText(self.colIndex[nwOutline.LEVEL],  novIdx.level)
         newItem.setText(self.colIndex[nwOutline.LABEL],  nwItem.itemName)
         newItem.setIcon(self.colIndex[nwOutline.LABEL],  self.theTheme.getIcon("proj_document"))
         newItem.setText(self.colIndex[nwOutline.LINE],   sTitle[1:].lstrip("0"))
         newItem.setData(self.colIndex[nwOutline.LINE],   Qt.UserRole, sTitle)
-        newItem.setText(self.colIndex[nwOutline.SYNOP],  novIdx["synopsis"])
+        newItem.setText(self.colIndex[nwOutline.SYNOP],  novIdx.synopsis)
         newItem.setText(self.colIndex[nwOutline.CCOUNT], f"{cC:n}")
         newItem.setText(self.colIndex[nwOutline.WCOUNT], f"{wC:n}")
         newItem.setText(self.colIndex[nwOutline.PCOUNT], f"{pC:n}")
@@ -252,29 +252,32 @@ class GuiOutlineDetails(QScrollArea):
         """
         try:
             nwItem  = self.theProject.projTree[tHandle]
-            novIdx  = self.theIndex.novelIndex[tHandle][sTitle]
+            novIdx  = self.theIndex.getHeading(tHandle, sTitle)
             theRefs = self.theIndex.getReferences(tHandle, sTitle)
         except Exception:
             return False
 
-        if novIdx["level"] in self.LVL_MAP:
-            self.titleLabel.setText("<b>%s</b>" % self.LVL_MAP[novIdx["level"]])
+        if novIdx is None:
+            return False
+
+        if novIdx.level in self.LVL_MAP:
+            self.titleLabel.setText("<b>%s</b>" % self.LVL_MAP[novIdx.level])
         else:
             self.titleLabel.setText("<b>Title</b>")
-        self.titleValue.setText(novIdx["title"])
+        self.titleValue.setText(novIdx.title)
 
         self.fileValue.setText(nwItem.itemName)
         self.itemValue.setText(nwItem.itemStatus)
 
-        cC = checkInt(novIdx["cCount"], 0)
-        wC = checkInt(novIdx["wCount"], 0)
-        pC = checkInt(novIdx["pCount"], 0)
+        cC = checkInt(novIdx.cCount, 0)
+        wC = checkInt(novIdx.wCount, 0)
+        pC = checkInt(novIdx.pCount, 0)
 
         self.cCValue.setText(f"{cC:n}")
         self.wCValue.setText(f"{wC:n}")
         self.pCValue.setText(f"{pC:n}")
 
-        self.synopValue.setText(novIdx["synopsis"])
+        self.synopValue.setText(novIdx.synopsis)
 
         self.povKeyValue.setText(self._formatTags(theRefs, nwKeyWords.POV_KEY))
         self.chrKeyValue.setText(self._formatTags(theRefs, nwKeyWords.CHAR_KEY))
@@ -703,7 +703,7 @@ class GuiConfigEditEditingTab(QWidget):
         ## Spell Check Provider and Language
         self.spellLangList = QComboBox(self)
         self.spellToolList = QComboBox(self)
-        self.spellToolList.addItem("Internal (difflib)",        NWSpellCheck.SP_INTERNAL)
+        self.spellToolList.addItem("Internal (word list)",      NWSpellCheck.SP_INTERNAL)
         self.spellToolList.addItem("Spell Enchant (pyenchant)", NWSpellCheck.SP_ENCHANT)
 
         theModel  = self.spellToolList.model()
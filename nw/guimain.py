@@ -29,11 +29,14 @@ import nw
 import logging
 import os
 
+from copy import copy
 from datetime import datetime
 from time import time
 
-from PyQt5.QtCore import Qt, QTimer, QThreadPool
-from PyQt5.QtGui import QIcon, QPixmap, QColor, QKeySequence, QCursor
+from PyQt5.QtCore import (
+    Qt, QTimer, QThreadPool, QRunnable, QObject, pyqtSignal, pyqtSlot
+)
+from PyQt5.QtGui import QIcon, QPixmap, QColor, QKeySequence
 from PyQt5.QtWidgets import (
     qApp, QMainWindow, QVBoxLayout, QWidget, QSplitter, QFileDialog, QShortcut,
     QMessageBox, QDialog, QTabWidget
@@ -46,7 +49,7 @@ from nw.gui import (
     GuiProjectLoad, GuiProjectSettings, GuiProjectTree, GuiProjectWizard,
     GuiTheme, GuiWritingStats
 )
-from nw.core import NWProject, NWDoc, NWIndex
+from nw.core import NWProject, NWIndex
 from nw.constants import nwItemType, nwItemClass, nwAlert
 from nw.common import getGuiItem
 
@@ -86,6 +89,9 @@ class GuiMain(QMainWindow):
         self.theProject  = NWProject(self)
         self.theIndex    = NWIndex(self.theProject, self)
         self.hasProject  = False
+        self.idxRunner   = None
+        self.idxQuiet    = False
+        self.idxStart    = 0.0
         self.isFocusMode = False
 
         # Prepare main window
@@ -342,6 +348,12 @@ class GuiMain(QMainWindow):
             saveOK = True
 
         if saveOK:
+            if self.idxRunner is not None:
+                self.idxRunner.cancel()
+                self.threadPool.waitForDone()
+                self.idxRunner = None
+                self.theIndex.trackChanges(False)
+
             self.closeDocument()
             self.docViewer.clearNavHistory()
             self.projView.closeOutline()
@@ -488,9 +500,11 @@ class GuiMain(QMainWindow):
 
         return True
 
-    def openNextDocument(self, tHandle, wrapAround=False):
+    def openNextDocument(self, tHandle, wrapAround=False, searchHits=None):
         """Opens the next document in the project tree, following the
         document with the given handle. Stops when reaching the end.
+        If searchHits is a dictionary of handles and line numbers, only
+        those documents are considered, and opened at that line.
         """
         if self.hasProject:
             self.treeView.flushTreeOrder()
@@ -502,19 +516,24 @@ class GuiMain(QMainWindow):
                     continue
                 if tItem.itemType != nwItemType.FILE:
                     continue
-                if fHandle is None:
-                    fHandle = tItem.itemHandle
                 if tItem.itemHandle == tHandle:
                     foundIt = True
-                elif foundIt:
+                if searchHits is not None and tItem.itemHandle not in searchHits:
+                    continue
+                if fHandle is None:
+                    fHandle = tItem.itemHandle
+                if foundIt and tItem.itemHandle != tHandle:
                     nHandle = tItem.itemHandle
                     break
 
+            if searchHits is None:
+                searchHits = {}
+
             if nHandle is not None:
-                self.openDocument(nHandle, tLine=0, doScroll=True)
+                self.openDocument(nHandle, tLine=searchHits.get(nHandle, 0), doScroll=True)
                 return True
-            elif wrapAround:
-                self.openDocument(fHandle, tLine=0, doScroll=True)
+            elif wrapAround and fHandle is not None:
+                self.openDocument(fHandle, tLine=searchHits.get(fHandle, 0), doScroll=True)
                 return False
 
         return False
@@ -698,49 +717,51 @@ class GuiMain(QMainWindow):
         self.treeView.buildTree()
         return
 
-    def rebuildIndex(self, beQuiet=False):
-        """Rebuild the entire index.
+    def rebuildIndex(self, beQuiet=False, fullRebuild=True):
+        """Rebuild the entire index in the background. If fullRebuild
+        is False, only the documents that have changed since they were
+        last indexed are scanned again. The current index is replaced
+        by the new one when the indexer has finished.
         """
         if not self.hasProject:
             return False
 
-        logger.debug("Rebuilding index ...")
-        qApp.setOverrideCursor(QCursor(Qt.WaitCursor))
-        tStart = time()
+        if self.idxRunner is not None:
+            logger.info("The index is already being rebuilt")
+            return False
 
+        logger.debug("Rebuilding index ...")
         self.treeView.saveTreeOrder()
-        self.theIndex.clearIndex()
-
-        theDoc = NWDoc(self.theProject, self)
-        for nDone, tItem in enumerate(self.theProject.projTree):
-
-            if tItem is not None:
-                self.setStatus("Indexing: '%s'" % tItem.itemName)
-            else:
-                self.setStatus("Indexing: Unknown item")
 
+        theHandles = []
+        for tItem in self.theProject.projTree:
             if tItem is not None and tItem.itemType == nwItemType.FILE:
-                logger.verbose("Scanning: %s" % tItem.itemName)
-                theText = theDoc.openDocument(tItem.itemHandle, showStatus=False)
+                theHandles.append(tItem.itemHandle)
 
-                # Build tag index
-                self.theIndex.scanText(tItem.itemHandle, theText)
+        self.idxRunner = BackgroundIndexer(self, theHandles, fullRebuild)
+        self.idxRunner.setAutoDelete(False)
+        self.idxRunner.signals.indexProgress.connect(self._indexProgress)
+        self.idxRunner.signals.indexAlert.connect(self.makeAlert)
+        self.idxRunner.signals.indexFinished.connect(self._indexFinished)
 
-                # Get Word Counts
-                cC, wC, pC = self.theIndex.getCounts(tItem.itemHandle)
-                tItem.setCharCount(cC)
-                tItem.setWordCount(wC)
-                tItem.setParaCount(pC)
-                self.treeView.propagateCount(tItem.itemHandle, wC)
-                self.treeView.projectWordCount()
+        # Changes made to the current index while the indexer runs are
+        # recorded, so they can be carried over to the new index
+        self.theIndex.trackChanges(True)
+        self.idxQuiet = beQuiet
+        self.idxStart = time()
+        self.threadPool.start(self.idxRunner)
 
-        tEnd = time()
-        self.setStatus("Indexing completed in %.1f ms" % ((tEnd - tStart)*1000.0))
-        self.docEditor.updateTagHighLighting()
-        qApp.restoreOverrideCursor()
+        return True
 
-        if not beQuiet:
-            self.makeAlert("The project index has been successfully rebuilt.", nwAlert.INFO)
+    def cancelIndexing(self):
+        """Ask the background indexer to stop. The current index is left
+        as it is.
+        """
+        if self.idxRunner is None:
+            return False
+
+        logger.debug("Cancelling index rebuild")
+        self.idxRunner.cancel()
 
         return True
 
@@ -1290,4 +1311,155 @@ class GuiMain(QMainWindow):
                 self.projView.refreshTree()
         return
 
+    def _indexProgress(self, nDone, nTotal, tHandle):
+        """Update the status bar while the background indexer runs.
+        """
+        tItem = self.theProject.projTree[tHandle]
+        if tItem is not None:
+            self.setStatus("Indexing %d of %d: '%s'" % (nDone, nTotal, tItem.itemName))
+        return
+
+    def _indexFinished(self, isDone):
+        """The background indexer has finished or was cancelled. If it
+        finished, the new index replaces the current one.
+        """
+        theRunner = self.idxRunner
+        if theRunner is None or self.sender() is not theRunner.signals:
+            # A leftover signal from an indexer that was discarded
+            return
+
+        self.idxRunner = None
+        theChanged = self.theIndex.trackChanges(False)
+        if not isDone:
+            self.setStatus("Indexing cancelled")
+            return
+
+        self.theIndex.replaceIndex(theRunner.newIndex)
+
+        # Documents saved or moved while the indexer was running were
+        # updated in the old index, so they are scanned again
+        for tHandle in theChanged:
+            self.theIndex.deleteHandle(tHandle)
+            self.theIndex.reIndexHandle(tHandle)
+
+        for tHandle in theRunner.scanHandles + list(theChanged):
+            tItem = self.theProject.projTree[tHandle]
+            if tItem is None:
+                continue
+            cC, wC, pC = self.theIndex.getCounts(tHandle)
+            tItem.setCharCount(cC)
+            tItem.setWordCount(wC)
+            tItem.setParaCount(pC)
+            self.treeView.propagateCount(tHandle, wC)
+        self.treeView.projectWordCount()
+
+        if theRunner.nSkip > 0:
+            logger.debug("Skipped %d unchanged documents" % theRunner.nSkip)
+        tEnd = time()
+        self.setStatus("Indexing completed in %.1f ms" % ((tEnd - self.idxStart)*1000.0))
+        self.docEditor.updateTagHighLighting()
+
+        if not self.idxQuiet:
+            self.makeAlert("The project index has been successfully rebuilt.", nwAlert.INFO)
+
+        return
+
 # END Class GuiMain
+
+# =============================================================================================== #
+#  The Off-GUI Thread Indexer
+#  A runnable that builds a new project index in the thread pool off the main GUI thread.
+# =============================================================================================== #
+
+class BackgroundIndexer(QRunnable):
+
+    def __init__(self, theParent, theHandles, fullRebuild):
+        QRunnable.__init__(self)
+
+        self.mainConf    = nw.CONFIG
+        self.theProject  = copy(theParent.theProject)
+        self.theHandles  = theHandles
+        self.fullRebuild = fullRebuild
+        self.signals     = BackgroundIndexerSignals()
+
+        # The project tree is changed by the GUI while the indexer runs,
+        # so the indexer only reads a copy of it made here
+        self.theProject.projTree = theParent.theProject.projTree.copyTree()
+
+        # The new index reports errors through the indexer, as it must
+        # not open dialogs from the worker thread
+        self.newIndex = NWIndex(self.theProject, self)
+        if not fullRebuild:
+            self.newIndex.replaceIndex(theParent.theIndex, makeCopy=True)
+
+        self.scanHandles = []
+        self.nSkip       = 0
+        self._isRunning  = False
+        self._doCancel   = False
+
+        return
+
+    def isRunning(self):
+        return self._isRunning
+
+    def cancel(self):
+        """Request the indexer to stop after the current document.
+        """
+        self._doCancel = True
+        return
+
+    def makeAlert(self, theMessage, theLevel=nwAlert.INFO):
+        """Forward alerts to the main GUI thread.
+        """
+        self.signals.indexAlert.emit(theMessage, theLevel)
+        return
+
+    @pyqtSlot()
+    def run(self):
+        """Overloaded run function for the indexer. The new index is
+        built from the list of handles, and the signals report the
+        progress and whether the indexer ran to completion.
+        """
+        self._isRunning = True
+
+        if not self.fullRebuild:
+            # Drop entries for items that are no longer in the project
+            for tHandle in list(self.newIndex.textCounts.keys()):
+                if tHandle not in self.theProject.projTree:
+                    self.newIndex.deleteHandle(tHandle)
+
+        scanHandles = []
+        for tHandle in self.theHandles:
+            if self._doCancel:
+                break
+            if not self.fullRebuild:
+                if self.newIndex.checkDocStamp(tHandle):
+                    self.nSkip += 1
+                    continue
+                self.newIndex.deleteHandle(tHandle)
+            scanHandles.append(tHandle)
+
+        nTotal = len(scanHandles)
+        nWorkers = self.mainConf.indexWorkers
+        theScanner = self.newIndex.scanDocuments(scanHandles, nWorkers)
+        for tHandle in theScanner:
+            if self._doCancel:
+                theScanner.close()
+                break
+            self.scanHandles.append(tHandle)
+            self.signals.indexProgress.emit(len(self.scanHandles), nTotal, tHandle)
+
+        self.signals.indexFinished.emit(not self._doCancel)
+        self._isRunning = False
+
+        return
+
+# END Class BackgroundIndexer
+
+class BackgroundIndexerSignals(QObject):
+
+    indexProgress = pyqtSignal(int, int, str)
+    indexAlert    = pyqtSignal(object, object)
+    indexFinished = pyqtSignal(bool)
+
+# END Class BackgroundIndexerSignals
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""novelWriter Headless Build
+
+ novelWriter – Headless Build
+==============================
+ Builds a project from the command line without creating the GUI
+
+ File History:
+ Created: 2026-10-18 [1.0b5]
+
+ This file is a part of novelWriter
+ Copyright 2018–2020, Veronica Berglyd Olsen
+
+ This program is free software: you can redistribute it and/or modify
+ it under the terms of the GNU General Public License as published by
+ the Free Software Foundation, either version 3 of the License, or
+ (at your option) any later version.
+
+ This program is distributed in the hope that it will be useful, but
+ WITHOUT ANY WARRANTY; without even the implied warranty of
+ MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+ General Public License for more details.
+
+ You should have received a copy of the GNU General Public License
+ along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import nw
+import logging
+
+from nw.core import NWBuild, NWIndex, NWProject
+from nw.constants import nwAlert, nwItemType
+
+logger = logging.getLogger(__name__)
+
+BUILD_FORMATS = {
+    "odt"       : NWBuild.FMT_ODT,
+    "epub"      : NWBuild.FMT_EPUB,
+    "html"      : NWBuild.FMT_HTM,
+    "nwd"       : NWBuild.FMT_NWD,
+    "md"        : NWBuild.FMT_MD,
+    "txt"       : NWBuild.FMT_TXT,
+    "json-html" : NWBuild.FMT_JSON_H,
+    "json-nwd"  : NWBuild.FMT_JSON_M,
+}
+
+class HeadlessMain():
+
+    def __init__(self):
+
+        logger.debug("Initialising HeadlessMain ...")
+
+        self.mainConf   = nw.CONFIG
+        self.theProject = NWProject(self)
+        self.theIndex   = NWIndex(self.theProject, self)
+
+        logger.debug("HeadlessMain initialisation complete")
+
+        return
+
+    def buildProject(self, projPath, buildFormat, outPath):
+        """Open a project, and build it to a file with the settings last
+        used in the build dialog. The project files are not changed.
+        Returns the exit code for the command line.
+        """
+        if buildFormat not in BUILD_FORMATS:
+            logger.error("Unknown build format '%s'" % buildFormat)
+            return 2
+
+        if not self.theProject.openProject(projPath):
+            logger.error("Failed to open project '%s'" % projPath)
+            return 1
+
+        # The index is used for the e-book navigation, so documents that
+        # have changed since it was saved are indexed again in memory
+        self.theIndex.loadIndex()
+        for tItem in self.theProject.projTree:
+            if tItem is None:
+                continue
+            if tItem.itemType != nwItemType.FILE:
+                continue
+            if not self.theIndex.checkDocStamp(tItem.itemHandle):
+                self.theIndex.reIndexHandle(tItem.itemHandle)
+
+        logger.info("Building project '%s' to: %s" % (self.theProject.projName, outPath))
+        theBuild = NWBuild(self.theProject, self)
+        theFormat = BUILD_FORMATS[buildFormat]
+        theConv = theBuild.makeConverter(theFormat)
+        try:
+            theBuild.saveDocument(outPath, theFormat, theConv)
+        except Exception as e:
+            logger.error("Failed to build project")
+            logger.error(str(e))
+            return 1
+        finally:
+            self.theProject.closeProject(readOnly=True)
+
+        for errMsg in theConv.errData:
+            logger.warning(errMsg)
+
+        return 0
+
+    ##
+    #  Main GUI Stand-Ins
+    ##
+
+    def makeAlert(self, theMessage, theLevel=nwAlert.INFO):
+        """Write alerts to the logger. Message can be either a string or
+        an array of strings.
+        """
+        if isinstance(theMessage, list):
+            logMsg = theMessage
+        else:
+            logMsg = [theMessage]
+
+        for msgLine in logMsg:
+            if theLevel == nwAlert.INFO:
+                logger.info(msgLine)
+            elif theLevel == nwAlert.WARN:
+                logger.warning(msgLine)
+            else:
+                logger.error(msgLine)
+
+        return
+
+    def setStatus(self, theMessage):
+        """Write status messages to the debug log.
+        """
+        logger.debug(theMessage)
+        return
+
+    def setProjectStatus(self, isChanged):
+        """There is no status bar, so there is nothing to update.
+        """
+        return
+
+# END Class HeadlessMain
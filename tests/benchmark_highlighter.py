@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""novelWriter Syntax Highlighter Benchmarks
+
+Run from the root folder of the source with:
+    QT_QPA_PLATFORM=offscreen python tests/benchmark_highlighter.py
+"""
+
+import os
+import sys
+import tempfile
+
+from glob import glob
+from time import perf_counter
+from PyQt5.QtGui import QTextDocument, QTextCharFormat
+from PyQt5.QtWidgets import QApplication
+
+sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+
+import nw # noqa: E402
+
+from nwdummy import DummyMain # noqa: E402
+
+from nw.config import Config # noqa: E402
+from nw.core import NWProject, NWIndex # noqa: E402
+from nw.gui.theme import GuiTheme # noqa: E402
+from nw.gui.dochighlight import GuiDocHighlighter # noqa: E402
+
+testDir = os.path.dirname(__file__)
+
+class OldHighlighter(GuiDocHighlighter):
+    """The previous highlighter for text paragraphs, which merged the
+    formats one character at a time, kept here for comparison.
+    """
+    def highlightBlock(self, theText):
+        if not theText or theText[0] in "#%@":
+            GuiDocHighlighter.highlightBlock(self, theText)
+            return
+
+        self.setCurrentBlockState(self.BLOCK_TEXT)
+        for rX, xFmt in self.rxRules:
+            rxItt = rX.globalMatch(theText, 0)
+            while rxItt.hasNext():
+                rxMatch = rxItt.next()
+                for xM in xFmt:
+                    xPos = rxMatch.capturedStart(xM)
+                    xLen = rxMatch.capturedLength(xM)
+                    for x in range(xPos, xPos+xLen):
+                        spFmt = self.format(x)
+                        if spFmt != self.hStyles["hidden"]:
+                            spFmt.merge(self.hStyles[xFmt[xM]])
+                            self.setFormat(x, 1, spFmt)
+
+        if self.theDict is None or not self.spellCheck:
+            return
+
+        rxSpell = self.spellRx.globalMatch(theText, 0)
+        while rxSpell.hasNext():
+            rxMatch = rxSpell.next()
+            if not self.theDict.checkWord(rxMatch.captured(0)):
+                if rxMatch.captured(0).isupper() or rxMatch.captured(0).isnumeric():
+                    continue
+                xPos = rxMatch.capturedStart(0)
+                xLen = rxMatch.capturedLength(0)
+                for x in range(xPos, xPos+xLen):
+                    spFmt = self.format(x)
+                    spFmt.setUnderlineColor(self.colSpell)
+                    spFmt.setUnderlineStyle(QTextCharFormat.SpellCheckUnderline)
+                    self.setFormat(x, 1, spFmt)
+
+        return
+
+class SampleDict():
+    """A spell check dictionary that flags every word starting with a
+    letter from the second half of the alphabet.
+    """
+    def checkWord(self, theWord):
+        return theWord[:1].lower() < "n"
+
+def makeChapter(nWords):
+    """Build a large chapter from the lipsum project, where every other
+    line has some inline formatting and dialogue.
+    """
+    theLines = []
+    for docPath in sorted(glob(os.path.join(testDir, "lipsum", "content", "*.nwd"))):
+        with open(docPath, mode="r", encoding="utf8") as inFile:
+            for aLine in inFile:
+                aLine = aLine.strip()
+                if aLine and aLine[0] not in "@":
+                    theLines.append(aLine)
+
+    fmtLines = []
+    for n, aLine in enumerate(theLines):
+        theWords = aLine.split()
+        if n % 2 == 0 and len(theWords) > 8 and aLine[0] not in "#%":
+            theWords[1] = "_%s_" % theWords[1]
+            theWords[3] = "**%s %s**" % (theWords[3], theWords[4])
+            theWords[5] = "~~%s~~" % theWords[5]
+            theWords[6] = "\"%s" % theWords[6]
+            theWords[8] = "%s\"" % theWords[8]
+            del theWords[4]
+        fmtLines.append(" ".join(theWords))
+        fmtLines.append("")
+
+    theText = "\n".join(fmtLines)
+    return theText*(nWords//len(theText.split()) + 1)
+
+def getFormats(theDoc):
+    """Collect the highlighting format of every character.
+    """
+    theFormats = []
+    theBlock = theDoc.firstBlock()
+    while theBlock.isValid():
+        for fmtRange in theBlock.layout().formats():
+            for x in range(fmtRange.start, fmtRange.start + fmtRange.length):
+                theFormats.append((theBlock.blockNumber(), x, fmtRange.format))
+        theBlock = theBlock.next()
+    return theFormats
+
+def benchHighlight(theDummy):
+    """Time a full highlighting of a large chapter with the previous and
+    the current highlighter, with and without spell checking.
+    """
+    theText = makeChapter(40000)
+    print("Full highlight of a chapter of %d words" % len(theText.split()))
+    print("Highlighter  Spelling  Time [ms]")
+    for spellCheck in (False, True):
+        theFormats = []
+        for hName, hClass in (("Old", OldHighlighter), ("New", GuiDocHighlighter)):
+            theDoc = QTextDocument()
+            theDoc.setPlainText(theText)
+            tStart = perf_counter()
+            hLight = hClass(theDoc, theDummy)
+            hLight.setHandle("0000000000000")
+            hLight.setDict(SampleDict())
+            hLight.setSpellCheck(spellCheck)
+            hLight.rehighlight()
+            tTime = perf_counter() - tStart
+            print("%-11s  %-8s  %9.1f" % (hName, spellCheck, 1000*tTime))
+            theFormats.append(getFormats(theDoc))
+        assert theFormats[0] == theFormats[1]
+    print("")
+
+if __name__ == "__main__":
+    qApp = QApplication([])
+    tempDir = tempfile.mkdtemp()
+    nw.CONFIG = Config()
+    nw.CONFIG.initConfig(tempDir, tempDir)
+    theDummy = DummyMain()
+    theDummy.mainConf = nw.CONFIG
+    theDummy.theTheme = GuiTheme(theDummy)
+    theDummy.theProject = NWProject(theDummy)
+    theDummy.theIndex = NWIndex(theDummy.theProject, theDummy)
+    benchHighlight(theDummy)
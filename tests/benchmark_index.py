@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""novelWriter Index Benchmarks
+
+Run from the root folder of the source with:
+    python tests/benchmark_index.py
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import tracemalloc
+
+from time import perf_counter
+
+sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+
+import nw # noqa: E402
+
+from nwdummy import DummyMain # noqa: E402
+
+from nw.config import Config # noqa: E402
+from nw.core import NWProject, NWIndex # noqa: E402
+from nw.core.index import _packHeads, _unpackHeads # noqa: E402
+from nw.constants import nwItemClass # noqa: E402
+
+testDir = os.path.dirname(__file__)
+
+def makeProject(tempDir, nNotes):
+    """Open a copy of the minimal project, and index a set of character
+    notes, each defining a tag.
+    """
+    projDir = os.path.join(tempDir, "bench%d" % nNotes)
+    shutil.copytree(os.path.join(testDir, "minimal"), projDir)
+
+    theProject = NWProject(theDummy)
+    theProject.projTree.setSeed(42)
+    theProject.openProject(projDir)
+    theIndex = NWIndex(theProject, theDummy)
+
+    for n in range(nNotes):
+        tHandle = theProject.newFile("Char %d" % n, nwItemClass.CHARACTER, "afb3043c7b2b3")
+        theIndex.scanText(tHandle, "# Character %d\n@tag: Char%d\n\nSome text.\n" % (n, n))
+
+    return theProject, theIndex
+
+def benchSaveScan(tempDir):
+    """Time scanning a single document, as done when it is saved, for
+    increasingly large projects.
+    """
+    print("Save-time scan of one document")
+    print("Notes     Tags  Scan [us]  Delete [us]")
+    for nNotes in (100, 1000, 10000):
+        theProject, theIndex = makeProject(tempDir, nNotes)
+        tHandle = theProject.newFile("Scene", nwItemClass.NOVEL, "a508bb932959c")
+        theText = "# Scene\n@tag: Scene\n@pov: Char0\n@char: Char1, Char2\n\nSome text.\n"
+
+        nRuns = 1000
+        tStart = perf_counter()
+        for _ in range(nRuns):
+            theIndex.scanText(tHandle, theText)
+        tScan = (perf_counter() - tStart)/nRuns
+
+        tDelete = 0.0
+        for _ in range(nRuns):
+            tStart = perf_counter()
+            theIndex.deleteHandle(tHandle)
+            tDelete += perf_counter() - tStart
+            theIndex.scanText(tHandle, theText)
+        tDelete /= nRuns
+
+        print("%5d  %7d  %9.1f  %11.1f" % (
+            nNotes, len(theIndex.tagIndex), tScan*1e6, tDelete*1e6
+        ))
+        theProject.closeProject()
+
+    print("")
+    return
+
+def benchHeadMemory():
+    """Compare the memory used by the heading records and by the
+    dictionary format of the index file, for 30k headings.
+    """
+    print("Heading storage for 30000 headings")
+    print("Layout     Memory [kB]  Convert [ms]")
+
+    theData = {}
+    for n in range(300):
+        theData["%013x" % n] = {
+            "T%06d" % (10*i + 1): {
+                "level"    : "H%d" % (i % 4 + 1),
+                "title"    : "Heading %d" % i,
+                "layout"   : "SCENE",
+                "synopsis" : "",
+                "cCount"   : 1000,
+                "wCount"   : 200,
+                "pCount"   : 10,
+                "updated"  : 1600000000,
+            } for i in range(100)
+        }
+    theJson = json.dumps(theData)
+
+    tracemalloc.start()
+    tStart = perf_counter()
+    dictHeads = json.loads(theJson)
+    tDict = perf_counter() - tStart
+    dictMem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("dict     %13.1f  %12.1f" % (dictMem/1024, tDict*1e3))
+
+    tracemalloc.start()
+    tStart = perf_counter()
+    slotHeads = {
+        tHandle: _unpackHeads(theHeads) for tHandle, theHeads in json.loads(theJson).items()
+    }
+    tSlot = perf_counter() - tStart
+    slotMem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("slots    %13.1f  %12.1f" % (slotMem/1024, tSlot*1e3))
+
+    tStart = perf_counter()
+    packHeads = {tHandle: _packHeads(theHeads) for tHandle, theHeads in slotHeads.items()}
+    tPack = perf_counter() - tStart
+    print("pack     %13s  %12.1f" % ("", tPack*1e3))
+    assert packHeads == dictHeads
+
+    print("")
+    return
+
+if __name__ == "__main__":
+    tempDir = tempfile.mkdtemp()
+    try:
+        nw.CONFIG = Config()
+        nw.CONFIG.initConfig(tempDir, tempDir)
+        theDummy = DummyMain()
+        theDummy.mainConf = nw.CONFIG
+        benchSaveScan(tempDir)
+        benchHeadMemory()
+    finally:
+        shutil.rmtree(tempDir)
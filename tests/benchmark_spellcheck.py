@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""novelWriter Spell Check Benchmarks
+
+Run from the root folder of the source with:
+    python tests/benchmark_spellcheck.py
+"""
+
+import os
+import re
+import sys
+import tempfile
+
+from glob import glob
+from time import perf_counter
+from difflib import get_close_matches
+
+sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+
+import nw # noqa: E402
+
+from nw.config import Config # noqa: E402
+from nw.core.spellcheck import NWSpellSimple, NWSuggestIndex # noqa: E402
+
+testDir = os.path.dirname(__file__)
+
+def sampleWords():
+    """Collect the words of the lipsum project.
+    """
+    theWords = []
+    for docPath in sorted(glob(os.path.join(testDir, "lipsum", "content", "*.nwd"))):
+        with open(docPath, mode="r", encoding="utf8") as inFile:
+            theWords += re.findall(r"[a-zA-Z']+", inFile.read())
+    return theWords
+
+def misspell(theWords):
+    """Make misspelled words by swapping, dropping and replacing some
+    of the characters of the words. Returns pairs of the misspelled and
+    the correct word.
+    """
+    badWords = []
+    for n, aWord in enumerate(theWords):
+        if len(aWord) < 4:
+            continue
+        if n % 3 == 0:
+            badWords.append((aWord[0] + aWord[2] + aWord[1] + aWord[3:], aWord))
+        elif n % 3 == 1:
+            badWords.append((aWord[:2] + aWord[3:], aWord))
+        else:
+            badWords.append((aWord[:-1] + "x", aWord))
+    return badWords
+
+def benchCheck(spChk, theWords):
+    """Time looking up words in the word list, as the highlighter does,
+    in the previous list and the current set.
+    """
+    print("Check %d words" % len(theWords))
+    print("Lookup  Words/s")
+
+    oldWords = list(spChk.WORDS)
+    nWords = 2000
+    tStart = perf_counter()
+    for aWord in theWords[:nWords]:
+        aWord.lower() in oldWords
+    tTime = perf_counter() - tStart
+    print("List    %9.0f" % (nWords/tTime))
+
+    tStart = perf_counter()
+    for aWord in theWords:
+        spChk.checkWord(aWord)
+    tTime = perf_counter() - tStart
+    print("Set     %9.0f" % (len(theWords)/tTime))
+    print("")
+
+def benchMemo(spChk, theWords):
+    """Time checking the words of the full lipsum project ten times, as
+    repeated rehighlights do, with and without the memo of checked
+    words, and report the memo hit rate.
+    """
+    print("Check %d words 10 times" % len(theWords))
+    print("Lookup   Words/s  Hit Rate")
+
+    tStart = perf_counter()
+    for n in range(10):
+        for aWord in theWords:
+            spChk._checkWord(aWord)
+    tTime = perf_counter() - tStart
+    print("Direct  %9.0f" % (10*len(theWords)/tTime))
+
+    spChk.clearMemo()
+    spChk.resetMemoStats()
+    tStart = perf_counter()
+    for n in range(10):
+        for aWord in theWords:
+            spChk.checkWord(aWord)
+    tTime = perf_counter() - tStart
+    print("Memo    %9.0f  %7.1f%%" % (10*len(theWords)/tTime, 100*spChk.memoHitRate()))
+    print("")
+
+def benchSuggest(spChk, badWords):
+    """Time the suggestions for misspelled words with difflib and the
+    suggestion index, and count how often the suggestions include the
+    word that was misspelled.
+    """
+    print("Suggest for %d words" % len(badWords))
+    print("Method   Words/s  Found")
+
+    oldWords = list(spChk.WORDS)
+    nWords = 10
+    nFound = 0
+    tStart = perf_counter()
+    for badWord, aWord in badWords[:nWords]:
+        nFound += aWord in get_close_matches(badWord, oldWords, n=10, cutoff=0.75)
+    tTime = perf_counter() - tStart
+    print("difflib  %7.1f  %4.0f%%" % (nWords/tTime, 100*nFound/nWords))
+
+    # Wait for the background build before timing a separate one
+    spChk.suggestWords("wrod")
+    tStart = perf_counter()
+    NWSuggestIndex(spChk.PREFIX_LEN, spChk.MAX_DIST).buildIndex(oldWords)
+    tTime = perf_counter() - tStart
+    print("Index built in %.0f ms" % (1000*tTime))
+
+    nFound = 0
+    tStart = perf_counter()
+    for badWord, aWord in badWords:
+        nFound += aWord in spChk.suggestWords(badWord)
+    tTime = perf_counter() - tStart
+    print("Index    %7.1f  %4.0f%%" % (len(badWords)/tTime, 100*nFound/len(badWords)))
+    print("")
+
+if __name__ == "__main__":
+    tempDir = tempfile.mkdtemp()
+    nw.CONFIG = Config()
+    nw.CONFIG.initConfig(tempDir, tempDir)
+    spChk = NWSpellSimple()
+    spChk.setLanguage("en")
+    theWords = sampleWords()
+    benchCheck(spChk, theWords)
+    benchMemo(spChk, theWords)
+    dictWords = sorted(aWord for aWord in spChk.WORDS if aWord.isalpha())
+    benchSuggest(spChk, misspell(dictWords[::50])[:2000])
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""novelWriter Tokenizer Benchmarks
+
+Run from the root folder of the source with:
+    python tests/benchmark_tokenizer.py
+"""
+
+import os
+import re
+import sys
+
+from glob import glob
+from time import perf_counter
+from operator import itemgetter
+from PyQt5.QtCore import QRegularExpression
+
+sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir)))
+
+from nw.core.tohtml import ToHtml # noqa: E402
+from nw.core.totext import ToText # noqa: E402
+from nw.core.tokenizer import Tokenizer, scanFormats # noqa: E402
+from nw.core.tools import TextReplacer # noqa: E402
+
+testDir = os.path.dirname(__file__)
+
+# The formatting RegExes as they were before the tag was moved in front
+# of the look-behind
+OLD_FMT_EI = r"(?<![\w\\])(_)(?![\s_])(.+?)(?<![\s\\])(\1)(?!\w)"
+OLD_FMT_EB = r"(?<![\w\\])([\*]{2})(?![\s\*])(.+?)(?<![\s\\])(\1)(?!\w)"
+OLD_FMT_ST = r"(?<![\w\\])([~]{2})(?![\s~])(.+?)(?<![\s\\])(\1)(?!\w)"
+
+def qtScanFormats(theLine, rxFormats):
+    """The previous formatting scanner, with one Qt RegEx pass for each
+    format, kept here for comparison.
+    """
+    fmtPos = []
+    for theRX, theKeys in rxFormats:
+        rxThis = theRX.globalMatch(theLine, 0)
+        while rxThis.hasNext():
+            rxMatch = rxThis.next()
+            for n in range(1, len(theKeys)):
+                if theKeys[n] is not None:
+                    xPos = rxMatch.capturedStart(n)
+                    xLen = rxMatch.capturedLength(n)
+                    fmtPos.append([xPos, xLen, theKeys[n]])
+    return sorted(fmtPos, key=itemgetter(0))
+
+def makeSample(nLines):
+    """Build a sample of body text lines from the lipsum project, where
+    every other line has some inline formatting.
+    """
+    theLines = []
+    for docPath in sorted(glob(os.path.join(testDir, "lipsum", "content", "*.nwd"))):
+        with open(docPath, mode="r", encoding="utf8") as inFile:
+            for aLine in inFile:
+                aLine = aLine.strip()
+                if aLine and aLine[0] not in "#%@":
+                    theLines.append(aLine)
+
+    fmtLines = []
+    for n, aLine in enumerate(theLines):
+        theWords = aLine.split()
+        if n % 2 == 0 and len(theWords) > 6:
+            theWords[1] = "_%s_" % theWords[1]
+            theWords[3] = "**%s %s**" % (theWords[3], theWords[4])
+            theWords[5] = "~~%s~~" % theWords[5]
+            del theWords[4]
+        fmtLines.append(" ".join(theWords))
+
+    # Some lines with nested, adjacent and invalid formatting
+    fmtLines += [
+        "snake_case_words and a\\_escaped_ tag",
+        "_italic and **bold**_ and ~~**both**~~",
+        "** not bold** and _not italic _ and _x_y_",
+        "_a_ _b_ **c** **d** ~~e~~ ~~f~~",
+    ]
+
+    return (fmtLines*(nLines//len(fmtLines) + 1))[:nLines]
+
+def benchFormatScan():
+    """Compare the lines per second of the Qt and Python formatting
+    scanners on a large sample, and check that the results are equal.
+    """
+    rxFormats = [
+        (QRegularExpression(OLD_FMT_EI), [None, Tokenizer.FMT_I_B, None, Tokenizer.FMT_I_E]),
+        (QRegularExpression(OLD_FMT_EB), [None, Tokenizer.FMT_B_B, None, Tokenizer.FMT_B_E]),
+        (QRegularExpression(OLD_FMT_ST), [None, Tokenizer.FMT_D_B, None, Tokenizer.FMT_D_E]),
+    ]
+    theLines = makeSample(100000)
+
+    print("Inline formatting scan of %d lines" % len(theLines))
+    print("Scanner   Time [ms]   Lines/s")
+
+    tStart = perf_counter()
+    qtFormats = [qtScanFormats(aLine, rxFormats) for aLine in theLines]
+    tQt = perf_counter() - tStart
+    print("Qt      %11.1f  %8.0f" % (tQt*1e3, len(theLines)/tQt))
+
+    tStart = perf_counter()
+    pyFormats = [scanFormats(aLine) for aLine in theLines]
+    tPy = perf_counter() - tStart
+    print("Python  %11.1f  %8.0f" % (tPy*1e3, len(theLines)/tPy))
+
+    assert pyFormats == qtFormats
+
+    print("")
+    return
+
+def oldReplaceText(theText, repDict):
+    """The previous auto-replace, which compiled the RegEx for every
+    document, kept here for comparison.
+    """
+    if len(repDict) > 0:
+        xRep = re.compile("|".join([re.escape(k) for k in repDict.keys()]), flags=re.DOTALL)
+        theText = xRep.sub(lambda x: repDict[x.group(0)], theText)
+    return theText
+
+def benchAutoReplace():
+    """Compare the time to auto-replace a build of many documents with
+    a large replacement table, when the RegEx is compiled for every
+    document and when a single compiled replacer is shared.
+    """
+    repDict = {"<name%03d>" % n: "Name %d" % n for n in range(500)}
+    theLines = makeSample(20000)
+    for n in range(0, len(theLines), 5):
+        theLines[n] = "%s <name%03d> and <name%03d>." % (theLines[n], n % 500, (7*n) % 500)
+    theDocs = ["\n\n".join(theLines[n:n+10]) for n in range(0, len(theLines), 10)]
+
+    print("Auto-replace of %d documents with %d keys" % (len(theDocs), len(repDict)))
+    print("Replacer  Time [ms]    Docs/s")
+
+    tStart = perf_counter()
+    oldDocs = [oldReplaceText(theText, repDict) for theText in theDocs]
+    tOld = perf_counter() - tStart
+    print("Old     %11.1f  %8.0f" % (tOld*1e3, len(theDocs)/tOld))
+
+    tStart = perf_counter()
+    theReplacer = TextReplacer(repDict)
+    newDocs = [theReplacer.replace(theText) for theText in theDocs]
+    tNew = perf_counter() - tStart
+    print("Shared  %11.1f  %8.0f" % (tNew*1e3, len(theDocs)/tNew))
+
+    assert newDocs == oldDocs
+
+    print("")
+    return
+
+def oldInsertTags(theTokens, htmlTags):
+    """The previous tag insertion of ToHtml.doConvert, which sliced the
+    line once for every tag, kept here for comparison. With empty tags,
+    it is the previous tag removal of ToText.doConvert.
+    """
+    theLines = []
+    for tType, tLine, tText, tFormat, tStyle in theTokens:
+        tTemp = tText
+        for xPos, xLen, xFmt in reversed(tFormat):
+            tTemp = tTemp[:xPos]+htmlTags[xFmt]+tTemp[xPos+xLen:]
+        theLines.append(tTemp)
+    return theLines
+
+def formattedTokens():
+    """Build the tokens of heavily formatted text.
+    """
+    theWords = ["_lorem_", "**ipsum dolor**", "sit", "~~amet~~", "_consectetur **adipiscing**_"]
+    theLines = [" ".join(theWords*(5 + n % 20)) for n in range(5000)]
+    theTokens = []
+    for n, aLine in enumerate(theLines):
+        theTokens.append((Tokenizer.T_TEXT, n, aLine, scanFormats(aLine), Tokenizer.A_NONE))
+        theTokens.append((Tokenizer.T_EMPTY, n, "", None, Tokenizer.A_NONE))
+    return theTokens
+
+def benchHtmlConvert():
+    """Compare the old and new tag insertion on heavily formatted text,
+    and time the full conversion of the same text to HTML.
+    """
+    theTokens = formattedTokens()
+    textTokens = [x for x in theTokens if x[0] == Tokenizer.T_TEXT]
+    nTags = sum(len(x[3]) for x in textTokens)
+
+    theConv = ToHtml(None, None)
+    theConv.theTokens = theTokens
+    htmlTags = {
+        Tokenizer.FMT_B_B : "<strong>",
+        Tokenizer.FMT_B_E : "</strong>",
+        Tokenizer.FMT_I_B : "<em>",
+        Tokenizer.FMT_I_E : "</em>",
+        Tokenizer.FMT_D_B : "<del>",
+        Tokenizer.FMT_D_E : "</del>",
+    }
+
+    print("HTML conversion of %d paragraphs with %d tags" % (len(textTokens), nTags))
+    print("Method    Time [ms]   Lines/s")
+
+    tStart = perf_counter()
+    oldLines = oldInsertTags(textTokens, htmlTags)
+    tOld = perf_counter() - tStart
+    print("Slicing %11.1f  %8.0f" % (tOld*1e3, len(textTokens)/tOld))
+
+    tStart = perf_counter()
+    theConv.doConvert()
+    tNew = perf_counter() - tStart
+    print("Convert %11.1f  %8.0f" % (tNew*1e3, len(textTokens)/tNew))
+
+    newLines = theConv.getResult().split("\n")[:-1]
+    assert newLines == ["<p>%s</p>" % x for x in oldLines]
+
+    print("")
+    return
+
+def benchTextConvert():
+    """Compare the old and new tag removal on heavily formatted text,
+    and time the full conversion of the same text to plain text.
+    """
+    theTokens = formattedTokens()
+    textTokens = [x for x in theTokens if x[0] == Tokenizer.T_TEXT]
+    nTags = sum(len(x[3]) for x in textTokens)
+
+    theConv = ToText(None, None)
+    theConv.theTokens = theTokens
+    noTags = dict.fromkeys((
+        Tokenizer.FMT_B_B, Tokenizer.FMT_B_E, Tokenizer.FMT_I_B,
+        Tokenizer.FMT_I_E, Tokenizer.FMT_D_B, Tokenizer.FMT_D_E,
+    ), "")
+
+    print("Text conversion of %d paragraphs with %d tags" % (len(textTokens), nTags))
+    print("Method    Time [ms]   Lines/s")
+
+    tStart = perf_counter()
+    oldLines = oldInsertTags(textTokens, noTags)
+    tOld = perf_counter() - tStart
+    print("Slicing %11.1f  %8.0f" % (tOld*1e3, len(textTokens)/tOld))
+
+    tStart = perf_counter()
+    theConv.doConvert()
+    tNew = perf_counter() - tStart
+    print("Convert %11.1f  %8.0f" % (tNew*1e3, len(textTokens)/tNew))
+
+    newLines = theConv.getResult().split("\n\n")[:-1]
+    assert newLines == oldLines
+
+    print("")
+    return
+
+if __name__ == "__main__":
+    benchFormatScan()
+    benchAutoReplace()
+    benchHtmlConvert()
+    benchTextConvert()
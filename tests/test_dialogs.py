@@ -9,6 +9,8 @@ import os
 import sys
 
 from shutil import copyfile
+from zipfile import ZipFile
+from lxml import etree
 from nwtools import cmpFiles, getGuiItem
 
 from PyQt5.QtCore import Qt, QItemSelectionModel
@@ -389,7 +391,7 @@ def testAboutBox(qtbot, monkeypatch, nwFuncTemp, nwTemp):
     nwGUI.closeMain()
 
 @pytest.mark.gui
-def testBuildTool(qtbot, yesToAll, nwTempBuild, nwLipsum, nwRef, nwTemp):
+def testBuildTool(qtbot, monkeypatch, yesToAll, nwTempBuild, nwLipsum, nwRef, nwTemp):
 
     nwGUI = nw.main(["--testmode", "--config=%s" % nwLipsum, "--data=%s" % nwTemp])
     qtbot.addWidget(nwGUI)
@@ -412,8 +414,10 @@ def testBuildTool(qtbot, yesToAll, nwTempBuild, nwLipsum, nwRef, nwTemp):
     nwBuild = getGuiItem("GuiBuildNovel")
     assert isinstance(nwBuild, GuiBuildNovel)
 
-    # Default Settings
+    # Default Settings, tokenized in worker processes
+    nwGUI.mainConf.buildWorkers = 2
     qtbot.mouseClick(nwBuild.buildNovel, Qt.LeftButton)
+    nwGUI.mainConf.buildWorkers = 0
 
     assert nwBuild._saveDocument(nwBuild.FMT_NWD)
     assert nwBuild._saveDocument(nwBuild.FMT_HTM)
@@ -473,7 +477,12 @@ def testBuildTool(qtbot, yesToAll, nwTempBuild, nwLipsum, nwRef, nwTemp):
     qtbot.mouseClick(nwBuild.replaceTabs, Qt.LeftButton)
     qtbot.wait(stepDelay)
 
+    # The documents are unchanged, so the tokens are taken from the cache
+    tokenCache = dict(nwBuild.tokenCache)
+    assert tokenCache
     qtbot.mouseClick(nwBuild.buildNovel, Qt.LeftButton)
+    for tHandle, theCache in tokenCache.items():
+        assert nwBuild.tokenCache[tHandle] is theCache
 
     # Save files that can be compared
     assert nwBuild._saveDocument(nwBuild.FMT_NWD)
@@ -524,7 +533,11 @@ def testBuildTool(qtbot, yesToAll, nwTempBuild, nwLipsum, nwRef, nwTemp):
     copyfile(projFile, testFile)
     assert cmpFiles(testFile, refFile)
 
-    # Check the JSON files too at this stage
+    # Check the JSON files too at this stage, which are written while
+    # building, and don't use the preview data
+    htmlText, nwdText = nwBuild.htmlText, nwBuild.nwdText
+    nwBuild.htmlText = []
+    nwBuild.nwdText = []
     assert nwBuild._saveDocument(nwBuild.FMT_JSON_H)
     projFile = os.path.join(nwLipsum, "Lorem Ipsum.json")
     testFile = os.path.join(nwTempBuild, "4H_LoremIpsum.json")
@@ -539,21 +552,75 @@ def testBuildTool(qtbot, yesToAll, nwTempBuild, nwLipsum, nwRef, nwTemp):
     copyfile(projFile, testFile)
     assert cmpFiles(testFile, refFile, [8])
 
-    # Save other file types handled by Qt
+    nwBuild.htmlText = htmlText
+    nwBuild.nwdText = nwdText
+
+    # Save the file types handled by Qt
     # We assume the export itself by the Qt library works, so we just
     # check that novelWriter successfully writes the files.
-    assert nwBuild._saveDocument(nwBuild.FMT_ODT)
-    assert os.path.isfile(os.path.join(nwLipsum, "Lorem Ipsum.odt"))
-
     if not nwGUI.mainConf.osDarwin:
         assert nwBuild._saveDocument(nwBuild.FMT_PDF)
         assert os.path.isfile(os.path.join(nwLipsum, "Lorem Ipsum.pdf"))
 
+    # Open Document, EPUB, Markdown and plain text are written by
+    # novelWriter
+    assert nwBuild._saveDocument(nwBuild.FMT_ODT)
+    with ZipFile(os.path.join(nwLipsum, "Lorem Ipsum.odt")) as inZip:
+        assert inZip.namelist()[0] == "mimetype"
+        assert inZip.read("mimetype") == b"application/vnd.oasis.opendocument.text"
+        testFile = os.path.join(nwTempBuild, "4_LoremIpsum_content.xml")
+        refFile  = os.path.join(nwRef, "build", "4_LoremIpsum_content.xml")
+        with open(testFile, mode="wb") as outFile:
+            outFile.write(inZip.read("content.xml"))
+        assert cmpFiles(testFile, refFile)
+        for xmlFile in ("styles.xml", "meta.xml", "META-INF/manifest.xml"):
+            assert etree.fromstring(inZip.read(xmlFile)) is not None
+
+    # The navigation is built from the index
+    for tItem in nwGUI.theProject.projTree:
+        nwGUI.theIndex.reIndexHandle(tItem.itemHandle)
+    assert nwBuild._saveDocument(nwBuild.FMT_EPUB)
+    with ZipFile(os.path.join(nwLipsum, "Lorem Ipsum.epub")) as inZip:
+        assert inZip.namelist()[0] == "mimetype"
+        assert inZip.read("mimetype") == b"application/epub+zip"
+        xNav = etree.fromstring(inZip.read("OEBPS/nav.xhtml"))
+        theLinks = xNav.xpath("//x:a/@href", namespaces={"x": "http://www.w3.org/1999/xhtml"})
+        assert "fb609cd8319dc.xhtml#T000001" in theLinks
+        for theLink in theLinks:
+            xDoc = etree.fromstring(inZip.read("OEBPS/%s" % theLink.split("#")[0]))
+            assert xDoc is not None
+        assert etree.fromstring(inZip.read("OEBPS/content.opf")) is not None
+
     assert nwBuild._saveDocument(nwBuild.FMT_MD)
-    assert os.path.isfile(os.path.join(nwLipsum, "Lorem Ipsum.md"))
+    projFile = os.path.join(nwLipsum, "Lorem Ipsum.md")
+    testFile = os.path.join(nwTempBuild, "4_LoremIpsum.md")
+    refFile  = os.path.join(nwRef, "build", "4_LoremIpsum.md")
+    copyfile(projFile, testFile)
+    assert cmpFiles(testFile, refFile)
 
     assert nwBuild._saveDocument(nwBuild.FMT_TXT)
-    assert os.path.isfile(os.path.join(nwLipsum, "Lorem Ipsum.txt"))
+    projFile = os.path.join(nwLipsum, "Lorem Ipsum.txt")
+    testFile = os.path.join(nwTempBuild, "4_LoremIpsum.txt")
+    refFile  = os.path.join(nwRef, "build", "4_LoremIpsum.txt")
+    copyfile(projFile, testFile)
+    assert cmpFiles(testFile, refFile)
+
+    # A failed build leaves the existing files as they were
+    def doPanic(*args, **kwargs):
+        raise Exception("Panic!")
+
+    with monkeypatch.context() as mp:
+        mp.setattr("nw.core.tokenizer.Tokenizer.doHeaders", doPanic)
+        for theFormat, fileExt in (
+            (nwBuild.FMT_TXT, "txt"), (nwBuild.FMT_ODT, "odt"), (nwBuild.FMT_EPUB, "epub")
+        ):
+            projFile = os.path.join(nwLipsum, "Lorem Ipsum.%s" % fileExt)
+            with open(projFile, mode="rb") as inFile:
+                oldData = inFile.read()
+            assert not nwBuild._saveDocument(theFormat)
+            with open(projFile, mode="rb") as inFile:
+                assert inFile.read() == oldData
+            assert not os.path.isfile(projFile+"~")
 
     # Close the build tool
     htmlText  = nwBuild.htmlText
@@ -1202,7 +1269,7 @@ def testPreferences(qtbot, monkeypatch, yesToAll, nwMinimal, nwTemp, nwRef, tmpC
     ignoreLines = [
         2,                          # Timestamp
         11, 12, 13, 14, 15, 16, 17, # Window sizes
-        7, 27,                      # Fonts (depends on system default)
+        7, 30,                      # Fonts (depends on system default)
     ]
     assert cmpFiles(testConf, refConf, ignoreLines)
 
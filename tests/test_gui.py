@@ -6,17 +6,20 @@ import nw
 import pytest
 import logging
 import os
+import re
 import sys
 
 from shutil import copyfile
+from zipfile import ZipFile
 from nwtools import cmpFiles
 
 from PyQt5.QtCore import Qt, QUrl, QPoint, QItemSelectionModel
-from PyQt5.QtGui import QTextCursor, QColor, QPixmap, QIcon
+from PyQt5.QtGui import QTextCursor, QTextCharFormat, QColor, QPixmap, QIcon
 from PyQt5.QtWidgets import (
     qApp, QAction, QTreeWidgetItem, QStyle, QFileDialog, QMessageBox
 )
 
+from nw.core import countWords
 from nw.constants import (
     nwItemType, nwItemClass, nwUnicode, nwOutline, nwDocAction, nwDocInsert
 )
@@ -101,6 +104,93 @@ def testLaunch(qtbot, monkeypatch, nwFuncTemp, nwTemp):
     assert ex.value.code & 32 == 32 # lxml package missing
     monkeypatch.undo()
 
+@pytest.mark.gui
+def testHeadlessBuild(nwFuncTemp, nwTempBuild, nwLipsum, nwRef, nwTemp):
+
+    # Default settings, same as the first build in the build tool test
+    testFile = os.path.join(nwTempBuild, "1X_LoremIpsum.nwd")
+    refFile  = os.path.join(nwRef, "build", "1_LoremIpsum.nwd")
+    assert nw.main([
+        "--testmode", "--config=%s" % nwFuncTemp, "--data=%s" % nwTemp,
+        "--build=nwd", "--output=%s" % testFile, nwLipsum
+    ]) == 0
+    assert cmpFiles(testFile, refFile)
+
+    testFile = os.path.join(nwTempBuild, "1X_LoremIpsum.htm")
+    refFile  = os.path.join(nwRef, "build", "1_LoremIpsum.htm")
+    assert nw.main([
+        "--testmode", "--config=%s" % nwFuncTemp, "--data=%s" % nwTemp,
+        "--build=html", "--output=%s" % testFile, nwLipsum
+    ]) == 0
+    assert cmpFiles(testFile, refFile)
+
+    # Plain text drops the formatting tags, which Markdown keeps
+    testFile = os.path.join(nwTempBuild, "1X_LoremIpsum.txt")
+    assert nw.main([
+        "--testmode", "--config=%s" % nwFuncTemp, "--data=%s" % nwTemp,
+        "--build=txt", "--output=%s" % testFile, nwLipsum
+    ]) == 0
+    with open(testFile, mode="r", encoding="utf8") as inFile:
+        theText = inFile.read()
+    assert "\nLorem Ipsum is simply dummy text" in theText
+
+    testFile = os.path.join(nwTempBuild, "1X_LoremIpsum.md")
+    assert nw.main([
+        "--testmode", "--config=%s" % nwFuncTemp, "--data=%s" % nwTemp,
+        "--build=md", "--output=%s" % testFile, nwLipsum
+    ]) == 0
+    with open(testFile, mode="r", encoding="utf8") as inFile:
+        theText = inFile.read()
+    assert "\n_Lorem Ipsum_ is simply dummy text" in theText
+
+    testFile = os.path.join(nwTempBuild, "1X_LoremIpsum.odt")
+    assert nw.main([
+        "--testmode", "--config=%s" % nwFuncTemp, "--data=%s" % nwTemp,
+        "--build=odt", "--output=%s" % testFile, nwLipsum
+    ]) == 0
+    with ZipFile(testFile) as inZip:
+        theText = inZip.read("content.xml").decode("utf-8")
+    assert "<text:span text:style-name=\"T_Italic\">Lorem Ipsum</text:span> is simply" in theText
+
+    testFile = os.path.join(nwTempBuild, "1X_LoremIpsum.epub")
+    assert nw.main([
+        "--testmode", "--config=%s" % nwFuncTemp, "--data=%s" % nwTemp,
+        "--build=epub", "--output=%s" % testFile, nwLipsum
+    ]) == 0
+    with ZipFile(testFile) as inZip:
+        theText = inZip.read("OEBPS/nav.xhtml").decode("utf-8")
+        assert "<a href=\"fb609cd8319dc.xhtml#T000001\">Chapter One</a>" in theText
+
+        # Every heading in the navigation has an anchor in its chapter,
+        # also the scenes that are written as separators
+        theLinks = re.findall(r"href=\"(\w+\.xhtml)#(T\d+)\"", theText)
+        assert theLinks
+        for fileName, theAnchor in theLinks:
+            theChapter = inZip.read("OEBPS/%s" % fileName).decode("utf-8")
+            assert "id='%s'" % theAnchor in theChapter
+
+    # The project is left as it was
+    assert not os.path.isfile(os.path.join(nwLipsum, "meta", "sessionStats.log"))
+    assert not os.path.isfile(os.path.join(nwLipsum, "nwProject.lock"))
+
+    # Invalid format or project
+    assert nw.main([
+        "--testmode", "--config=%s" % nwFuncTemp, "--data=%s" % nwTemp,
+        "--build=pdf", "--output=%s" % testFile, nwLipsum
+    ]) == 2
+    assert nw.main([
+        "--testmode", "--config=%s" % nwFuncTemp, "--data=%s" % nwTemp,
+        "--build=nwd", "--output=%s" % testFile, nwFuncTemp
+    ]) == 1
+
+    # Missing output file
+    with pytest.raises(SystemExit) as ex:
+        nw.main([
+            "--testmode", "--config=%s" % nwFuncTemp, "--data=%s" % nwTemp,
+            "--build=nwd", nwLipsum
+        ])
+    assert ex.value.code == 2
+
 @pytest.mark.gui
 def testDocEditor(qtbot, yesToAll, nwFuncTemp, nwTempGUI, nwRef, nwTemp):
 
@@ -347,16 +437,23 @@ def testDocEditor(qtbot, yesToAll, nwFuncTemp, nwTempGUI, nwRef, nwTemp):
     qtbot.keyClick(nwGUI.docEditor, Qt.Key_Return, delay=keyDelay)
 
     qtbot.wait(stepDelay)
-    nwGUI.docEditor.wCounter.run()
+    nwGUI.docEditor._runCounter()
     qtbot.wait(stepDelay)
 
+    # The counts kept while typing should match a full count
+    assert (
+        nwGUI.docEditor.charCount, nwGUI.docEditor.wordCount, nwGUI.docEditor.paraCount
+    ) == countWords(nwGUI.docEditor.getText())
+
     # Save the document
     assert nwGUI.docEditor.docChanged
     assert nwGUI.saveDocument()
     assert not nwGUI.docEditor.docChanged
     qtbot.wait(stepDelay)
     nwGUI.rebuildIndex()
-    qtbot.wait(stepDelay)
+    nwGUI.threadPool.waitForDone()
+    qApp.processEvents()
+    assert nwGUI.idxRunner is None
 
     # Open and view the edited document
     nwGUI.setFocus(3)
@@ -413,7 +510,7 @@ def testDocEditor(qtbot, yesToAll, nwFuncTemp, nwTempGUI, nwRef, nwTemp):
     nwGUI.close()
 
 @pytest.mark.gui
-def testDocViewer(qtbot, yesToAll, nwLipsum, nwTemp):
+def testDocViewer(qtbot, monkeypatch, yesToAll, nwLipsum, nwTemp):
 
     nwGUI = nw.main(["--testmode", "--config=%s" % nwLipsum, "--data=%s" % nwTemp])
     qtbot.addWidget(nwGUI)
@@ -429,9 +526,64 @@ def testDocViewer(qtbot, yesToAll, nwLipsum, nwTemp):
     assert nwGUI.theIndex.tagIndex == {}
     assert nwGUI.theIndex.refIndex == {}
     nwGUI.mainMenu.aRebuildIndex.activate(QAction.Trigger)
+    assert not nwGUI.rebuildIndex()
+    nwGUI.threadPool.waitForDone()
+    qApp.processEvents()
+    assert nwGUI.idxRunner is None
     assert nwGUI.theIndex.tagIndex != {}
     assert nwGUI.theIndex.refIndex != {}
 
+    # An update of an unchanged project should leave the index as is
+    tagIndex = str(nwGUI.theIndex.tagIndex)
+    refIndex = str(nwGUI.theIndex.refIndex)
+    nwGUI.mainMenu.aUpdateIndex.activate(QAction.Trigger)
+    nwGUI.threadPool.waitForDone()
+    qApp.processEvents()
+    assert nwGUI.idxRunner is None
+    assert str(nwGUI.theIndex.tagIndex) == tagIndex
+    assert str(nwGUI.theIndex.refIndex) == refIndex
+
+    # Run the indexer in this thread instead, so we can interfere
+    with monkeypatch.context() as mp:
+        mp.setattr(nwGUI.threadPool, "start", lambda *args: None)
+
+        # A cancelled indexer should leave the index as is
+        assert not nwGUI.cancelIndexing()
+        assert nwGUI.rebuildIndex()
+        theRunner = nwGUI.idxRunner
+        nwGUI.mainMenu.aCancelIndex.activate(QAction.Trigger)
+        theRunner.run()
+        assert nwGUI.idxRunner is None
+        assert theRunner.scanHandles == []
+        assert str(nwGUI.theIndex.tagIndex) == tagIndex
+
+        # Changes to the index while indexing should be kept
+        assert nwGUI.rebuildIndex()
+        theRunner = nwGUI.idxRunner
+        nwGUI.theIndex.deleteHandle("88243afbe5ed8")
+        assert nwGUI.theIndex.changedHandles == {"88243afbe5ed8"}
+        theRunner.run()
+        assert nwGUI.idxRunner is None
+        assert nwGUI.theIndex.changedHandles is None
+        assert "88243afbe5ed8" in nwGUI.theIndex.refIndex
+        assert str(nwGUI.theIndex.tagIndex) == tagIndex
+
+        # The indexer reads a copy of the project tree made when it started
+        assert nwGUI.rebuildIndex()
+        theRunner = nwGUI.idxRunner
+        theTree = theRunner.theProject.projTree
+        assert theTree is not nwGUI.theProject.projTree
+        assert theTree.handles() == nwGUI.theProject.projTree.handles()
+        assert theTree.trashRoot() == nwGUI.theProject.projTree.trashRoot()
+        tItem = nwGUI.theProject.projTree["88243afbe5ed8"]
+        theName = tItem.itemName
+        tItem.setName("Renamed")
+        assert theTree["88243afbe5ed8"].itemName == theName
+        theRunner.run()
+        tItem.setName(theName)
+        assert nwGUI.idxRunner is None
+        assert str(nwGUI.theIndex.tagIndex) == tagIndex
+
     # Select a document in the project tree
     assert nwGUI.treeView.setSelectedHandle("88243afbe5ed8")
 
@@ -1310,14 +1462,23 @@ def testTextSearch(qtbot, monkeypatch, yesToAll, nwLipsum, nwTemp):
     assert nwGUI.docEditor.docSearch.toggleProject.isChecked()
     assert nwGUI.docEditor.docSearch.doNextFile
 
-    # Next Match
+    # Next Match, which is found in the next document right away
     nwGUI.mainMenu.aFindNext.activate(QAction.Trigger)
     assert nwGUI.docEditor.theHandle == "2426c6f0ca922" # Next document
-    nwGUI.mainMenu.aFindNext.activate(QAction.Trigger)
     assert abs(nwGUI.docEditor.getCursorPosition() - 620) < 3
     nwGUI.mainMenu.aFindNext.activate(QAction.Trigger)
     assert abs(nwGUI.docEditor.getCursorPosition() - 1127) < 3
 
+    # A case sensitive search skips the documents where the index hit
+    # only matches the lower case word, and there is no "Est" anywhere
+    nwGUI.docEditor.docSearch.toggleCase.activate(QAction.Trigger)
+    assert nwGUI.docEditor.docSearch.isCaseSense
+    nwGUI.docEditor.docSearch.setSearchText("Est")
+    nwGUI.mainMenu.aFindNext.activate(QAction.Trigger)
+    assert nwGUI.docEditor.theHandle != "2426c6f0ca922"
+    assert nwGUI.docEditor.textCursor().selectedText() == ""
+    nwGUI.docEditor.docSearch.toggleCase.activate(QAction.Trigger)
+
     # Toggle Replace
     nwGUI.docEditor._beginReplace()
 
@@ -1341,6 +1502,82 @@ def testTextSearch(qtbot, monkeypatch, yesToAll, nwLipsum, nwTemp):
     nwGUI.closeMain()
     nwGUI.close()
 
+@pytest.mark.gui
+def testDocHighlighter(qtbot, yesToAll, nwLipsum, nwTemp):
+
+    class SampleDict():
+        def checkWord(self, theWord):
+            return theWord != "Wrod"
+
+    def charFormat(nBlock, xPos):
+        theBlock = nwGUI.docEditor.document().findBlockByNumber(nBlock)
+        for fmtRange in theBlock.layout().formats():
+            if fmtRange.start <= xPos < fmtRange.start + fmtRange.length:
+                return fmtRange.format
+        return QTextCharFormat()
+
+    nwGUI = nw.main(["--testmode", "--config=%s" % nwLipsum, "--data=%s" % nwTemp])
+    qtbot.addWidget(nwGUI)
+    nwGUI.show()
+    qtbot.waitForWindowShown(nwGUI)
+    qtbot.wait(stepDelay)
+
+    nwGUI.theProject.projTree.setSeed(42)
+    assert nwGUI.openProject(nwLipsum)
+    assert nwGUI.openDocument("4c4f28287af27")
+    qtbot.wait(stepDelay)
+
+    hLight = nwGUI.docEditor.hLight
+    hLight.setDict(SampleDict())
+    hLight.setSpellCheck(True)
+    nwGUI.docEditor.setPlainText((
+        "# Hello Wrod\n"
+        "\n"
+        "Some \"dialogue with _emphasis_ inside\" here.\n"
+        "\n"
+        "Text ~~with _hidden_ markers~~ and <_tag_>.\n"
+    ))
+    hStyles = hLight.hStyles
+
+    # Emphasis inside dialogue is both italic and coloured as emphasis,
+    # while the rest of the dialogue keeps the dialogue colour
+    theFmt = charFormat(2, 6)
+    assert theFmt.foreground().color() == hLight.colDialN
+    assert not theFmt.fontItalic()
+    theFmt = charFormat(2, 21)
+    assert theFmt.fontItalic()
+    assert theFmt.foreground().color() == hLight.colEmph
+    assert charFormat(2, 20) == hStyles["hidden"]
+    assert charFormat(2, 29) == hStyles["hidden"]
+
+    # Hidden markers are not merged with the formats of later rules
+    assert charFormat(4, 5) == hStyles["hidden"]
+    assert charFormat(4, 6) == hStyles["hidden"]
+    assert charFormat(4, 7).fontStrikeOut()
+    assert charFormat(4, 12) == hStyles["hidden"]
+    assert charFormat(4, 13).fontStrikeOut()
+    assert charFormat(4, 13).fontItalic()
+    assert charFormat(4, 19) == hStyles["hidden"]
+    assert charFormat(4, 28) == hStyles["hidden"]
+    assert charFormat(4, 35) == hStyles["replace"]
+    assert charFormat(4, 36) == hStyles["hidden"]
+    assert charFormat(4, 37).fontItalic()
+    assert charFormat(4, 40) == hStyles["hidden"]
+
+    # The spell check underline is merged on top of the header format
+    theFmt = charFormat(0, 8)
+    assert theFmt.underlineStyle() == QTextCharFormat.SpellCheckUnderline
+    assert theFmt.underlineColor() == hLight.colSpell
+    assert theFmt.fontWeight() == hStyles["header1"].fontWeight()
+    assert theFmt.fontPointSize() == hStyles["header1"].fontPointSize()
+    assert theFmt.foreground().color() == hLight.colHead
+    assert charFormat(0, 2) == hStyles["header1"]
+    assert charFormat(0, 0) == hStyles["header1h"]
+
+    # qtbot.stopForInteraction()
+    nwGUI.closeMain()
+    nwGUI.close()
+
 @pytest.mark.gui
 def testOutline(qtbot, yesToAll, nwLipsum, nwTemp):
 
@@ -1354,6 +1591,9 @@ def testOutline(qtbot, yesToAll, nwLipsum, nwTemp):
     nwGUI.mainConf.lastPath = nwLipsum
 
     nwGUI.rebuildIndex()
+    nwGUI.threadPool.waitForDone()
+    qApp.processEvents()
+    assert nwGUI.idxRunner is None
     nwGUI.tabWidget.setCurrentIndex(nwGUI.idxTabProj)
 
     assert nwGUI.projView.topLevelItemCount() > 0
@@ -2,6 +2,7 @@
 """novelWriter Project Class Tester
 """
 
+import nw
 import pytest
 import os
 import json
@@ -11,7 +12,7 @@ from shutil import copyfile
 from nwtools import cmpFiles
 
 from nw.core.project import NWProject
-from nw.core.index import NWIndex
+from nw.core.index import NWIndex, IndexHeading
 from nw.constants import nwItemClass, nwItemLayout
 
 @pytest.mark.project
@@ -109,13 +110,14 @@ def testIndexBuildCheck(monkeypatch, nwLipsum, nwDummy, nwTempProj, nwRef):
 
     assert theIndex.loadIndex()
     assert not theIndex.indexBroken
-    theIndex.novelIndex["7a992350f3eb6"]["T000001"]["Stuff"] = "" # No longer len(keys()) == 8
+    theIndex.novelIndex["7a992350f3eb6"][1] = {"Stuff": ""} # Not a heading record
     theIndex.checkIndex()
     assert theIndex.indexBroken
 
     assert theIndex.loadIndex()
     assert not theIndex.indexBroken
-    theIndex.noteIndex["4c4f28287af27"]["T000001"]["Stuff"] = "" # No longer len(keys()) == 8
+    theIndex.noteIndex["4c4f28287af27"]["T000001"] = theIndex.noteIndex["4c4f28287af27"][1]
+    theIndex.noteIndex["4c4f28287af27"].pop(1) # Not an integer line key
     theIndex.checkIndex()
     assert theIndex.indexBroken
 
@@ -132,12 +134,324 @@ def testIndexBuildCheck(monkeypatch, nwLipsum, nwDummy, nwTempProj, nwRef):
     theIndex.checkIndex()
     assert theIndex.indexBroken
 
+    # The headings are stored as records, but written in the dictionary format
+    assert theIndex.loadIndex()
+    theHead = theIndex.novelIndex["7a992350f3eb6"][1]
+    assert isinstance(theHead, IndexHeading)
+    with open(projFile, mode="r", encoding="utf8") as inFile:
+        theData = json.load(inFile)
+    assert theData["novelIndex"]["7a992350f3eb6"]["T000001"] == theHead.packData()
+    assert IndexHeading.unpackData(theHead.packData()) == theHead
+    assert theIndex.getHeading("7a992350f3eb6", "T000001") is theHead
+    assert theIndex.getHeading("7a992350f3eb6", "T000002") is None
+    assert theIndex.getHeading("7a992350f3eb6", "Stuff") is None
+
+    # A broken heading in the index file makes the load fail
+    theData["novelIndex"]["7a992350f3eb6"]["T000001"]["Stuff"] = ""
+    with open(projFile, mode="w", encoding="utf8") as outFile:
+        json.dump(theData, outFile)
+    assert not theIndex.loadIndex()
+
     # Finalise
+    assert theIndex.saveIndex()
     assert theProject.closeProject()
 
     copyfile(projFile, testFile)
     assert cmpFiles(testFile, refFile)
 
+@pytest.mark.project
+def testIndexDocStamps(nwLipsum, nwDummy):
+    """Test the document fingerprints used for incremental indexing.
+    """
+    theProject = NWProject(nwDummy)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwLipsum)
+
+    theIndex = NWIndex(theProject, nwDummy)
+    for tItem in theProject.projTree:
+        theIndex.reIndexHandle(tItem.itemHandle)
+    assert theIndex.saveIndex()
+
+    # Unindexed items always need a rescan
+    assert not theIndex.checkDocStamp("b3643d0f92e32")
+
+    # The fingerprints should survive a reload
+    theIndex.clearIndex()
+    assert not theIndex.docStamps
+    assert theIndex.loadIndex()
+    assert not theIndex.indexBroken
+    assert theIndex.docStamps
+    for tHandle in theIndex.docStamps:
+        assert theIndex.checkDocStamp(tHandle)
+
+    # Touching the file without changing the text is still unchanged
+    tHandle = "4c4f28287af27"
+    docPath = os.path.join(theProject.projContent, tHandle+".nwd")
+    docStat = os.stat(docPath)
+    os.utime(docPath, (docStat.st_atime, docStat.st_mtime + 10.0))
+    assert theIndex.checkDocStamp(tHandle)
+    assert theIndex.docStamps[tHandle][1] == docStat.st_mtime + 10.0
+
+    # Changing the text should flag the file
+    with open(docPath, mode="a", encoding="utf8") as outFile:
+        outFile.write("\nMore text.\n")
+    assert not theIndex.checkDocStamp(tHandle)
+
+    # Moving a file to the trash should also flag it
+    nHandle = "88243afbe5ed8"
+    assert theIndex.checkDocStamp(nHandle)
+    trashHandle = theProject.trashFolder()
+    theProject.projTree[nHandle].setParent(trashHandle)
+    assert not theIndex.checkDocStamp(nHandle)
+
+    # Deleting the handle also removes its fingerprint
+    theIndex.deleteHandle(nHandle)
+    assert nHandle not in theIndex.docStamps
+
+    # Only the changed fingerprints are appended on save
+    stampFile = os.path.join(theProject.projMeta, "indexStamps.json")
+    with open(stampFile, mode="r", encoding="utf8") as inFile:
+        oldLines = inFile.read().splitlines()
+    assert len(oldLines) == 1
+    assert theIndex.saveIndex()
+    with open(stampFile, mode="r", encoding="utf8") as inFile:
+        newLines = inFile.read().splitlines()
+    assert newLines[:1] == oldLines
+    assert json.loads(newLines[1]) == {
+        tHandle: theIndex.docStamps[tHandle], nHandle: None
+    }
+
+    # Saving without changes leaves the file alone
+    assert theIndex.saveIndex()
+    with open(stampFile, mode="r", encoding="utf8") as inFile:
+        assert inFile.read().splitlines() == newLines
+
+    # The appended lines are applied when loading
+    theStamps = str(theIndex.docStamps)
+    newIndex = NWIndex(theProject, nwDummy)
+    assert newIndex.loadIndex()
+    assert str(newIndex.docStamps) == theStamps
+    assert nHandle not in newIndex.docStamps
+
+    # The file is compacted when it has grown too long
+    newIndex.STAMP_LINES = 2
+    newIndex.docStamps[tHandle][1] += 1.0
+    newIndex._dirtyStamps.add(tHandle)
+    assert newIndex.saveIndex()
+    with open(stampFile, mode="r", encoding="utf8") as inFile:
+        newLines = inFile.read().splitlines()
+    assert len(newLines) == 1
+    assert json.loads(newLines[0]) == newIndex.docStamps
+
+    # A broken fingerprint breaks the index
+    theIndex.docStamps[tHandle].append("Stuff")
+    theIndex.checkIndex()
+    assert theIndex.indexBroken
+    assert not theIndex.docStamps
+
+    assert theProject.closeProject()
+
+@pytest.mark.project
+def testIndexShards(monkeypatch, nwLipsum, nwDummy):
+    """Test saving and loading the index as a manifest with one shard
+    file per document.
+    """
+    theProject = NWProject(nwDummy)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwLipsum)
+
+    indexFile = os.path.join(theProject.projMeta, "tagsIndex.json")
+    shardPath = os.path.join(theProject.projMeta, "index")
+    shardMain = os.path.join(shardPath, "manifest.json")
+
+    theIndex = NWIndex(theProject, nwDummy)
+    monkeypatch.setattr(theIndex.mainConf, "indexFormat", "shards")
+    for tItem in theProject.projTree:
+        theIndex.reIndexHandle(tItem.itemHandle)
+    assert theIndex.saveIndex()
+    assert os.path.isfile(shardMain)
+    assert os.path.isfile(os.path.join(shardPath, "4c4f28287af27.json"))
+    assert not os.path.isfile(indexFile)
+
+    tagIndex = str(theIndex.tagIndex)
+    refIndex = str(theIndex.refIndex)
+    novelIndex = str(theIndex.novelIndex)
+    noteIndex = str(theIndex.noteIndex)
+    backRefs = theIndex.getBackReferenceList("4c4f28287af27")
+    assert backRefs
+
+    # The shards should only be loaded when used
+    newIndex = NWIndex(theProject, nwDummy)
+    assert newIndex.loadIndex()
+    assert not newIndex.indexBroken
+    assert str(newIndex.tagIndex) == tagIndex
+    assert "4c4f28287af27" in newIndex.refIndex
+    assert not newIndex.refIndex.isLoaded("4c4f28287af27")
+    assert newIndex.getBackReferenceList("4c4f28287af27") == backRefs
+    assert newIndex.getReferences("4c4f28287af27")
+    assert newIndex.refIndex.isLoaded("4c4f28287af27")
+    assert newIndex.noteIndex.isLoaded("4c4f28287af27")
+    assert not newIndex.novelIndex.isLoaded("7a992350f3eb6")
+    assert str(newIndex.refIndex) == refIndex
+    assert str(newIndex.novelIndex) == novelIndex
+    assert str(newIndex.noteIndex) == noteIndex
+
+    # Only changed documents should be written
+    theWritten = []
+    writeJson = nw.core.index._writeJson
+
+    def spyWrite(filePath, theData):
+        theWritten.append(os.path.basename(filePath))
+        writeJson(filePath, theData)
+
+    monkeypatch.setattr("nw.core.index._writeJson", spyWrite)
+    newIndex = NWIndex(theProject, nwDummy)
+    assert newIndex.loadIndex()
+    assert newIndex.scanText("4c4f28287af27", "# Bod\n@tag: Bod\n")
+    newIndex.deleteHandle("7a992350f3eb6")
+    assert newIndex.saveIndex()
+    assert theWritten == ["4c4f28287af27.json", "manifest.json"]
+    assert not os.path.isfile(os.path.join(shardPath, "7a992350f3eb6.json"))
+
+    # Nothing is written if nothing has changed
+    theWritten.clear()
+    assert newIndex.saveIndex()
+    assert theWritten == []
+
+    # A broken shard leaves the document to be indexed again
+    with open(os.path.join(shardPath, "4c4f28287af27.json"), mode="w") as outFile:
+        outFile.write("stuff")
+    newIndex = NWIndex(theProject, nwDummy)
+    assert newIndex.loadIndex()
+    assert newIndex.checkDocStamp("4c4f28287af27")
+    assert newIndex.refIndex["4c4f28287af27"] == {}
+    assert not newIndex.checkDocStamp("4c4f28287af27")
+
+    # Switching back to a single file removes the manifest
+    monkeypatch.setattr(theIndex.mainConf, "indexFormat", "json")
+    assert theIndex.saveIndex()
+    assert os.path.isfile(indexFile)
+    assert not os.path.isfile(shardMain)
+    newIndex = NWIndex(theProject, nwDummy)
+    assert newIndex.loadIndex()
+    assert str(newIndex.refIndex) == refIndex
+
+    assert theProject.closeProject()
+
+@pytest.mark.project
+def testIndexSQLite(monkeypatch, nwLipsum, nwDummy):
+    """Test saving and loading the index in an SQLite database.
+    """
+    theProject = NWProject(nwDummy)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwLipsum)
+
+    indexFile = os.path.join(theProject.projMeta, "tagsIndex.json")
+    dbFile = os.path.join(theProject.projMeta, "tagsIndex.db")
+
+    theIndex = NWIndex(theProject, nwDummy)
+    for tItem in theProject.projTree:
+        theIndex.reIndexHandle(tItem.itemHandle)
+    assert theIndex.saveIndex()
+    assert os.path.isfile(indexFile)
+
+    # Switching format moves the index to the database
+    monkeypatch.setattr(theIndex.mainConf, "indexFormat", "sqlite")
+    sqlIndex = NWIndex(theProject, nwDummy)
+    assert sqlIndex.loadIndex()
+    assert sqlIndex.saveIndex()
+    assert os.path.isfile(dbFile)
+    assert not os.path.isfile(indexFile)
+
+    newIndex = NWIndex(theProject, nwDummy)
+    assert newIndex.loadIndex()
+    assert not newIndex.indexBroken
+    assert not newIndex.refIndex.isLoaded("4c4f28287af27")
+    assert str(newIndex.tagIndex) == str(theIndex.tagIndex)
+    assert str(newIndex.textCounts) == str(theIndex.textCounts)
+    for tHandle in theIndex.textCounts:
+        assert newIndex.getBackReferenceList(tHandle) == theIndex.getBackReferenceList(tHandle)
+        assert newIndex.getReferences(tHandle) == theIndex.getReferences(tHandle)
+        assert newIndex.getCounts(tHandle) == theIndex.getCounts(tHandle)
+    assert newIndex.getTagSource("Bod") == theIndex.getTagSource("Bod")
+    assert newIndex.getNovelStructure() == theIndex.getNovelStructure()
+    assert str(newIndex.refIndex) == str(theIndex.refIndex)
+    assert str(newIndex.novelIndex) == str(theIndex.novelIndex)
+    assert str(newIndex.noteIndex) == str(theIndex.noteIndex)
+
+    # Only changed documents are updated
+    assert newIndex.scanText("4c4f28287af27", "# Bod\n@tag: Bod\n@tag: Bodd\n")
+    newIndex.deleteHandle("7a992350f3eb6")
+    assert set(newIndex._dirtyHandles()) == {"4c4f28287af27", "7a992350f3eb6"}
+    assert newIndex.saveIndex()
+    assert not newIndex._dirtyHandles()
+
+    newIndex = NWIndex(theProject, nwDummy)
+    assert newIndex.loadIndex()
+    assert newIndex.getTagSource("Bodd") == ("4c4f28287af27", 3, "T000001")
+    assert "7a992350f3eb6" not in newIndex.novelIndex
+    assert "7a992350f3eb6" not in newIndex.textCounts
+    assert newIndex.noteIndex["4c4f28287af27"][1].title == "Bod"
+
+    # A failed save leaves the database as it was
+    def doPanic(*args, **kwargs):
+        raise Exception
+
+    assert newIndex.scanText("4c4f28287af27", "# Bod\n@tag: Bod\n")
+    monkeypatch.setattr("nw.core.index.json.dumps", doPanic)
+    assert not newIndex.saveIndex()
+    monkeypatch.undo()
+    monkeypatch.setattr(theIndex.mainConf, "indexFormat", "sqlite")
+    newIndex = NWIndex(theProject, nwDummy)
+    assert newIndex.loadIndex()
+    assert newIndex.getTagSource("Bodd") == ("4c4f28287af27", 3, "T000001")
+
+    assert theProject.closeProject()
+
+@pytest.mark.project
+def testIndexParallel(monkeypatch, nwLipsum, nwDummy):
+    """Check that indexing in worker processes gives the same result as
+    the serial indexer.
+    """
+    theProject = NWProject(nwDummy)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwLipsum)
+
+    monkeypatch.setattr("nw.core.index.time", lambda: 123.4)
+
+    theHandles = theProject.projTree.handles()
+
+    def doPanic(*args, **kwargs):
+        raise Exception
+
+    serIndex = NWIndex(theProject, nwDummy)
+    assert list(serIndex.scanDocuments(theHandles, 1)) == theHandles
+
+    # The documents must be read by the workers, and not by the serial
+    # fallback, so reading them in this process is not allowed
+    with monkeypatch.context() as mp:
+        mp.setattr("nw.core.index.NWDoc.openDocument", doPanic)
+        parIndex = NWIndex(theProject, nwDummy)
+        assert list(parIndex.scanDocuments(theHandles, 3)) == theHandles
+
+    assert serIndex.tagIndex
+    assert serIndex.novelIndex
+    assert str(parIndex.tagIndex) == str(serIndex.tagIndex)
+    assert str(parIndex.refIndex) == str(serIndex.refIndex)
+    assert str(parIndex.novelIndex) == str(serIndex.novelIndex)
+    assert str(parIndex.noteIndex) == str(serIndex.noteIndex)
+    assert str(parIndex.textCounts) == str(serIndex.textCounts)
+    assert str(parIndex.docStamps) == str(serIndex.docStamps)
+
+    # If the pool fails, the indexer falls back to the serial path
+    monkeypatch.setattr("nw.core.tools.multiprocessing.get_context", doPanic)
+    failIndex = NWIndex(theProject, nwDummy)
+    assert list(failIndex.scanDocuments(theHandles, 3)) == theHandles
+    assert str(failIndex.tagIndex) == str(serIndex.tagIndex)
+    assert str(failIndex.novelIndex) == str(serIndex.novelIndex)
+
+    assert theProject.closeProject()
+
 @pytest.mark.project
 def testIndexScanThis(nwMinimal, nwDummy):
     """Test the tag scanner function scanThis.
@@ -210,7 +524,7 @@ def testIndexCheckThese(nwMinimal, nwDummy):
         "@pov: Jane"
     ))
     assert str(theIndex.tagIndex) == "{'Jane': [2, '%s', 'CHARACTER', 'T000001']}" % cHandle
-    assert theIndex.novelIndex[nHandle]["T000001"]["title"] == "Hello World!"
+    assert theIndex.novelIndex[nHandle][1].title == "Hello World!"
 
     assert str(theIndex.checkThese(["@tag",  "Jane"], cItem)) == "[True, True]"
     assert str(theIndex.checkThese(["@tag",  "John"], cItem)) == "[True, True]"
@@ -279,7 +593,7 @@ def testIndexScanText(nwMinimal, nwDummy):
         "Well, not really.\n"
     ))
     assert str(theIndex.tagIndex) == "{'Jane': [2, '%s', 'CHARACTER', 'T000001']}" % cHandle
-    assert theIndex.novelIndex[nHandle]["T000001"]["title"] == "Hello World!"
+    assert theIndex.novelIndex[nHandle][1].title == "Hello World!"
 
     # Check that title sections are indexed properly
     assert theIndex.scanText(nHandle, (
@@ -326,40 +640,40 @@ def testIndexScanText(nwMinimal, nwDummy):
     assert theIndex.refIndex[nHandle].get("T000025", None) is None
     assert theIndex.refIndex[nHandle].get("T000026", None) is None
 
-    assert theIndex.novelIndex[nHandle]["T000001"]["level"] == "H1"
-    assert theIndex.novelIndex[nHandle]["T000007"]["level"] == "H2"
-    assert theIndex.novelIndex[nHandle]["T000013"]["level"] == "H3"
-    assert theIndex.novelIndex[nHandle]["T000019"]["level"] == "H4"
-
-    assert theIndex.novelIndex[nHandle]["T000001"]["title"] == "Title One"
-    assert theIndex.novelIndex[nHandle]["T000007"]["title"] == "Title Two"
-    assert theIndex.novelIndex[nHandle]["T000013"]["title"] == "Title Three"
-    assert theIndex.novelIndex[nHandle]["T000019"]["title"] == "Title Four"
-
-    assert theIndex.novelIndex[nHandle]["T000001"]["layout"] == "SCENE"
-    assert theIndex.novelIndex[nHandle]["T000007"]["layout"] == "SCENE"
-    assert theIndex.novelIndex[nHandle]["T000013"]["layout"] == "SCENE"
-    assert theIndex.novelIndex[nHandle]["T000019"]["layout"] == "SCENE"
-
-    assert theIndex.novelIndex[nHandle]["T000001"]["synopsis"] == "Synopsis One."
-    assert theIndex.novelIndex[nHandle]["T000007"]["synopsis"] == "Synopsis Two."
-    assert theIndex.novelIndex[nHandle]["T000013"]["synopsis"] == "Synopsis Three."
-    assert theIndex.novelIndex[nHandle]["T000019"]["synopsis"] == "Synopsis Four."
-
-    assert theIndex.novelIndex[nHandle]["T000001"]["cCount"] == 23
-    assert theIndex.novelIndex[nHandle]["T000007"]["cCount"] == 23
-    assert theIndex.novelIndex[nHandle]["T000013"]["cCount"] == 27
-    assert theIndex.novelIndex[nHandle]["T000019"]["cCount"] == 56
-
-    assert theIndex.novelIndex[nHandle]["T000001"]["wCount"] == 4
-    assert theIndex.novelIndex[nHandle]["T000007"]["wCount"] == 4
-    assert theIndex.novelIndex[nHandle]["T000013"]["wCount"] == 4
-    assert theIndex.novelIndex[nHandle]["T000019"]["wCount"] == 9
-
-    assert theIndex.novelIndex[nHandle]["T000001"]["pCount"] == 1
-    assert theIndex.novelIndex[nHandle]["T000007"]["pCount"] == 1
-    assert theIndex.novelIndex[nHandle]["T000013"]["pCount"] == 1
-    assert theIndex.novelIndex[nHandle]["T000019"]["pCount"] == 3
+    assert theIndex.novelIndex[nHandle][1].level == "H1"
+    assert theIndex.novelIndex[nHandle][7].level == "H2"
+    assert theIndex.novelIndex[nHandle][13].level == "H3"
+    assert theIndex.novelIndex[nHandle][19].level == "H4"
+
+    assert theIndex.novelIndex[nHandle][1].title == "Title One"
+    assert theIndex.novelIndex[nHandle][7].title == "Title Two"
+    assert theIndex.novelIndex[nHandle][13].title == "Title Three"
+    assert theIndex.novelIndex[nHandle][19].title == "Title Four"
+
+    assert theIndex.novelIndex[nHandle][1].layout == "SCENE"
+    assert theIndex.novelIndex[nHandle][7].layout == "SCENE"
+    assert theIndex.novelIndex[nHandle][13].layout == "SCENE"
+    assert theIndex.novelIndex[nHandle][19].layout == "SCENE"
+
+    assert theIndex.novelIndex[nHandle][1].synopsis == "Synopsis One."
+    assert theIndex.novelIndex[nHandle][7].synopsis == "Synopsis Two."
+    assert theIndex.novelIndex[nHandle][13].synopsis == "Synopsis Three."
+    assert theIndex.novelIndex[nHandle][19].synopsis == "Synopsis Four."
+
+    assert theIndex.novelIndex[nHandle][1].cCount == 23
+    assert theIndex.novelIndex[nHandle][7].cCount == 23
+    assert theIndex.novelIndex[nHandle][13].cCount == 27
+    assert theIndex.novelIndex[nHandle][19].cCount == 56
+
+    assert theIndex.novelIndex[nHandle][1].wCount == 4
+    assert theIndex.novelIndex[nHandle][7].wCount == 4
+    assert theIndex.novelIndex[nHandle][13].wCount == 4
+    assert theIndex.novelIndex[nHandle][19].wCount == 9
+
+    assert theIndex.novelIndex[nHandle][1].pCount == 1
+    assert theIndex.novelIndex[nHandle][7].pCount == 1
+    assert theIndex.novelIndex[nHandle][13].pCount == 1
+    assert theIndex.novelIndex[nHandle][19].pCount == 3
 
     assert theIndex.scanText(cHandle, (
         "# Title One\n\n"
@@ -376,13 +690,13 @@ def testIndexScanText(nwMinimal, nwDummy):
     assert theIndex.refIndex[cHandle].get("T000006", None) is None
     assert theIndex.refIndex[cHandle].get("T000007", None) is None
 
-    assert theIndex.noteIndex[cHandle]["T000001"]["level"] == "H1"
-    assert theIndex.noteIndex[cHandle]["T000001"]["title"] == "Title One"
-    assert theIndex.noteIndex[cHandle]["T000001"]["layout"] == "NOTE"
-    assert theIndex.noteIndex[cHandle]["T000001"]["synopsis"] == "Synopsis One."
-    assert theIndex.noteIndex[cHandle]["T000001"]["cCount"] == 23
-    assert theIndex.noteIndex[cHandle]["T000001"]["wCount"] == 4
-    assert theIndex.noteIndex[cHandle]["T000001"]["pCount"] == 1
+    assert theIndex.noteIndex[cHandle][1].level == "H1"
+    assert theIndex.noteIndex[cHandle][1].title == "Title One"
+    assert theIndex.noteIndex[cHandle][1].layout == "NOTE"
+    assert theIndex.noteIndex[cHandle][1].synopsis == "Synopsis One."
+    assert theIndex.noteIndex[cHandle][1].cCount == 23
+    assert theIndex.noteIndex[cHandle][1].wCount == 4
+    assert theIndex.noteIndex[cHandle][1].pCount == 1
 
     assert theIndex.scanText(sHandle, (
         "# Title One\n\n"
@@ -424,7 +738,41 @@ def testIndexExtractData(nwMinimal, nwDummy):
     ))
 
     # The novel structure should contain the pointer to the novel file header
-    assert str(theIndex.getNovelStructure()) == "['%s:T000001']" % nHandle
+    theStruct = theIndex.getNovelStructure()
+    assert theStruct == ((nHandle, "T000001"),)
+
+    # The structure is cached until the index or the tree changes
+    assert theIndex.getNovelStructure() is theStruct
+    theIndex.scanText(cHandle, "# Jane Smith\n@tag: Jane\n")
+    assert theIndex.getNovelStructure() is theStruct
+
+    theProject.projTree[nHandle].setExported(False)
+    assert theIndex.getNovelStructure() == ()
+    assert theIndex.getNovelStructure(skipExcluded=False) == theStruct
+    theProject.projTree[nHandle].setExported(True)
+    assert theIndex.getNovelStructure() == theStruct
+
+    assert theIndex.scanText(nHandle, "# Hello World!\n\n## Chapter\n")
+    assert theIndex.getNovelStructure() == (
+        (nHandle, "T000001"), (nHandle, "T000003")
+    )
+    theOrder = theProject.projTree.handles()
+    theOrder.remove(nHandle)
+    theProject.projTree.setOrder(theOrder)
+    assert theIndex.getNovelStructure() == ()
+    theProject.projTree.setOrder(theOrder + [nHandle])
+    theIndex.deleteHandle(nHandle)
+    assert theIndex.getNovelStructure() == ()
+
+    assert theIndex.scanText(nHandle, (
+        "# Hello World!\n"
+        "@pov: Jane\n"
+        "@char: Jane\n\n"
+        "% this is a comment\n\n"
+        "This is a story about Jane Smith.\n\n"
+        "Well, not really.\n"
+    ))
+    assert theIndex.getNovelStructure() == theStruct
 
     # The novel file should have the correct counts
     cC, wC, pC = theIndex.getCounts(nHandle)
@@ -457,6 +805,60 @@ def testIndexExtractData(nwMinimal, nwDummy):
     theRefs = theIndex.getBackReferenceList(cHandle)
     assert str(theRefs) == "{'%s': 'T000001'}" % nHandle
 
+    # The lookup maps should match maps built from scratch
+    tagOwned = str(theIndex._tagOwned)
+    tagRefs = str(theIndex._tagRefs)
+    theIndex._buildLookupMaps()
+    assert str(theIndex._tagOwned) == tagOwned
+    assert str(theIndex._tagRefs) == tagRefs
+
+    # Moving the tag to another file moves the back reference
+    oHandle = theProject.newFile("Jane 2", nwItemClass.CHARACTER, "afb3043c7b2b3")
+    assert theIndex.scanText(oHandle, "# Jane Doe\n@tag: Jane\n")
+    assert theIndex.getBackReferenceList(cHandle) == {}
+    assert theIndex.getBackReferenceList(oHandle) == {nHandle: "T000001"}
+
+    # The referring files are listed in project tree order
+    aHandle = theProject.newFile("Scene A", nwItemClass.NOVEL, "a508bb932959c")
+    bHandle = theProject.newFile("Scene B", nwItemClass.NOVEL, "a508bb932959c")
+    assert theIndex.scanText(aHandle, "# Scene A\n@char: Jane\n")
+    assert theIndex.scanText(bHandle, "## Scene B\n@pov: Jane\n")
+    theOrder = theProject.projTree.handles()
+    for tHandle in (nHandle, aHandle, bHandle):
+        theOrder.remove(tHandle)
+
+    theProject.projTree.setOrder(theOrder + [bHandle, nHandle, aHandle])
+    theRefs = theIndex.getBackReferenceList(oHandle)
+    assert list(theRefs.items()) == [
+        (bHandle, "T000001"), (nHandle, "T000001"), (aHandle, "T000001")
+    ]
+    theProject.projTree.setOrder(theOrder + [aHandle, bHandle, nHandle])
+    assert list(theIndex.getBackReferenceList(oHandle)) == [aHandle, bHandle, nHandle]
+
+    # Files missing from the tree are listed last, sorted by handle
+    theProject.projTree.setOrder(theOrder + [nHandle])
+    assert list(theIndex.getBackReferenceList(oHandle)) == [nHandle] + sorted([aHandle, bHandle])
+
+    theProject.projTree.setOrder(theOrder + [nHandle, aHandle, bHandle])
+    theIndex.deleteHandle(aHandle)
+    theIndex.deleteHandle(bHandle)
+    assert theIndex.getBackReferenceList(oHandle) == {nHandle: "T000001"}
+
+    # Removing the file that lost the tag should not remove the tag
+    theIndex.deleteHandle(cHandle)
+    assert theIndex.getTagSource("Jane")[0] == oHandle
+
+    # Removing the reference or the referring file removes the back reference
+    theIndex.deleteHandle(nHandle)
+    assert theIndex.getBackReferenceList(oHandle) == {}
+    assert theIndex._tagRefs == {}
+    theIndex.deleteHandle(oHandle)
+    assert theIndex._tagOwned == {}
+
+    # Put the tag back
+    assert theIndex.scanText(cHandle, "# Jane Smith\n@tag: Jane\n")
+    assert theIndex._tagOwned == {cHandle: {"Jane"}}
+
     ##
     #  getTagSource
     ##
@@ -535,3 +937,53 @@ def testIndexExtractData(nwMinimal, nwDummy):
     assert pC == 2
 
     assert theProject.closeProject()
+
+@pytest.mark.project
+def testIndexWordSearch(nwMinimal, nwDummy):
+    """Check the word index and the project search.
+    """
+    theProject = NWProject(nwDummy)
+    theProject.projTree.setSeed(42)
+    assert theProject.openProject(nwMinimal)
+
+    theIndex = NWIndex(theProject, nwDummy)
+    nHandle = theProject.newFile("Hello", nwItemClass.NOVEL,     "a508bb932959c")
+    cHandle = theProject.newFile("Jane",  nwItemClass.CHARACTER, "afb3043c7b2b3")
+
+    assert theIndex.scanText(nHandle, (
+        "# Hello World!\n\n"
+        "The quick brown fox.\n"
+        "Jumps over the lazy dog.\n"
+    ))
+    assert theIndex.scanText(cHandle, (
+        "# Jane Smith\n"
+        "@tag: Jane\n\n"
+        "A quick note.\n"
+    ))
+    assert theIndex.wordIndex["quick"] == {nHandle: [3], cHandle: [4]}
+
+    # Results are in tree order, and not case sensitive
+    assert theIndex.searchProject("quick") == [(nHandle, 3), (cHandle, 4)]
+    assert theIndex.searchProject("QUICK") == [(nHandle, 3), (cHandle, 4)]
+
+    # Documents not scanned in this session are read from disk
+    assert theIndex.searchProject("Jane") == [("a35baf2e93843", 3), (cHandle, 1), (cHandle, 2)]
+
+    # Partial and whole words
+    assert theIndex.searchProject("uic") == [(nHandle, 3), (cHandle, 4)]
+    assert theIndex.searchProject("uic", wholeWord=True) == []
+    assert theIndex.searchProject("own fo") == [(nHandle, 3)]
+    assert theIndex.searchProject("own fo", wholeWord=True) == []
+    assert theIndex.searchProject("brown fox.", wholeWord=True) == [(nHandle, 3)]
+    assert theIndex.searchProject("the brown fox") == [(nHandle, 3)]
+    assert theIndex.searchProject("lazy fox") == []
+    assert theIndex.searchProject("!!") is None
+
+    # Updates and deletes
+    assert theIndex.scanText(nHandle, "# Hello World!\n\nThe brown fox.\n")
+    assert theIndex.searchProject("quick") == [(cHandle, 4)]
+    theIndex.deleteHandle(cHandle)
+    assert theIndex.searchProject("quick") == []
+    assert "quick" not in theIndex.wordIndex
+
+    assert theProject.closeProject()
@@ -325,6 +325,15 @@ def testProjectMethods(monkeypatch, nwMinimal, nwDummy):
     assert theProject.setBookAuthors(" Jane Doe \n John Doh \n ")
     assert theProject.bookAuthors == ["Jane Doe", "John Doh"]
 
+    # Auto-Replace
+    theProject.setAutoReplace({"A": "B"})
+    theReplacer = theProject.getAutoReplacer()
+    assert theProject.getAutoReplacer() is theReplacer
+    assert theReplacer.replace("<A> and <AB>") == "B and <AB>"
+    theProject.setAutoReplace({"A": "B", "AB": "C"})
+    assert theProject.getAutoReplacer() is not theReplacer
+    assert theProject.getAutoReplacer().replace("<A> and <AB>") == "B and C"
+
 @pytest.mark.project
 def testDocMeta(nwDummy, nwLipsum):
     """Check that the document meta data string is parsed correctly.
@@ -399,6 +408,27 @@ def testSpellSimple(nwTemp, nwConf):
     wSuggest = spChk.suggestWords("wrod")
     assert len(wSuggest) > 0
     assert "word" in wSuggest
+    assert "Word" in spChk.suggestWords("Wrod")
+
+    # Two edits within the indexed prefix are also found
+    assert "accommodation" in spChk.suggestWords("acomodation")
+    assert "occasionally" in spChk.suggestWords("ocasinally")
+
+    # Words added after the suggestion index is built are suggested
+    assert "e_word" not in spChk.suggestWords("e_wrod")
+    spChk.addWord("e_word")
+    assert spChk.checkWord("e_word")
+    assert "e_word" in spChk.suggestWords("e_wrod")
+
+    # The dictionary index is only built once, and is shared with new
+    # instances, while the project words are kept apart
+    spNew = NWSpellSimple()
+    spNew.mainConf = nwConf
+    spNew.setLanguage("en", None)
+    assert spNew.dictIndex is spChk.dictIndex
+    assert spNew.dictIndex.buildThread is None
+    assert "word" in spNew.suggestWords("wrod")
+    assert "e_word" not in spNew.suggestWords("e_wrod")
 
     dList = spChk.listDictionaries()
     assert len(dList) > 0
@@ -407,6 +437,77 @@ def testSpellSimple(nwTemp, nwConf):
     assert aTag == "en"
     assert aName == "internal"
 
+@pytest.mark.project
+def testSpellMemo(nwTemp, nwConf):
+    spChk = NWSpellSimple()
+    spChk.mainConf = nwConf
+    spChk.setLanguage("en", None)
+    spChk.MEMO_SIZE = 3
+
+    assert not spChk.checkWord("a_word")
+    assert not spChk.checkWord("a_word")
+    assert spChk.checkWord("word")
+    assert (spChk.memoHits, spChk.memoMiss) == (1, 2)
+    assert spChk.memoHitRate() == 1/3
+
+    # Adding a word must clear the remembered result
+    spChk.addWord("a_word")
+    assert spChk.checkWord("a_word")
+    assert (spChk.memoHits, spChk.memoMiss) == (1, 3)
+
+    # The least recently used word is dropped
+    spChk.checkWord("b_word")
+    spChk.checkWord("a_word")
+    spChk.checkWord("c_word")
+    spChk.checkWord("d_word")
+    assert list(spChk.wordMemo) == ["a_word", "c_word", "d_word"]
+
+    # Changing language clears the memo
+    spChk.setLanguage("en", None)
+    assert len(spChk.wordMemo) == 0
+    spChk.resetMemoStats()
+    assert spChk.memoHitRate() == 0.0
+
+@pytest.mark.project
+def testSpellSimpleCache(nwTemp, nwConf):
+    wList = os.path.join(nwTemp, "wordlist_cache.txt")
+    with open(wList, mode="w") as wFile:
+        wFile.write("a_word\n")
+
+    spChk = NWSpellSimple()
+    spChk.mainConf = nwConf
+    spChk.setLanguage("en", wList)
+
+    cacheFile = os.path.join(nwConf.dataPath, nwFiles.DICT_CACHE, "en.cache")
+    assert os.path.isfile(cacheFile)
+    assert spChk._loadDictCache("en", os.path.join(nwConf.dictPath, "en.dict"), wList) == (
+        spChk.WORDS - {"a_word"}, {"a_word"}
+    )
+
+    # A second load gives the same words from the cache
+    spNew = NWSpellSimple()
+    spNew.mainConf = nwConf
+    spNew.setLanguage("en", wList)
+    assert spNew.WORDS == spChk.WORDS
+    assert spNew.PROJW == {"a_word"}
+    assert spNew.checkWord("a_word")
+
+    # Adding a word changes the project word list, so the cache no
+    # longer holds the project words, but still the dictionary words
+    spNew.addWord("b_word")
+    dictWords, projWords = spNew._loadDictCache(
+        "en", os.path.join(nwConf.dictPath, "en.dict"), wList
+    )
+    assert dictWords is not None
+    assert projWords is None
+
+    spNew.setLanguage("en", wList)
+    assert spNew.PROJW == {"a_word", "b_word"}
+    assert spNew.checkWord("b_word")
+    assert spNew._loadDictCache(
+        "en", os.path.join(nwConf.dictPath, "en.dict"), wList
+    )[1] == {"a_word", "b_word"}
+
 @pytest.mark.project
 def testProjectOptions(nwDummy, nwLipsum):
     """Test the class that holds all the GUI state user options that are
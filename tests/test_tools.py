@@ -4,7 +4,11 @@
 
 import pytest
 
-from nw.core.tools import countWords, numberToRoman, numberToWord
+from nw.core.tools import (
+    TextReplacer, countWords, numberToRoman, numberToWord, runWorkers
+)
+from nw.core.tokenizer import Tokenizer, scanFormats
+from nw.core.toodt import ToOdt
 
 @pytest.mark.core
 def testCountWords():
@@ -94,3 +98,70 @@ def testRomanNumbers():
     assert numberToRoman(999, False) == "CMXCIX"
     assert numberToRoman(2010, False) == "MMX"
     assert numberToRoman(999, True) == "cmxcix"
+
+@pytest.mark.core
+def testTextReplacer():
+    """Test the compiled text replacement.
+    """
+    assert TextReplacer({}).replace("Some <text>") == "Some <text>"
+    assert TextReplacer({"<": "&lt;", ">": "&gt;"}).replace("Some <text>") == "Some &lt;text&gt;"
+
+    # Overlapping keys are replaced by the longest match
+    theReplacer = TextReplacer({"ab": "1", "abc": "2", "b": "3", "<x>": "4"})
+    assert theReplacer.replace("abcd abd bc <x> <y>") == "2d 1d 3c 4 <y>"
+
+    # The replacement is a single pass
+    assert TextReplacer({"a": "b", "b": "a"}).replace("abba") == "baab"
+
+@pytest.mark.core
+def testRunWorkers(monkeypatch):
+    """Test running jobs in a pool of worker processes.
+    """
+    theJobs = [("h%d" % n, n) for n in range(20)]
+    theResults = list(runWorkers(repr, theJobs, 3))
+    assert theResults == [(x[0], repr(x)) for x in theJobs]
+
+    # Closing the generator early stops the pool
+    theResults = runWorkers(repr, theJobs, 2)
+    assert next(theResults) == ("h0", "('h0', 0)")
+    theResults.close()
+
+    # If the pool fails, the jobs are passed back without a result
+    def doPanic(*args, **kwargs):
+        raise Exception
+
+    monkeypatch.setattr("nw.core.tools.multiprocessing.get_context", doPanic)
+    assert list(runWorkers(repr, theJobs, 3)) == [(x[0], None) for x in theJobs]
+
+@pytest.mark.core
+def testScanFormats():
+    """Test the inline formatting scanner of the tokenizer.
+    """
+    assert scanFormats("Plain text") == []
+    assert scanFormats("Some _italic_ text") == [
+        [5, 1, Tokenizer.FMT_I_B], [12, 1, Tokenizer.FMT_I_E],
+    ]
+    assert scanFormats("~~Strike~~ and _it **bold** now_") == [
+        [0, 2, Tokenizer.FMT_D_B], [8, 2, Tokenizer.FMT_D_E],
+        [15, 1, Tokenizer.FMT_I_B], [19, 2, Tokenizer.FMT_B_B],
+        [25, 2, Tokenizer.FMT_B_E], [31, 1, Tokenizer.FMT_I_E],
+    ]
+    assert scanFormats("snake_case_words, \\_escaped_ and ** spaced**") == []
+
+@pytest.mark.core
+def testOdtText():
+    """Test the encoding of formatted text for Open Document files.
+    """
+    theConv = ToOdt(None, None)
+    theText = "a  b\tc & <d>"
+    assert theConv._formatText(theText, scanFormats(theText)) == (
+        "a <text:s text:c=\"1\"/>b<text:tab/>c &amp; &lt;d&gt;"
+    )
+
+    # Overlapping formats are closed and reopened
+    theText = "_a **b_ c**"
+    assert theConv._formatText(theText, scanFormats(theText)) == (
+        "<text:span text:style-name=\"T_Italic\">a "
+        "<text:span text:style-name=\"T_Bold\">b</text:span></text:span>"
+        "<text:span text:style-name=\"T_Bold\"> c</text:span>"
+    )